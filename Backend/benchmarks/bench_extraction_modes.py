@@ -0,0 +1,56 @@
+# bench_extraction_modes.py
+"""
+Compares extraction modes on the dashboard's sample transcripts.
+
+For each mode and sample it reports wall-clock time and field accuracy
+against the expectations in benchmarks/samples.py. Runs against the provider
+selected by LLM_PROVIDER (Ollama by default), with no cache in between.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_extraction_modes --modes single grouped staged --parallelism 2
+"""
+import argparse
+import time
+
+from incident_parser.categorize import EXTRACTION_MODES, build_provider, categorize_transcript
+from benchmarks.samples import SAMPLES, score
+
+
+def run(modes: list, parallelism: int, repeats: int) -> None:
+    provider = build_provider()
+    print(f"Provider: {provider.model_id}   parallelism: {parallelism}   repeats: {repeats}\n")
+    provider.warm_up()
+
+    totals = {}
+    print(f"{'mode':<10} {'sample':<26} {'secs':>8} {'accuracy':>9}")
+    for mode in modes:
+        secs_sum, correct_sum, expected_sum = 0.0, 0, 0
+        for name, sample in SAMPLES.items():
+            for _ in range(repeats):
+                start = time.perf_counter()
+                result = categorize_transcript(
+                    sample["transcript"], provider=provider, mode=mode, parallelism=parallelism
+                )
+                secs = time.perf_counter() - start
+                correct, expected = score(result, sample["expected"])
+                secs_sum += secs
+                correct_sum += correct
+                expected_sum += expected
+                print(f"{mode:<10} {name:<26} {secs:>8.2f} {correct:>5}/{expected:<3}")
+        totals[mode] = (secs_sum, correct_sum, expected_sum)
+
+    print("\nSummary")
+    print(f"{'mode':<10} {'total secs':>11} {'mean secs':>10} {'accuracy':>9}")
+    runs = len(SAMPLES) * repeats
+    for mode, (secs, correct, expected) in totals.items():
+        print(f"{mode:<10} {secs:>11.2f} {secs / runs:>10.2f} {correct / expected:>9.0%}")
+    provider.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=list(EXTRACTION_MODES), choices=EXTRACTION_MODES)
+    parser.add_argument("--parallelism", type=int, default=2)
+    parser.add_argument("--repeats", type=int, default=1)
+    args = parser.parse_args()
+    run(args.modes, args.parallelism, args.repeats)
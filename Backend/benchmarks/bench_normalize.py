@@ -0,0 +1,129 @@
+# bench_normalize.py
+"""
+Microbenchmark of the reply parsing/normalization path shared by every provider.
+
+Replies for all NERIS fields in four shapes: well-formed, fenced in
+```json ... ```, wrapped in chatter, and malformed (cut off mid-object, as
+when the token budget runs out). Each is run through:
+
+  legacy  the per-provider path this replaced: up to three json.loads
+          attempts (direct, fence-strip, brace-slice), then str()/strip()
+          and float() on every field
+  json    normalize.parse_json + decode_fields on the standard json module
+  orjson  the same with orjson (skipped if it isn't installed)
+
+No model server needed.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_normalize --iterations 5000
+"""
+import argparse
+import json
+import time
+
+from incident_parser import normalize
+from incident_parser.categorize import NERIS_FIELDS
+from benchmarks.samples import SAMPLES
+
+
+def _legacy_safe_json(text: str) -> dict:
+    t = (text or "").strip()
+    try:
+        return json.loads(t)
+    except Exception:
+        pass
+    if t.startswith("```"):
+        t2 = t.strip("`")
+        if t2.lower().startswith("json"):
+            t2 = t2[4:].strip()
+        try:
+            return json.loads(t2)
+        except Exception:
+            pass
+    start, end = t.find("{"), t.rfind("}")
+    if start != -1 and end != -1:
+        try:
+            return json.loads(t[start:end + 1])
+        except Exception:
+            pass
+    return {}
+
+
+def _legacy_entry(entry) -> dict:
+    if isinstance(entry, dict):
+        val = str(entry.get("value", "")).strip()
+        conf = entry.get("confidence", 0.0)
+        if val == "":
+            conf = 0.0
+        try:
+            conf = float(conf)
+        except Exception:
+            conf = 0.0
+        normalized = {"value": val, "confidence": max(0.0, min(conf, 1.0))}
+        evidence = entry.get("evidence")
+        if val and isinstance(evidence, str) and evidence.strip():
+            normalized["evidence"] = evidence.strip()
+        return normalized
+    return {"value": str(entry).strip(), "confidence": 0.0}
+
+
+def legacy(text: str) -> dict:
+    data = _legacy_safe_json(text)
+    return {f: _legacy_entry(data.get(f, {})) for f in NERIS_FIELDS}
+
+
+def current(text: str) -> dict:
+    data, _ = normalize.parse_json(text)
+    if data is None:
+        return normalize.empty_fields(NERIS_FIELDS)
+    return normalize.decode_fields(data, NERIS_FIELDS)
+
+
+def _replies() -> dict:
+    # A realistic reply: about a third of the fields found, the rest empty
+    transcript = SAMPLES["Sample 1"]["transcript"]
+    words = transcript.split()
+    reply = {}
+    for i, f in enumerate(NERIS_FIELDS):
+        if i % 3 == 0:
+            quote = " ".join(words[i % len(words):i % len(words) + 4])
+            reply[f] = {"value": quote, "confidence": 0.85, "evidence": quote}
+        else:
+            reply[f] = {"value": "", "confidence": 0.0, "evidence": ""}
+    body = json.dumps(reply, ensure_ascii=False)
+    return {
+        "well-formed": body,
+        "fenced": f"```json\n{body}\n```",
+        "chatter": f"Here is the extracted data:\n{body}\nLet me know if you need anything else.",
+        "malformed": body[: int(len(body) * 0.8)],
+    }
+
+
+def _time(fn, text: str, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(text)
+    return (time.perf_counter() - start) / iterations
+
+
+def run(iterations: int) -> None:
+    backends = ["json"] + (["orjson"] if normalize.JSON_BACKEND == "orjson" else [])
+    installed = normalize.loads
+    print(f"Reply normalization, {len(NERIS_FIELDS)} fields, {iterations} iterations (µs per reply)\n")
+    print(f"{'reply':<12} {'legacy':>9}" + "".join(f" {b:>9}" for b in backends) + "   speedup")
+    for shape, text in _replies().items():
+        assert legacy(text) == current(text), f"results differ for {shape}"
+        row = [_time(legacy, text, iterations)]
+        for backend in backends:
+            normalize.loads = json.loads if backend == "json" else installed
+            row.append(_time(current, text, iterations))
+        normalize.loads = installed
+        cells = "".join(f" {secs * 1e6:>9.1f}" for secs in row)
+        print(f"{shape:<12}{cells}   {row[0] / min(row[1:]):>6.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+    run(args.iterations)
@@ -0,0 +1,89 @@
+# bench_output_format.py
+"""
+Compares the full and compact output contracts on the sample transcripts.
+
+For each format it reports latency, generated tokens (Ollama's eval_count or
+vLLM's usage.completion_tokens) and field accuracy against the expectations
+in benchmarks/samples.py, plus the prompt size and the per-request token
+budget. Runs against LLM_PROVIDER (ollama or vllm), with no cache in between.
+
+Only the second table is measured. Prompt chars and token budgets are static
+properties of the templates: the budget is the generation ceiling, not what the
+model actually emits. No results are recorded in the repo, so any token or
+latency reduction from the compact contract is unverified until this is run
+against a real model.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_output_format --repeats 2
+"""
+import argparse
+import statistics
+import time
+
+from incident_parser.categorize import NERIS_FIELDS, build_provider
+from incident_parser.local_llm_provider import OllamaProvider, VLLMProvider
+from incident_parser.prompt import OUTPUT_FORMATS, build_extraction_prompt, output_token_budget
+from benchmarks.samples import SAMPLES, score
+
+
+def _generate(provider, transcript: str) -> tuple:
+    """One extraction straight through the provider's request/parse path: (secs, output tokens, result)."""
+    payload = provider._build_request(transcript, NERIS_FIELDS)
+    start = time.perf_counter()
+    if isinstance(provider, OllamaProvider):
+        response = provider.http.post("/api/generate", json=payload)
+        response.raise_for_status()
+        body = response.json()
+        tokens = body.get("eval_count")
+        text = body.get("response", "")
+    else:
+        response = provider.http.post("/chat/completions", json=payload)
+        response.raise_for_status()
+        body = response.json()
+        tokens = (body.get("usage") or {}).get("completion_tokens")
+        text = body["choices"][0]["message"]["content"] or ""
+    secs = time.perf_counter() - start
+    return secs, tokens, provider._parse_reply(text, NERIS_FIELDS)
+
+
+def run(formats: list, repeats: int) -> None:
+    provider = build_provider()
+    if not isinstance(provider, (OllamaProvider, VLLMProvider)):
+        print(f"Output format benchmark needs LLM_PROVIDER=ollama or vllm (got {provider.model_id})")
+        return
+    print(f"Provider: {provider.model_id}   fields: {len(NERIS_FIELDS)}   repeats: {repeats}\n")
+    provider.warm_up()
+
+    print(f"{'format':<8} {'prompt chars':>12} {'token budget':>13}")
+    for output_format in formats:
+        prompt = build_extraction_prompt("", NERIS_FIELDS, output_format=output_format)
+        budget = output_token_budget(len(NERIS_FIELDS), output_format, provider.max_tokens)
+        print(f"{output_format:<8} {len(prompt):>12} {budget:>13}")
+
+    print(f"\n{'format':<8} {'mean secs':>10} {'p50 secs':>9} {'out tokens':>11} {'accuracy':>9}")
+    for output_format in formats:
+        provider.output_format = output_format
+        secs, tokens, correct_sum, expected_sum = [], [], 0, 0
+        for _ in range(repeats):
+            for sample in SAMPLES.values():
+                elapsed, out_tokens, result = _generate(provider, sample["transcript"])
+                correct, expected = score(result, sample["expected"])
+                secs.append(elapsed)
+                if out_tokens is not None:
+                    tokens.append(out_tokens)
+                correct_sum += correct
+                expected_sum += expected
+        mean_tokens = f"{statistics.mean(tokens):>11.0f}" if tokens else f"{'n/a':>11}"
+        print(
+            f"{output_format:<8} {statistics.mean(secs):>10.2f} {statistics.median(secs):>9.2f} "
+            f"{mean_tokens} {correct_sum / expected_sum:>9.0%}"
+        )
+    provider.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--formats", nargs="+", default=list(OUTPUT_FORMATS), choices=OUTPUT_FORMATS)
+    parser.add_argument("--repeats", type=int, default=1)
+    args = parser.parse_args()
+    run(args.formats, args.repeats)
@@ -0,0 +1,131 @@
+# bench_prompt_prefix.py
+"""
+Measures what the compiled, transcript-last prompt buys.
+
+1. Prompt construction: rendering the full template per call (the old path)
+   vs. compile_prompt's cached prefix plus the transcript.
+2. Time to first token against Ollama or vLLM (LLM_PROVIDER) on the sample
+   transcripts, with the transcript last (shared prefix, reusable from the
+   server's KV cache) vs. first (every prompt differs from byte 0). Ollama's
+   prompt_eval_count shows how many prompt tokens it actually had to evaluate.
+
+For vLLM, start the server with --enable-prefix-caching.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_prompt_prefix --repeats 3
+    python -m benchmarks.bench_prompt_prefix --no-llm      # construction only
+"""
+import argparse
+import json
+import statistics
+import time
+
+from incident_parser.categorize import NERIS_FIELDS, build_provider
+from incident_parser.local_llm_provider import OllamaProvider, VLLMProvider
+from incident_parser.prompt import _render_prefix, build_extraction_prompt, compile_prompt, field_descriptions
+from benchmarks.samples import SAMPLES
+
+
+def bench_construction(iterations: int) -> None:
+    transcripts = [s["transcript"] for s in SAMPLES.values()]
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        _render_prefix(NERIS_FIELDS, field_descriptions) + transcripts[i % len(transcripts)] + "\n"
+    uncached = (time.perf_counter() - start) / iterations
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        build_extraction_prompt(transcripts[i % len(transcripts)], NERIS_FIELDS, field_descriptions)
+    compiled = (time.perf_counter() - start) / iterations
+
+    print(f"Prompt construction ({len(NERIS_FIELDS)} fields, with descriptions)")
+    print(f"  full render per call : {uncached * 1e6:8.1f} µs")
+    print(f"  compiled prefix      : {compiled * 1e6:8.1f} µs   ({uncached / compiled:.0f}x faster)\n")
+
+
+def _prompt(transcript: str, layout: str) -> str:
+    if layout == "transcript-last":
+        return build_extraction_prompt(transcript, NERIS_FIELDS, field_descriptions)
+    # Same content with the transcript moved to the front: no two prompts share a prefix
+    rules = compile_prompt(tuple(NERIS_FIELDS)).prefix[: -len("TRANSCRIPT:\n")]
+    return f"TRANSCRIPT:\n{transcript}\n\n{rules}"
+
+
+def _ttft_ollama(provider: OllamaProvider, prompt: str) -> tuple:
+    payload = {
+        "model": provider.model_name,
+        "prompt": prompt,
+        "stream": True,
+        "keep_alive": provider.keep_alive,
+        "options": {"temperature": 0.0, "num_predict": 8},
+    }
+    start = time.perf_counter()
+    ttft, prompt_tokens = None, None
+    with provider.http.post("/api/generate", json=payload, stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if ttft is None and chunk.get("response"):
+                ttft = time.perf_counter() - start
+            if chunk.get("done"):
+                prompt_tokens = chunk.get("prompt_eval_count")
+                break
+    return ttft or (time.perf_counter() - start), prompt_tokens
+
+
+def _ttft_vllm(provider: VLLMProvider, prompt: str) -> tuple:
+    payload = provider._build_request("", [])
+    payload["messages"][-1]["content"] = prompt
+    payload.update({"stream": True, "max_tokens": 8})
+    start = time.perf_counter()
+    with provider.http.post("/chat/completions", json=payload, stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line.startswith(b"data: ") and line != b"data: [DONE]":
+                delta = json.loads(line[6:])["choices"][0]["delta"].get("content")
+                if delta:
+                    return time.perf_counter() - start, None
+    return time.perf_counter() - start, None
+
+
+def bench_ttft(repeats: int) -> None:
+    provider = build_provider()
+    if isinstance(provider, OllamaProvider):
+        measure = _ttft_ollama
+    elif isinstance(provider, VLLMProvider):
+        measure = _ttft_vllm
+    else:
+        print(f"TTFT benchmark needs LLM_PROVIDER=ollama or vllm (got {provider.model_id})")
+        return
+    provider.warm_up()
+    print(f"Time to first token: {provider.model_id}")
+
+    for layout in ("transcript-first", "transcript-last"):
+        # Prime once so both layouts start from a loaded model
+        measure(provider, _prompt("Warm-up.", layout))
+        ttfts, evaluated = [], []
+        for _ in range(repeats):
+            for sample in SAMPLES.values():
+                ttft, prompt_tokens = measure(provider, _prompt(sample["transcript"], layout))
+                ttfts.append(ttft)
+                if prompt_tokens is not None:
+                    evaluated.append(prompt_tokens)
+        line = f"  {layout:<17} mean {statistics.mean(ttfts) * 1000:8.0f} ms   p50 {statistics.median(ttfts) * 1000:8.0f} ms"
+        if evaluated:
+            line += f"   prompt tokens evaluated {statistics.mean(evaluated):6.0f}"
+        print(line)
+    provider.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=2)
+    parser.add_argument("--no-llm", action="store_true", help="only benchmark prompt construction")
+    args = parser.parse_args()
+    bench_construction(args.iterations)
+    if not args.no_llm:
+        bench_ttft(args.repeats)
@@ -0,0 +1,77 @@
+# load_test.py
+"""
+Concurrency load test for the categorize endpoint.
+
+Fires N /categorize-transcript requests at once and pings the health route `/`
+while they are in flight. With the async provider path the extraction requests
+overlap in time and the health pings return in milliseconds; with a blocking
+handler they run one after another and the pings wait behind them.
+
+Usage (from Backend/, with the server running):
+    python -m benchmarks.load_test --url http://localhost:8000 --requests 4
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+TRANSCRIPT = (
+    "Eng 201 responded to a reported kitchen fire at 1287 Maple Ave. Light smoke was showing "
+    "from a two-story private home on arrival. Fire was extinguished with water. Ventilation "
+    "performed by Truck 107. Cause determined to be unattended cooking oil. No firefighter injuries."
+)
+
+
+async def _categorize(client: httpx.AsyncClient, i: int, t0: float) -> tuple:
+    start = time.perf_counter() - t0
+    response = await client.post("/categorize-transcript", json={"transcript": f"{TRANSCRIPT} (run {i})"})
+    end = time.perf_counter() - t0
+    return i, start, end, response.status_code
+
+
+async def _ping_health(client: httpx.AsyncClient, stop: asyncio.Event, interval: float) -> list:
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/")
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def run(url: str, n_requests: int, timeout: float, ping_interval: float) -> None:
+    async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+        t0 = time.perf_counter()
+        stop = asyncio.Event()
+        pinger = asyncio.create_task(_ping_health(client, stop, ping_interval))
+        results = await asyncio.gather(*(_categorize(client, i, t0) for i in range(n_requests)))
+        stop.set()
+        pings = await pinger
+        wall = time.perf_counter() - t0
+
+    print(f"\n{'req':>4} {'start':>8} {'end':>8} {'secs':>8} status")
+    for i, start, end, status in sorted(results, key=lambda r: r[1]):
+        print(f"{i:>4} {start:>8.2f} {end:>8.2f} {end - start:>8.2f} {status}")
+
+    # Requests overlap when one starts before another has finished
+    spans = sorted((start, end) for _, start, end, _ in results)
+    overlapping = sum(1 for (s1, e1), (s2, _) in zip(spans, spans[1:]) if s2 < e1)
+    serial_time = sum(end - start for _, start, end, _ in results)
+
+    print(f"\nWall clock: {wall:.2f}s  (sum of request times: {serial_time:.2f}s)")
+    print(f"Overlapping request pairs: {overlapping}/{max(len(spans) - 1, 0)}")
+    if pings:
+        print(f"Health pings during load: {len(pings)}, max latency {max(pings) * 1000:.1f} ms")
+    else:
+        print("Health pings during load: none completed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--ping-interval", type=float, default=0.5)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.requests, args.timeout, args.ping_interval))
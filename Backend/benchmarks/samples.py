@@ -0,0 +1,70 @@
+# samples.py
+"""
+Sample transcripts from the dashboard's "Sample Text" picker, with a few
+hand-labelled expectations per transcript used to score field accuracy.
+
+Expectations are case-insensitive: boolean fields must match exactly, every
+other field must contain the expected text.
+"""
+from typing import Dict
+
+BOOLEAN_FIELDS = {"fire", "medical", "hazsit", "incident_people_present"}
+
+SAMPLES = {
+    "Sample 1": {
+        "transcript": "Eng 201 responded to a reported kitchen fire at 1287 Maple Ave. Light smoke was showing from a two-story private home on arrival. Crew advanced a 1¾” hose line into the first-floor kitchen where flames were found on the stovetop and nearby cabinets. Fire was extinguished with water, and cabinets were overhauled to ensure no hidden fire. Ventilation performed by Truck 107. Cause determined to be unattended cooking oil. Smoke alarm activated and warned residents. One adult resident evaluated for smoke inhalation but refused transport. No firefighter injuries.",
+        "expected": {
+            "fire": "true",
+            "incident_location": "1287 Maple",
+            "structure_room_of_origin": "kitchen",
+            "structure_fire_cause": "cooking",
+            "unit_response": "201",
+        },
+    },
+    "Sample 2": {
+        "transcript": "Eng 12 and Rescue 2 responded to a four-vehicle accident at Main St and 5th Ave. One male driver was pinned in a sedan. Extrication was performed using the Jaws-of-Life to remove the driver-side door. Patient was stabilized, C-spine precautions taken, and transported by ambulance. Three additional patients transported for evaluation, two refused transport. Smoke was noted from another vehicle, and the battery was disconnected to prevent fire. Traffic rerouted until DOT set up an arrow board.",
+        "expected": {
+            "fire": "false",
+            "medical": "true",
+            "incident_location": "Main St",
+            "incident_actions_taken": "extricat",
+        },
+    },
+    "Sample 3": {
+        "transcript": "Eng 21 responded to a vehicle fire on I-495. On arrival, crew found a sedan with the engine compartment fully involved in flames on the right shoulder. Traffic slowed and a single lane was blocked for safety. Fire extinguished using one 1¾” hose line with foam added to suppress fuel vapors. Battery disconnected after extinguishment. Absorbent applied to leaking motor oil and transmission fluid. Vehicle turned over to tow company after overhaul was completed.",
+        "expected": {
+            "fire": "true",
+            "incident_location": "I-495",
+            "unit_response": "21",
+        },
+    },
+    "Sample 4": {
+        "transcript": "Eng 8, Truck 33, and Rescue 4 responded to reports of smoke coming from a three-story apartment building at 457 Lincoln Blvd. On arrival, heavy smoke visible from the second-floor windows. Crew advanced a 1¾” hose line to second floor, fire located in bedroom and confined to one unit. Primary and secondary searches negative. Ventilation performed by Truck 33. Utilities secured and fire under control within 20 minutes. Three residents displaced; Red Cross notified. No injuries.",
+        "expected": {
+            "fire": "true",
+            "incident_location": "457 Lincoln",
+            "incident_displaced_number": "3",
+            "structure_room_of_origin": "bedroom",
+            "structure_floor_of_origin": "2",  # NERIS Integer; "second floor" -> 2
+        },
+    },
+    "Confidence Score Test #1": {
+        "transcript": "Units arrived at a residence on Elm Street after reports of a burning smell in the basement. Light haze visible upon entry but no active flames. Power was shut off as a precaution and crews checked walls for heat using a thermal camera. Possible cause believed to be an overheated appliance. No injuries reported. Weather was windy with light rain. Engine 204 and Ladder 112 on scene for about 40 minutes.",
+        "expected": {
+            "incident_location": "Elm",
+            "weather": "wind",
+        },
+    },
+}
+
+
+def score(result: Dict[str, dict], expected: Dict[str, str]) -> tuple:
+    """Returns (correct, total) for one extraction against its expectations."""
+    correct = 0
+    for field, want in expected.items():
+        entry = result.get(field, {})
+        got = str(entry.get("value", "") if isinstance(entry, dict) else entry).strip().lower()
+        want = want.lower()
+        if (got == want) if field in BOOLEAN_FIELDS else (want in got):
+            correct += 1
+    return correct, len(expected)
@@ -0,0 +1,190 @@
+# analytics.py
+"""
+Typed, columnar exports of the incident history for reporting.
+
+The incident store keeps every field as text. Exports here convert the
+numeric and boolean fields to real Arrow types (fire/medical/hazsit ->
+bool, displaced/animal counts -> int64, acres -> float64, created_at ->
+timestamp). Text that doesn't parse becomes null instead of failing the export.
+
+export_dataset() writes a Hive-partitioned Parquet dataset:
+    <root>/month=2025-06/incident_type=fire/part-0.parquet
+read_incidents() reads it back with column projection and partition/predicate
+pushdown, so a monthly report only opens that month's files and only decodes
+the columns it asks for.
+
+    python -m incident_parser.analytics export analytics/incidents
+"""
+import re
+import sys
+import tempfile
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from .incident_store import IncidentStore, TYPE_FLAGS, TRUTHY
+
+BOOL_COLUMNS = ["fire", "medical", "hazsit"]
+INT_COLUMNS = ["incident_displaced_number", "incident_rescue_animal"]
+FLOAT_COLUMNS = ["outside_fire_acres_burned"]
+
+PARTITION_COLUMNS = ["month", "incident_type"]
+FALSY = {"false", "no", "0"}
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def _to_bool(value: str) -> Optional[bool]:
+    value = (value or "").strip().lower()
+    if value in TRUTHY:
+        return True
+    if value in FALSY:
+        return False
+    return None
+
+
+def _to_number(value: str, cast):
+    # Models write counts like "3" or "3 residents"; take the first number
+    match = _NUMBER.search((value or "").replace(",", ""))
+    if not match:
+        return None
+    try:
+        return cast(float(match.group()))
+    except (ValueError, OverflowError):
+        return None
+
+
+def _arrow_type(column: str) -> pa.DataType:
+    if column == "id":
+        return pa.int64()
+    if column == "created_at":
+        return pa.timestamp("us", tz="UTC")
+    if column in BOOL_COLUMNS:
+        return pa.bool_()
+    if column in INT_COLUMNS:
+        return pa.int64()
+    if column in FLOAT_COLUMNS:
+        return pa.float64()
+    return pa.string()
+
+
+def typed_schema(columns: Sequence[str]) -> pa.Schema:
+    return pa.schema([(c, _arrow_type(c)) for c in columns])
+
+
+def _typed_array(column: str, values: Sequence) -> pa.Array:
+    if column in BOOL_COLUMNS:
+        return pa.array([_to_bool(v) for v in values], type=pa.bool_())
+    if column in INT_COLUMNS:
+        return pa.array([_to_number(v, int) for v in values], type=pa.int64())
+    if column in FLOAT_COLUMNS:
+        return pa.array([_to_number(v, float) for v in values], type=pa.float64())
+    if column == "created_at":
+        return pc.cast(pa.array(values, type=pa.string()), pa.timestamp("us", tz="UTC"))
+    return pa.array(values, type=_arrow_type(column))
+
+
+def to_record_batch(columns: Sequence[str], rows: List[tuple]) -> pa.RecordBatch:
+    arrays = [_typed_array(column, values) for column, values in zip(columns, zip(*rows))]
+    return pa.RecordBatch.from_arrays(arrays, schema=typed_schema(columns))
+
+
+def _incident_type(record: Dict[str, str]) -> str:
+    """Partition key: the primary type when the model gave one, else the first true flag."""
+    primary = (record.get("incident_final_type_primary") or "").strip().lower()
+    if primary in TYPE_FLAGS:
+        return primary
+    for flag in TYPE_FLAGS:
+        if (record.get(flag) or "").strip().lower() in TRUTHY:
+            return flag
+    return "other"
+
+
+def iter_parquet(
+    store: IncidentStore,
+    columns: Optional[List[str]] = None,
+    filters: Optional[Dict[str, Optional[str]]] = None,
+    chunk_rows: int = 10000,
+) -> Iterator[bytes]:
+    """
+    Yields one typed Parquet file of the matching incidents. Each chunk of rows
+    is written as its own row group to a temp file (Parquet's footer has to
+    come last), which is then streamed back, so memory stays flat.
+    """
+    columns = store.resolve_columns(columns)
+    with tempfile.TemporaryFile() as tmp:
+        with pq.ParquetWriter(tmp, typed_schema(columns), compression="zstd") as writer:
+            for rows in store.iter_rows(columns, filters, chunk_rows):
+                writer.write_batch(to_record_batch(columns, rows))
+        tmp.seek(0)
+        while True:
+            block = tmp.read(1 << 20)
+            if not block:
+                return
+            yield block
+
+
+def export_dataset(store: IncidentStore, root: str, chunk_rows: int = 10000) -> int:
+    """
+    Writes the whole store to `root` as Parquet partitioned by month and
+    incident type, replacing the partitions it writes. Returns the row count.
+    """
+    columns = ["id", "created_at"] + store.columns
+    schema = typed_schema(columns).append(pa.field("month", pa.string())).append(pa.field("incident_type", pa.string()))
+    written = 0
+
+    def batches() -> Iterator[pa.RecordBatch]:
+        nonlocal written
+        for rows in store.iter_rows(columns, chunk_rows=chunk_rows):
+            batch = to_record_batch(columns, rows)
+            records = [dict(zip(columns, row)) for row in rows]
+            month = pa.array([r["created_at"][:7] for r in records], type=pa.string())
+            incident_type = pa.array([_incident_type(r) for r in records], type=pa.string())
+            written += len(rows)
+            yield pa.RecordBatch.from_arrays(batch.columns + [month, incident_type], schema=schema)
+
+    ds.write_dataset(
+        batches(),
+        root,
+        schema=schema,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([("month", pa.string()), ("incident_type", pa.string())]), flavor="hive"),
+        existing_data_behavior="delete_matching",
+        basename_template="part-{i}.parquet",
+    )
+    return written
+
+
+def read_incidents(
+    root: str,
+    columns: Optional[List[str]] = None,
+    months: Optional[List[str]] = None,
+    types: Optional[List[str]] = None,
+    filter: Optional[ds.Expression] = None,
+) -> pa.Table:
+    """
+    Reads an exported dataset. `months` ("YYYY-MM") and `types` prune whole
+    partitions; `filter` is any pyarrow expression (e.g. ds.field("fire") == True)
+    and is pushed down to Parquet row-group statistics. Call .to_pandas() on
+    the result for a DataFrame.
+    """
+    dataset = ds.dataset(root, format="parquet", partitioning="hive")
+    expression = filter
+    for name, values in (("month", months), ("incident_type", types)):
+        if values:
+            clause = ds.field(name).isin(values)
+            expression = clause if expression is None else expression & clause
+    return dataset.to_table(columns=columns, filter=expression)
+
+
+if __name__ == "__main__":
+    from .categorize import NERIS_FIELDS
+
+    if len(sys.argv) != 3 or sys.argv[1] != "export":
+        print("usage: python -m incident_parser.analytics export <output_dir>")
+        sys.exit(2)
+    store = IncidentStore.from_env(NERIS_FIELDS)
+    count = export_dataset(store, sys.argv[2])
+    print(f"✅ Exported {count} incidents to {sys.argv[2]}")
@@ -0,0 +1,176 @@
+# batch.py
+"""
+Bulk categorization for backfilling historical narratives.
+
+A batch is a list of {"id", "transcript"} items, parsed from a JSON list or an
+uploaded CSV/JSONL file. Items run with bounded concurrency and results are
+yielded in completion order. Every finished item is appended to a per-batch
+progress file, so re-submitting the same batch_id resumes where it stopped:
+completed items are replayed from disk and only the rest hit the LLM.
+"""
+import io
+import os
+import re
+import csv
+import json
+import uuid
+import asyncio
+import threading
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from .cache import is_empty_result
+from .categorize import PartialExtraction
+
+TRANSCRIPT_COLUMNS = ("transcript", "narrative", "text")
+
+_BATCH_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def new_batch_id() -> str:
+    return uuid.uuid4().hex
+
+
+def validate_batch_id(batch_id: str) -> str:
+    if not _BATCH_ID.match(batch_id or ""):
+        raise ValueError("batch_id must be 1-64 characters of letters, digits, '-' or '_'.")
+    return batch_id
+
+
+def _item(raw, index: int) -> dict:
+    if isinstance(raw, str):
+        return {"id": str(index), "transcript": raw}
+    if not isinstance(raw, dict):
+        raise ValueError(f"Item {index}: expected a string or an object.")
+    transcript = next((raw[c] for c in TRANSCRIPT_COLUMNS if raw.get(c)), None)
+    if not isinstance(transcript, str) or not transcript.strip():
+        raise ValueError(f"Item {index}: missing transcript (one of {', '.join(TRANSCRIPT_COLUMNS)}).")
+    item_id = raw.get("id")
+    return {"id": str(item_id) if item_id not in (None, "") else str(index), "transcript": transcript}
+
+
+def _check_unique(items: List[dict]) -> List[dict]:
+    seen = set()
+    for item in items:
+        if item["id"] in seen:
+            raise ValueError(f"Duplicate item id: {item['id']}")
+        seen.add(item["id"])
+    return items
+
+
+def parse_items(raw_items: list) -> List[dict]:
+    """Items from a JSON body: strings or objects with an optional id."""
+    if not isinstance(raw_items, list) or not raw_items:
+        raise ValueError("Provide a non-empty list of transcripts.")
+    return _check_unique([_item(raw, i) for i, raw in enumerate(raw_items)])
+
+
+def parse_upload(data: bytes, filename: str) -> List[dict]:
+    """Items from an uploaded .csv (id + transcript/narrative column) or .jsonl file."""
+    text = data.decode("utf-8-sig")
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        rows = list(csv.DictReader(io.StringIO(text)))
+    elif name.endswith(".jsonl") or name.endswith(".ndjson"):
+        rows = []
+        for line_no, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Line {line_no}: invalid JSON ({e.msg}).")
+    else:
+        raise ValueError("Upload a .csv or .jsonl file.")
+    return parse_items(rows)
+
+
+class BatchProgress:
+    """Append-only JSONL record of finished items for one batch."""
+
+    def __init__(self, batch_id: str, directory: Optional[str] = None):
+        self.batch_id = validate_batch_id(batch_id)
+        self.directory = directory or os.getenv("BATCH_DIR", "batches")
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, f"{self.batch_id}.jsonl")
+        self._lock = threading.Lock()
+
+    def completed(self) -> Dict[str, dict]:
+        """Successful records already on disk, keyed by item id."""
+        done: Dict[str, dict] = {}
+        if not os.path.exists(self.path):
+            return done
+        with open(self.path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # partial line from an interrupted write
+                if "fields" in record:
+                    done[record["id"]] = record
+        return done
+
+    def record(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as fh:
+                fh.write(line)
+                fh.flush()
+
+
+async def run_batch(
+    items: List[dict],
+    extract: Callable[[str], Awaitable[Dict[str, dict]]],
+    concurrency: int,
+    progress: BatchProgress,
+) -> AsyncIterator[dict]:
+    """
+    Yields one record per item in completion order: {"id", "fields"} on
+    success or {"id", "error"} on failure, followed by a {"summary"} record.
+    Items already completed in `progress` are replayed first with "resumed": true.
+    """
+    done = progress.completed()
+    pending: asyncio.Queue = asyncio.Queue()
+    results: asyncio.Queue = asyncio.Queue()
+    summary = {"batch_id": progress.batch_id, "total": len(items), "succeeded": 0, "failed": 0, "resumed": 0}
+
+    for item in items:
+        if item["id"] in done:
+            summary["resumed"] += 1
+            summary["succeeded"] += 1
+            yield {**done[item["id"]], "resumed": True}
+        else:
+            pending.put_nowait(item)
+
+    async def worker() -> None:
+        while True:
+            try:
+                item = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                fields = await extract(item["transcript"])
+                if is_empty_result(fields):
+                    record = {"id": item["id"], "error": "Extraction returned no fields (provider call or parse failed)."}
+                else:
+                    record = {"id": item["id"], "fields": fields}
+            except PartialExtraction:
+                # Not recorded as done, so a resumed batch retries the item
+                record = {"id": item["id"], "error": "Extraction incomplete: some field groups failed."}
+            except Exception as e:
+                record = {"id": item["id"], "error": str(e)}
+            progress.record(record)
+            await results.put(record)
+
+    remaining = pending.qsize()
+    workers = [asyncio.create_task(worker()) for _ in range(min(max(1, concurrency), remaining))]
+    try:
+        for _ in range(remaining):
+            record = await results.get()
+            summary["succeeded" if "fields" in record else "failed"] += 1
+            yield record
+    finally:
+        # Client went away: stop the workers; finished items are already on disk
+        for task in workers:
+            task.cancel()
+
+    yield {"summary": summary}
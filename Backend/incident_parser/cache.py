@@ -0,0 +1,251 @@
+# cache.py
+"""
+Content-addressed cache for extraction results.
+
+Results are keyed on the normalized transcript, the requested fields, the
+provider/model id and the prompt template version, so re-submitting the same
+transcript (a second "Parse incident" click, a frontend retry) skips the LLM.
+An in-memory LRU tier with TTL sits in front of an optional SQLite tier that
+survives restarts. Async callers use aget()/aset(), which run the SQLite tier
+in a worker thread so a slow disk never stalls the event loop.
+"""
+import os
+import asyncio
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from .prompt import PROMPT_VERSION
+
+
+def normalize_transcript(transcript: str) -> str:
+    """Collapses whitespace so reflowed copies of the same transcript share a key."""
+    return " ".join((transcript or "").split())
+
+
+def extraction_key(
+    transcript: str,
+    fields: List[str],
+    model_id: str,
+    prompt_version: str = PROMPT_VERSION,
+) -> str:
+    blob = json.dumps(
+        [normalize_transcript(transcript), list(fields), model_id, prompt_version],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def is_empty_result(result: Dict[str, dict]) -> bool:
+    """True for the all-empty defaults providers return when the LLM call or parse fails."""
+    if not result:
+        return True
+    for entry in result.values():
+        if isinstance(entry, dict):
+            if entry.get("value") or entry.get("confidence"):
+                return False
+        elif entry:
+            return False
+    return True
+
+
+def _copy(result: Dict[str, dict]) -> Dict[str, dict]:
+    # Callers edit results in place (e.g. the Review tab), so never hand out the cached object
+    return {k: dict(v) if isinstance(v, dict) else v for k, v in result.items()}
+
+
+class MemoryCache:
+    """Thread-safe LRU with per-entry TTL."""
+
+    def __init__(self, max_entries: int = 256, ttl: Optional[float] = 86400.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, dict]]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict[str, dict]) -> None:
+        if self.max_entries <= 0:
+            return
+        expires_at = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCache:
+    """On-disk tier; one row per key with the JSON result and its creation time."""
+
+    def __init__(self, path: str, ttl: Optional[float] = 86400.0):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extraction_cache ("
+            " key TEXT PRIMARY KEY, result TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, dict]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, created_at FROM extraction_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            result, created_at = row
+            if self.ttl and created_at + self.ttl < time.time():
+                self._conn.execute("DELETE FROM extraction_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+        return json.loads(result)
+
+    def set(self, key: str, value: Dict[str, dict]) -> None:
+        blob = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extraction_cache (key, result, created_at) VALUES (?, ?, ?)",
+                (key, blob, time.time()),
+            )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM extraction_cache")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM extraction_cache").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ExtractionCache:
+    def __init__(self, memory: Optional[MemoryCache] = None, disk: Optional[SQLiteCache] = None):
+        self.memory = memory if memory is not None else MemoryCache()
+        self.disk = disk
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "skipped_empty": 0}
+
+    @classmethod
+    def from_env(cls) -> "ExtractionCache":
+        """
+        EXTRACTION_CACHE_SIZE: in-memory entries (default 256, 0 disables the tier)
+        EXTRACTION_CACHE_TTL:  seconds a result stays valid (default 86400, 0 = forever)
+        EXTRACTION_CACHE_DB:   path of the SQLite tier (disabled when unset)
+        """
+        ttl = float(os.getenv("EXTRACTION_CACHE_TTL", "86400")) or None
+        memory = MemoryCache(int(os.getenv("EXTRACTION_CACHE_SIZE", "256")), ttl)
+        db_path = os.getenv("EXTRACTION_CACHE_DB")
+        disk = SQLiteCache(db_path, ttl) if db_path else None
+        return cls(memory, disk)
+
+    def _count(self, *names: str) -> None:
+        with self._lock:
+            for name in names:
+                self._counters[name] += 1
+
+    def _memory_get(self, key: str) -> Optional[Dict[str, dict]]:
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("hits", "memory_hits")
+            return _copy(value)
+        return None
+
+    def _disk_hit(self, key: str, value: Optional[Dict[str, dict]]) -> Optional[Dict[str, dict]]:
+        # Counts the lookup after a memory miss; value is what the SQLite tier returned, if any
+        if value is None:
+            self._count("misses")
+            return None
+        self.memory.set(key, value)
+        self._count("hits", "disk_hits")
+        return _copy(value)
+
+    def get(self, key: str) -> Optional[Dict[str, dict]]:
+        value = self._memory_get(key)
+        if value is not None:
+            return value
+        return self._disk_hit(key, self.disk.get(key) if self.disk is not None else None)
+
+    async def aget(self, key: str) -> Optional[Dict[str, dict]]:
+        """get() for the event loop: memory inline, the SQLite tier in a worker thread."""
+        value = self._memory_get(key)
+        if value is not None:
+            return value
+        disk_value = await asyncio.to_thread(self.disk.get, key) if self.disk is not None else None
+        return self._disk_hit(key, disk_value)
+
+    def _memory_set(self, key: str, value: Dict[str, dict]) -> Optional[Dict[str, dict]]:
+        if is_empty_result(value):
+            self._count("skipped_empty")
+            return None
+        value = _copy(value)
+        self.memory.set(key, value)
+        self._count("stores")
+        return value
+
+    def set(self, key: str, value: Dict[str, dict]) -> bool:
+        """Stores `value` unless it is the empty-default result of a failed call."""
+        value = self._memory_set(key, value)
+        if value is None:
+            return False
+        if self.disk is not None:
+            self.disk.set(key, value)
+        return True
+
+    async def aset(self, key: str, value: Dict[str, dict]) -> bool:
+        """set() for the event loop; the SQLite write runs in a worker thread."""
+        value = self._memory_set(key, value)
+        if value is None:
+            return False
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, value)
+        return True
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = counters["hits"] / lookups if lookups else 0.0
+        counters["memory_entries"] = len(self.memory)
+        counters["disk_entries"] = len(self.disk) if self.disk is not None else None
+        return counters
+
+    def close(self) -> None:
+        if self.disk is not None:
+            self.disk.close()
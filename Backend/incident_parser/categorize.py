@@ -1,7 +1,13 @@
 #categorize.py
 from typing import Dict, List, Optional
 from .providers import LLMProvider, GeminiProvider
+from .cache import ExtractionCache, extraction_key
+from .coalesce import SingleFlight
+from .prompt import prompt_version
+from .validators import attach_spans
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -54,8 +60,137 @@ NERIS_FIELDS = [
   "outside_fire_acres_burned"
 ]
 
-def _default_provider() -> LLMProvider:
-    kind = (os.getenv("LLM_PROVIDER") or "ollama").lower()
+# Field groups for "grouped" extraction: each group becomes its own smaller
+# prompt, so every call decodes a fraction of the output.
+FIELD_GROUPS = {
+  "core": [
+    "incident_neris_id",
+    "incident_internal_id",
+    "incident_final_type",
+    "incident_final_type_primary",
+    "incident_special_modifier",
+    "fire",
+    "medical",
+    "hazsit",
+    "emerging_hazard",
+    "tactic_timestamps",
+    "incident_actions_taken",
+    "incident_noaction",
+    "unit_response",
+    "incident_narrative_impediment",
+    "incident_narrative_outcome",
+    "weather",
+  ],
+  "rescue_aid": [
+    "incident_people_present",
+    "incident_displaced_number",
+    "incident_displaced_cause",
+    "exposure",
+    "rescue_ff",
+    "rescue_nonff",
+    "incident_rescue_animal",
+    "risk_reduction",
+    "incident_aid_direction",
+    "incident_aid_type",
+    "incident_aid_department_name",
+    "incident_aid_nonfd",
+  ],
+  "location": [
+    "incident_point",
+    "incident_polygon",
+    "incident_location",
+    "incident_location_use",
+    "parcel",
+  ],
+  "fire": [
+    "fire_suppression_appliance",
+    "fire_water_supply",
+    "fire_investigation_need",
+    "fire_investigation_type",
+    "structure_arrival_conditions",
+    "structure_progression_conditions",
+    "structure_damage",
+    "structure_floor_of_origin",
+    "structure_room_of_origin",
+    "structure_fire_cause",
+    "outside_fire_cause",
+    "outside_fire_acres_burned",
+  ],
+}
+
+# "staged" mode: a cheap first pass extracts the classification fields, and the
+# fire module fields are only requested when the incident involved a fire.
+CLASSIFICATION_FIELDS = ["incident_final_type", "fire", "medical", "hazsit"]
+FIRE_MODULE_FIELDS = FIELD_GROUPS["fire"]
+
+EXTRACTION_MODES = ("single", "grouped", "staged")
+
+
+def group_fields(fields: List[str]) -> List[List[str]]:
+    """
+    Partitions `fields` by FIELD_GROUPS, keeping the requested order inside
+    each group. Fields outside every group are extracted together at the end.
+    """
+    group_of = {f: name for name, members in FIELD_GROUPS.items() for f in members}
+    buckets: Dict[str, List[str]] = {}
+    for f in fields:
+        buckets.setdefault(group_of.get(f, "other"), []).append(f)
+    return [buckets[name] for name in list(FIELD_GROUPS) + ["other"] if name in buckets]
+
+
+class PartialExtraction(Exception):
+    """Some extraction calls failed; `result` holds what the others returned, empty defaults elsewhere."""
+
+    def __init__(self, result: Dict[str, dict]):
+        super().__init__("Extraction incomplete: some field groups failed.")
+        self.result = result
+
+
+def _merge(parts: List[Optional[Dict[str, dict]]], fields: List[str]) -> tuple:
+    """Merges per-call results into (result, complete); a failed call (None) leaves its fields empty."""
+    merged: Dict[str, dict] = {}
+    for part in parts:
+        if part is not None:
+            merged.update(part)
+    result = {f: merged.get(f, {"value": "", "confidence": 0.0}) for f in fields}
+    return result, all(part is not None for part in parts)
+
+
+def is_truthy(entry) -> bool:
+    """Matches how the dashboard reads boolean fields ('true', 'yes' or '1')."""
+    value = entry.get("value", "") if isinstance(entry, dict) else entry
+    return str(value).strip().lower() in ["yes", "true", "1"]
+
+
+def _plan_stages(fields: List[str]) -> tuple:
+    """Splits `fields` into (first-pass classification fields, remaining fields)."""
+    first = [f for f in fields if f in CLASSIFICATION_FIELDS]
+    rest = [f for f in fields if f not in CLASSIFICATION_FIELDS]
+    return first, rest
+
+
+def _second_stage_fields(rest: List[str], first_result: Dict[str, dict]) -> List[str]:
+    if is_truthy(first_result.get("fire", {})):
+        return rest
+    return [f for f in rest if f not in FIRE_MODULE_FIELDS]
+
+
+def _resolve_mode(mode: Optional[str], parallelism: Optional[int]) -> tuple:
+    mode = (mode or os.getenv("EXTRACTION_MODE") or "single").lower()
+    if mode not in EXTRACTION_MODES:
+        raise ValueError(f"Unknown extraction mode: {mode}. Use one of {', '.join(EXTRACTION_MODES)}")
+    parallelism = parallelism or int(os.getenv("EXTRACTION_PARALLELISM", "2"))
+    return mode, max(1, parallelism)
+
+
+def _prompt_version(mode: str, output_format: str = "full") -> str:
+    # Grouped results and compact outputs come from different prompts, so they get their own cache keys
+    version = prompt_version(output_format)
+    return version if mode == "single" else f"{version}+{mode}"
+
+
+def build_provider(kind: Optional[str] = None) -> LLMProvider:
+    kind = (kind or os.getenv("LLM_PROVIDER") or "ollama").lower()
     
     if kind == "ollama":
         from .local_llm_provider import OllamaProvider
@@ -65,15 +200,191 @@ def _default_provider() -> LLMProvider:
         return VLLMProvider()
     elif kind == "gemini":
         return GeminiProvider()
+    elif kind == "router":
+        # Several backends from LLM_BACKENDS, with balancing and failover
+        from .router import RouterProvider
+        return RouterProvider.from_env()
     else:
-        raise ValueError(f"Unknown provider: {kind}. Use 'ollama', 'vllm', or 'gemini'")
+        raise ValueError(f"Unknown provider: {kind}. Use 'ollama', 'vllm', 'gemini', or 'router'")
+
+
+def _default_provider() -> LLMProvider:
+    return build_provider()
+
+
+def _call(provider: LLMProvider, transcript: str, fields: List[str]) -> Optional[Dict[str, dict]]:
+    try:
+        return provider.extract_fields_strict(transcript, fields)
+    except Exception as e:
+        print(f"❌ Extraction of {len(fields)} fields failed: {e}")
+        return None
+
+
+async def _acall(provider: LLMProvider, transcript: str, fields: List[str]) -> Optional[Dict[str, dict]]:
+    try:
+        return await provider.aextract_fields_strict(transcript, fields)
+    except Exception as e:
+        print(f"❌ Extraction of {len(fields)} fields failed: {e}")
+        return None
+
+
+def _extract(
+    provider: LLMProvider,
+    transcript: str,
+    fields: List[str],
+    mode: str,
+    parallelism: int,
+) -> tuple:
+    """Returns (result, complete); complete is False when any call failed and its fields are defaults."""
+    if mode == "single":
+        return _merge([_call(provider, transcript, fields)], fields)
+    if mode == "staged":
+        first, rest = _plan_stages(fields)
+        if "fire" not in first:
+            return _merge([_call(provider, transcript, fields)], fields)
+        first_result = _call(provider, transcript, first)
+        if first_result is None:
+            # Without the classification we can't tell whether the fire fields apply
+            print("⚠️  Classification stage failed; falling back to single extraction")
+            return _merge([_call(provider, transcript, fields)], fields)
+        second = _second_stage_fields(rest, first_result)
+        parts = [first_result, _call(provider, transcript, second) if second else {}]
+        return _merge(parts, fields)
+    groups = group_fields(fields)
+    with ThreadPoolExecutor(max_workers=min(parallelism, len(groups))) as pool:
+        parts = list(pool.map(lambda group: _call(provider, transcript, group), groups))
+    return _merge(parts, fields)
+
+
+async def _aextract(
+    provider: LLMProvider,
+    transcript: str,
+    fields: List[str],
+    mode: str,
+    parallelism: int,
+) -> tuple:
+    if mode == "single":
+        return _merge([await _acall(provider, transcript, fields)], fields)
+    if mode == "staged":
+        first, rest = _plan_stages(fields)
+        if "fire" not in first:
+            return _merge([await _acall(provider, transcript, fields)], fields)
+        first_result = await _acall(provider, transcript, first)
+        if first_result is None:
+            print("⚠️  Classification stage failed; falling back to single extraction")
+            return _merge([await _acall(provider, transcript, fields)], fields)
+        second = _second_stage_fields(rest, first_result)
+        parts = [first_result, await _acall(provider, transcript, second) if second else {}]
+        return _merge(parts, fields)
+    slots = asyncio.Semaphore(parallelism)
+
+    async def run(group: List[str]) -> Optional[Dict[str, dict]]:
+        async with slots:
+            return await _acall(provider, transcript, group)
+
+    parts = await asyncio.gather(*(run(group) for group in group_fields(fields)))
+    return _merge(parts, fields)
 
 
 def categorize_transcript(
     transcript: str,
     fields: List[str] = NERIS_FIELDS,
     provider: Optional[LLMProvider] = None,
+    cache: Optional[ExtractionCache] = None,
+    mode: Optional[str] = None,
+    parallelism: Optional[int] = None,
+) -> Dict[str, str]:
+    """
+    Extracts `fields` from `transcript`.
+    mode: "single" sends one prompt with every field; "grouped" sends one smaller
+    prompt per FIELD_GROUPS slice, `parallelism` at a time, and merges the results;
+    "staged" extracts CLASSIFICATION_FIELDS first and only asks for the fire
+    module fields when `fire` is true (they stay empty otherwise); if that
+    first pass fails, every field is extracted in one call instead.
+    Defaults come from EXTRACTION_MODE / EXTRACTION_PARALLELISM.
+    Fields of a failed call come back empty, and a result with any failed
+    call is never cached.
+    Fields with a verified evidence quote also carry "span": [start, end]
+    character offsets into `transcript`.
+    """
+    if provider is None:
+        provider = _default_provider()
+    mode, parallelism = _resolve_mode(mode, parallelism)
+    if cache is None:
+        return attach_spans(_extract(provider, transcript, fields, mode, parallelism)[0], transcript)
+
+    key = extraction_key(transcript, fields, provider.model_id, _prompt_version(mode, provider.output_format))
+    result = cache.get(key)
+    if result is None:
+        result, complete = _extract(provider, transcript, fields, mode, parallelism)
+        if complete:
+            cache.set(key, result)
+    return attach_spans(result, transcript)
+
+
+async def acategorize_transcript(
+    transcript: str,
+    fields: List[str] = NERIS_FIELDS,
+    provider: Optional[LLMProvider] = None,
+    cache: Optional[ExtractionCache] = None,
+    coalescer: Optional[SingleFlight] = None,
+    mode: Optional[str] = None,
+    parallelism: Optional[int] = None,
+    strict: bool = False,
 ) -> Dict[str, str]:
+    """
+    Async counterpart of categorize_transcript for use inside the server's event loop.
+    With a coalescer, concurrent calls for the same cache key share one LLM call;
+    a partial result isn't shared, each coalesced caller then makes its own attempt.
+    strict=True raises PartialExtraction (carrying the result) instead of
+    returning one in which any extraction call failed.
+    """
     if provider is None:
         provider = _default_provider()
-    return provider.extract_fields(transcript, fields)
\ No newline at end of file
+    mode, parallelism = _resolve_mode(mode, parallelism)
+    if cache is None and coalescer is None:
+        result, complete = await _aextract(provider, transcript, fields, mode, parallelism)
+        return _finish(result, complete, transcript, strict)
+
+    key = extraction_key(transcript, fields, provider.model_id, _prompt_version(mode, provider.output_format))
+    if cache is not None:
+        cached = await cache.aget(key)
+        if cached is not None:
+            return attach_spans(cached, transcript)
+
+    async def extract() -> Dict[str, str]:
+        result, complete = await _aextract(provider, transcript, fields, mode, parallelism)
+        if not complete:
+            raise PartialExtraction(result)
+        if cache is not None:
+            await cache.aset(key, result)
+        return result
+
+    led = []
+
+    async def lead() -> Dict[str, str]:
+        led.append(True)
+        return await extract()
+
+    complete = True
+    try:
+        result = await (extract() if coalescer is None else coalescer.do(key, lead))
+    except PartialExtraction as e:
+        complete = False
+        if coalescer is None or led:
+            result = e.result
+        else:
+            # The shared call came back partial: try again alone rather than reuse it
+            try:
+                result, complete = await extract(), True
+            except PartialExtraction as retry:
+                result = retry.result
+    return _finish(result, complete, transcript, strict)
+
+
+def _finish(result: Dict[str, dict], complete: bool, transcript: str, strict: bool) -> Dict[str, dict]:
+    # Spans are attached per caller: coalesced callers may differ in whitespace
+    result = attach_spans(result, transcript)
+    if strict and not complete:
+        raise PartialExtraction(result)
+    return result
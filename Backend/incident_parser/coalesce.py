@@ -0,0 +1,72 @@
+# coalesce.py
+"""
+Single-flight request coalescing.
+
+Concurrent callers asking for the same key share one in-flight extraction
+instead of each firing an identical LLM call. Keys are the same
+content-addressed keys the extraction cache uses (see cache.extraction_key).
+"""
+import asyncio
+import threading
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+def _copy(result):
+    # Every caller gets its own dicts so one caller editing the result can't leak into another
+    if isinstance(result, dict):
+        return {k: dict(v) if isinstance(v, dict) else v for k, v in result.items()}
+    return result
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._leaders = 0
+        self._coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Runs `fn()` for `key` unless a call for the same key is already running,
+        in which case the caller awaits that call's result. The shared call runs
+        as its own task, so a caller disconnecting doesn't cancel it for others.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+            with self._lock:
+                self._leaders += 1
+        else:
+            with self._lock:
+                self._coalesced += 1
+        result = await asyncio.shield(task)
+        return _copy(result)
+
+    def claim(self, key: str) -> Optional[asyncio.Future]:
+        """
+        Registers the caller as the leader for `key` without handing over a
+        coroutine, for work that can't run as one (a streamed response). Returns
+        None if a call for `key` is already running; otherwise a future that
+        do() callers for `key` await and that the leader must resolve with
+        set_result() or set_exception(), also when it is interrupted.
+        """
+        if key in self._inflight:
+            return None
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        future.add_done_callback(lambda _f, k=key: self._inflight.pop(k, None))
+        with self._lock:
+            self._leaders += 1
+        return future
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._inflight),
+                "leaders": self._leaders,
+                "coalesced": self._coalesced,
+            }
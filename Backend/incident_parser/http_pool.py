@@ -0,0 +1,277 @@
+# http_pool.py
+"""
+Pooled keep-alive HTTP clients for the local LLM providers.
+
+Each provider owns one HTTPPool: a requests.Session for the sync path and an
+httpx.AsyncClient for the async path, both keeping connections to the LLM
+server alive. In-flight requests are capped at `max_connections` (and at
+`max_per_host` on the sync path, which can't open more connections than
+that); callers beyond the cap wait in line and show up as `waiting` in the
+pool statistics. Connect retries on either path count as `connect_retries`.
+"""
+import os
+import time
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, asdict
+from typing import AsyncIterator, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+@dataclass
+class PoolConfig:
+    max_connections: int = 8        # concurrent in-flight requests; extra callers queue
+    max_per_host: int = 8           # keep-alive connections kept open to the LLM host
+    max_retries: int = 3            # retries on connect errors only (request never sent)
+    backoff_factor: float = 0.5     # sleep backoff_factor * 2**attempt between retries
+    connect_timeout: float = 10.0
+    read_timeout: float = 300.0
+
+    @classmethod
+    def from_env(cls, prefix: str, **defaults) -> "PoolConfig":
+        """
+        Reads <PREFIX>_POOL_MAX_CONNECTIONS, <PREFIX>_POOL_MAX_PER_HOST,
+        <PREFIX>_MAX_RETRIES, <PREFIX>_RETRY_BACKOFF, <PREFIX>_CONNECT_TIMEOUT
+        and <PREFIX>_READ_TIMEOUT, falling back to `defaults` then class defaults.
+        """
+        config = cls(**defaults)
+        env = {
+            "max_connections": ("POOL_MAX_CONNECTIONS", int),
+            "max_per_host": ("POOL_MAX_PER_HOST", int),
+            "max_retries": ("MAX_RETRIES", int),
+            "backoff_factor": ("RETRY_BACKOFF", float),
+            "connect_timeout": ("CONNECT_TIMEOUT", float),
+            "read_timeout": ("READ_TIMEOUT", float),
+        }
+        for attr, (suffix, cast) in env.items():
+            raw = os.getenv(f"{prefix}_{suffix}")
+            if raw:
+                setattr(config, attr, cast(raw))
+        return config
+
+
+class _CountingRetry(Retry):
+    """urllib3 Retry that reports each retry it grants, so the sync path can count connect_retries."""
+
+    def __init__(self, *args, on_retry=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_retry = on_retry
+
+    def new(self, **kwargs) -> "_CountingRetry":
+        retry = super().new(**kwargs)
+        retry.on_retry = self.on_retry
+        return retry
+
+    def increment(self, *args, **kwargs) -> "_CountingRetry":
+        retry = super().increment(*args, **kwargs)  # raises once retries are exhausted
+        if self.on_retry is not None:
+            self.on_retry()
+        return retry
+
+
+class HTTPPool:
+    def __init__(self, base_url: str, config: Optional[PoolConfig] = None):
+        self.base_url = base_url.rstrip("/")
+        self.config = config or PoolConfig()
+
+        # Sync path: one session, urllib3 retries connect errors with backoff
+        retry = _CountingRetry(
+            total=self.config.max_retries,
+            connect=self.config.max_retries,
+            read=0,
+            status=0,
+            backoff_factor=self.config.backoff_factor,
+            on_retry=self._count_retry,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.config.max_per_host,
+            max_retries=retry,
+            pool_block=True,
+        )
+        self._session = requests.Session()
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        # With pool_block, callers beyond max_per_host would wait inside urllib3 where
+        # they can't be counted; capping the slots there makes them wait (visibly) here
+        self._sync_slots = threading.BoundedSemaphore(min(self.config.max_connections, self.config.max_per_host))
+
+        # Async path: created lazily so it binds to the running event loop
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_slots: Optional[asyncio.Semaphore] = None
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiting = 0
+        self._peak_in_flight = 0
+        self._peak_waiting = 0
+        self._requests = 0
+        self._errors = 0
+        self._retries = 0
+        self._queued = 0
+        self._wait_seconds = 0.0
+
+    # ---- bookkeeping ----
+    def _enter_wait(self) -> None:
+        with self._lock:
+            self._waiting += 1
+            self._queued += 1
+            self._peak_waiting = max(self._peak_waiting, self._waiting)
+
+    def _gave_up_waiting(self) -> None:
+        with self._lock:
+            self._waiting -= 1
+
+    def _acquired(self, waited: bool, wait_seconds: float) -> None:
+        with self._lock:
+            if waited:
+                self._waiting -= 1
+                self._wait_seconds += wait_seconds
+            self._in_flight += 1
+            self._requests += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+
+    def _count_retry(self) -> None:
+        with self._lock:
+            self._retries += 1
+
+    def _released(self, failed: bool) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if failed:
+                self._errors += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "base_url": self.base_url,
+                "config": asdict(self.config),
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "peak_in_flight": self._peak_in_flight,
+                "peak_waiting": self._peak_waiting,
+                "requests": self._requests,
+                "queued_requests": self._queued,
+                "errors": self._errors,
+                "connect_retries": self._retries,
+                "avg_queue_wait_ms": (self._wait_seconds / self._queued * 1000.0) if self._queued else 0.0,
+            }
+
+    # ---- sync path ----
+    def request(self, method: str, path: str, timeout: Optional[tuple] = None, **kwargs) -> requests.Response:
+        waited = not self._sync_slots.acquire(blocking=False)
+        wait_start = time.perf_counter()
+        if waited:
+            self._enter_wait()
+            self._sync_slots.acquire()
+        self._acquired(waited, time.perf_counter() - wait_start)
+
+        failed = True
+        try:
+            response = self._session.request(
+                method,
+                f"{self.base_url}{path}",
+                timeout=timeout or (self.config.connect_timeout, self.config.read_timeout),
+                **kwargs,
+            )
+            failed = False
+            return response
+        finally:
+            self._released(failed)
+            self._sync_slots.release()
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    # ---- async path ----
+    def _get_async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.config.read_timeout, connect=self.config.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.config.max_connections,
+                    max_keepalive_connections=self.config.max_per_host,
+                ),
+            )
+            self._async_slots = asyncio.Semaphore(self.config.max_connections)
+        return self._async_client
+
+    async def _acquire_async_slot(self, slots: asyncio.Semaphore) -> None:
+        waited = slots.locked()
+        wait_start = time.perf_counter()
+        if waited:
+            self._enter_wait()
+        try:
+            await slots.acquire()
+        except BaseException:  # cancelled (e.g. a request timeout) while still queued
+            if waited:
+                self._gave_up_waiting()
+            raise
+        self._acquired(waited, time.perf_counter() - wait_start)
+
+    async def _asend(self, client: httpx.AsyncClient, request: httpx.Request, stream: bool = False) -> httpx.Response:
+        """Sends with the same connect-retry policy as the sync adapter."""
+        for attempt in range(self.config.max_retries + 1):
+            try:
+                return await client.send(request, stream=stream)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if attempt >= self.config.max_retries:
+                    raise
+                self._count_retry()
+                await asyncio.sleep(self.config.backoff_factor * (2 ** attempt))
+
+    async def arequest(self, method: str, path: str, **kwargs) -> httpx.Response:
+        client = self._get_async_client()
+        slots = self._async_slots
+        await self._acquire_async_slot(slots)
+
+        failed = True
+        try:
+            response = await self._asend(client, client.build_request(method, path, **kwargs))
+            failed = False
+            return response
+        finally:
+            self._released(failed)
+            slots.release()
+
+    async def apost(self, path: str, **kwargs) -> httpx.Response:
+        return await self.arequest("POST", path, **kwargs)
+
+    @asynccontextmanager
+    async def astream(self, method: str, path: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """Streaming request; holds a pool slot until the response body is consumed."""
+        client = self._get_async_client()
+        slots = self._async_slots
+        await self._acquire_async_slot(slots)
+
+        failed = True
+        try:
+            response = await self._asend(client, client.build_request(method, path, **kwargs), stream=True)
+            try:
+                yield response
+            finally:
+                await response.aclose()
+            failed = False
+        finally:
+            self._released(failed)
+            slots.release()
+
+    # ---- shutdown ----
+    def close(self) -> None:
+        self._session.close()
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+            self._async_slots = None
+        self.close()
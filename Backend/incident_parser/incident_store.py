@@ -0,0 +1,346 @@
+# incident_store.py
+"""
+Append-only incident storage on SQLite (WAL mode).
+
+Saving an incident is one transactional INSERT, and WAL lets readers browse
+while another dispatcher is saving. Columns follow NERIS_FIELDS; fields added
+to the schema later are added to the table on startup. The legacy
+Frontend/incidents_master.csv (or INCIDENT_CSV_IMPORT) is imported
+automatically the first time an empty database is opened.
+
+Dashboard counts come from an aggregates table (per type, per day, per unit)
+that is updated in the same transaction as each insert, so reading them costs
+the same no matter how long the incident history is.
+
+Browsing uses keyset (cursor) pagination and exports read the table a chunk
+at a time, so neither ever holds the whole history in memory. Typed Parquet
+exports live in analytics.py.
+"""
+import os
+import csv
+import io
+import json
+import base64
+import sqlite3
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Columns the dashboard filters on
+INDEXED_COLUMNS = ["incident_final_type", "fire", "medical", "hazsit", "incident_location"]
+
+# Boolean columns counted in the "type" aggregate, and the values that mean true
+TYPE_FLAGS = ["fire", "medical", "hazsit"]
+TRUTHY = {"true", "yes", "1"}
+
+MAX_PAGE_SIZE = 500
+
+# The CSV store the dashboard used before this database
+DEFAULT_CSV_IMPORT = os.path.normpath(
+    os.path.join(os.path.dirname(__file__), "..", "..", "Frontend", "incidents_master.csv")
+)
+
+# Columns every row has besides the incident fields
+META_COLUMNS = ("id", "created_at")
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _aggregate_keys(record: Dict, created_at: str) -> List[Tuple[str, str]]:
+    """The (dimension, key) counters one incident increments."""
+    keys = [("total", "all"), ("day", created_at[:10])]
+    for flag in TYPE_FLAGS:
+        if str(record.get(flag, "")).strip().lower() in TRUTHY:
+            keys.append(("type", flag))
+    # unit_response looks like "E201 19:47; L107 19:50": count each unit once
+    units = {part.split()[0] for part in str(record.get("unit_response", "") or "").split(";") if part.strip()}
+    keys.extend(("unit", unit) for unit in sorted(units))
+    return keys
+
+
+def _encode_cursor(sort_value, row_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([sort_value, row_id]).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[object, int]:
+    try:
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return sort_value, int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor.")
+
+
+class IncidentStore:
+    def __init__(self, path: str, columns: List[str], migrate_from: Optional[str] = None):
+        self.path = path
+        self.columns = list(columns)
+        self._lock = threading.Lock()
+        self._aggregates_cache: Optional[Tuple[int, Dict[str, Dict[str, int]]]] = None
+        # One connection shared by the server's worker threads; the lock serializes use
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+        if migrate_from:
+            self._migrate_csv(migrate_from)
+
+    @classmethod
+    def from_env(cls, columns: List[str]) -> "IncidentStore":
+        return cls(
+            os.getenv("INCIDENT_DB", "incidents.sqlite3"),
+            columns,
+            # INCIDENT_CSV_IMPORT="" turns the import off
+            migrate_from=os.getenv("INCIDENT_CSV_IMPORT", DEFAULT_CSV_IMPORT) or None,
+        )
+
+    def _create_schema(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS incidents ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, created_at TEXT NOT NULL)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS incident_aggregates ("
+                "dimension TEXT NOT NULL, key TEXT NOT NULL, count INTEGER NOT NULL, "
+                "PRIMARY KEY (dimension, key))"
+            )
+            existing = {row[1] for row in self._conn.execute("PRAGMA table_info(incidents)")}
+            for col in self.columns:
+                if col not in existing:
+                    self._conn.execute(f"ALTER TABLE incidents ADD COLUMN {_quote(col)} TEXT DEFAULT ''")
+            for col in INDEXED_COLUMNS:
+                if col in self.columns:
+                    self._conn.execute(
+                        f"CREATE INDEX IF NOT EXISTS {_quote('idx_incidents_' + col)} ON incidents ({_quote(col)})"
+                    )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_incidents_created_at ON incidents (created_at)")
+            if not self._conn.execute("SELECT 1 FROM meta WHERE key = 'aggregates_built'").fetchone():
+                # Databases created before the aggregates table: backfill once
+                self._rebuild_aggregates()
+
+    def _migrate_csv(self, csv_path: str) -> None:
+        if not os.path.exists(csv_path):
+            return
+        imported_at = datetime.now(timezone.utc).isoformat()
+        with self._lock, self._conn:
+            # BEGIN IMMEDIATE so two servers starting together can't both import
+            self._conn.execute("BEGIN IMMEDIATE")
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = 'csv_migrated'").fetchone():
+                return
+            if self._conn.execute("SELECT 1 FROM incidents LIMIT 1").fetchone():
+                # Only an empty database is seeded; never mix the CSV into existing history
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('csv_migrated', ?)",
+                    (f"{csv_path}: skipped, database not empty",),
+                )
+                return
+            with open(csv_path, newline="", encoding="utf-8") as fh:
+                # Older CSVs use a different column set: map by name, ignore unknown columns
+                rows = [self._row(record) for record in csv.DictReader(fh)]
+            self._conn.executemany(self._insert_sql(), [[imported_at] + row for row in rows])
+            self._bump([dict(zip(self.columns, row)) for row in rows], imported_at)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('csv_migrated', ?)",
+                (f"{csv_path}: {len(rows)} rows",),
+            )
+        print(f"✅ Imported {len(rows)} incidents from {csv_path}")
+
+    def _insert_sql(self) -> str:
+        cols = ", ".join(["created_at"] + [_quote(c) for c in self.columns])
+        marks = ", ".join(["?"] * (len(self.columns) + 1))
+        return f"INSERT INTO incidents ({cols}) VALUES ({marks})"
+
+    def _row(self, record: Dict) -> List[str]:
+        row = []
+        for col in self.columns:
+            v = record.get(col, "")
+            if isinstance(v, dict):
+                v = v.get("value", "")  # {value, confidence} entries straight from extraction
+            row.append("" if v is None or v != v else str(v))  # v != v catches NaN
+        return row
+
+    def _bump(self, records: List[Dict], created_at: str) -> None:
+        # Called inside the insert's transaction so counts never drift from rows
+        counts = Counter(key for record in records for key in _aggregate_keys(record, created_at))
+        self._conn.executemany(
+            "INSERT INTO incident_aggregates (dimension, key, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (dimension, key) DO UPDATE SET count = count + excluded.count",
+            [(dimension, key, n) for (dimension, key), n in counts.items()],
+        )
+
+    def _rebuild_aggregates(self) -> None:
+        self._conn.execute("DELETE FROM incident_aggregates")
+        cols = [c for c in TYPE_FLAGS + ["unit_response"] if c in self.columns]
+        select = ", ".join(["created_at"] + [_quote(c) for c in cols])
+        for row in self._conn.execute(f"SELECT {select} FROM incidents").fetchall():
+            self._bump([dict(zip(cols, row[1:]))], row[0])
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('aggregates_built', '1')")
+
+    def insert(self, record: Dict) -> int:
+        """Stores one {column: value} incident and returns its id."""
+        created_at = datetime.now(timezone.utc).isoformat()
+        row = self._row(record)
+        with self._lock, self._conn:
+            cur = self._conn.execute(self._insert_sql(), [created_at] + row)
+            self._bump([dict(zip(self.columns, row))], created_at)
+            return cur.lastrowid
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM incidents")
+            self._conn.execute("DELETE FROM incident_aggregates")
+        self._aggregates_cache = None
+
+    def aggregates(self) -> Dict[str, Dict[str, int]]:
+        """
+        {"total": {"all": n}, "type": {"fire": n, ...}, "day": {"YYYY-MM-DD": n},
+        "unit": {"E201": n, ...}}. Served from memory until this or another
+        process writes to the database (tracked with PRAGMA data_version).
+        """
+        with self._lock:
+            # data_version only changes for other connections' commits, so add our own writes
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0] + self._conn.total_changes
+            if self._aggregates_cache is not None and self._aggregates_cache[0] == version:
+                return self._aggregates_cache[1]
+            result: Dict[str, Dict[str, int]] = {"total": {"all": 0}, "type": {f: 0 for f in TYPE_FLAGS}, "day": {}, "unit": {}}
+            for dimension, key, count in self._conn.execute("SELECT dimension, key, count FROM incident_aggregates"):
+                result.setdefault(dimension, {})[key] = count
+            self._aggregates_cache = (version, result)
+            return result
+
+    def count(self) -> int:
+        return self.aggregates()["total"]["all"]
+
+    # ---- browsing ----
+    def resolve_columns(self, columns: Optional[List[str]]) -> List[str]:
+        if not columns:
+            return self.columns
+        unknown = [c for c in columns if c not in self.columns and c not in META_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown columns: {unknown}")
+        return list(columns)
+
+    def _where(self, filters: Dict[str, Optional[str]]) -> Tuple[List[str], List]:
+        """
+        filters: type (fire/medical/hazsit, or text matched against
+        incident_final_type), since/until (ISO dates on created_at; until is
+        exclusive), unit (matched in unit_response), location (text matched in
+        incident_location). Text matches are case-insensitive substrings.
+        """
+        clauses, params = [], []
+        incident_type = (filters.get("type") or "").strip().lower()
+        if incident_type in TYPE_FLAGS:
+            clauses.append(f"lower({_quote(incident_type)}) IN ({', '.join('?' * len(TRUTHY))})")
+            params.extend(sorted(TRUTHY))
+        elif incident_type:
+            clauses.append("incident_final_type LIKE ?")
+            params.append(f"%{incident_type}%")
+        if filters.get("since"):
+            clauses.append("created_at >= ?")
+            params.append(filters["since"])
+        if filters.get("until"):
+            clauses.append("created_at < ?")
+            params.append(filters["until"])
+        if filters.get("unit"):
+            clauses.append("unit_response LIKE ?")
+            params.append(f"%{filters['unit']}%")
+        if filters.get("location"):
+            clauses.append("incident_location LIKE ?")
+            params.append(f"%{filters['location']}%")
+        return clauses, params
+
+    def query(
+        self,
+        columns: Optional[List[str]] = None,
+        filters: Optional[Dict[str, Optional[str]]] = None,
+        sort: str = "id",
+        descending: bool = True,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        One page of incidents as dicts (always including id and created_at),
+        plus the cursor for the next page (None on the last page). The cursor
+        holds the last row's sort value and id, so pages stay stable while new
+        incidents are being saved.
+        """
+        columns = self.resolve_columns(columns)
+        if sort not in ("id", "created_at") and sort not in self.columns:
+            raise ValueError(f"Cannot sort by {sort!r}.")
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        clauses, params = self._where(filters or {})
+
+        op, order = ("<", "DESC") if descending else (">", "ASC")
+        sort_col = _quote(sort)
+        if cursor:
+            last_value, last_id = _decode_cursor(cursor)
+            if sort == "id":
+                clauses.append(f"id {op} ?")
+                params.append(last_id)
+            else:
+                clauses.append(f"({sort_col} {op} ? OR ({sort_col} = ? AND id {op} ?))")
+                params.extend([last_value, last_value, last_id])
+
+        select = ", ".join(["id", "created_at"] + [_quote(c) for c in columns if c not in ("id", "created_at")])
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        tiebreak = "" if sort == "id" else f", id {order}"
+        sql = f"SELECT {select}, {sort_col} FROM incidents {where} ORDER BY {sort_col} {order}{tiebreak} LIMIT ?"
+        with self._lock:
+            cur = self._conn.execute(sql, params + [limit + 1])
+            names = [d[0] for d in cur.description][:-1]
+            rows = cur.fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor(rows[-1][-1], rows[-1][0])
+        return [dict(zip(names, row[:-1])) for row in rows], next_cursor
+
+    def iter_rows(
+        self,
+        columns: Optional[List[str]] = None,
+        filters: Optional[Dict[str, Optional[str]]] = None,
+        chunk_rows: int = 1000,
+    ) -> Iterator[List[tuple]]:
+        """Yields matching rows (in id order) a chunk at a time."""
+        columns = self.resolve_columns(columns)
+        select = ", ".join(_quote(c) for c in columns)
+        base_clauses, base_params = self._where(filters or {})
+        last_id = 0
+        while True:
+            # Keyset pagination so each chunk is a short read and saves aren't blocked
+            clauses = base_clauses + ["id > ?"]
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT id, {select} FROM incidents WHERE {' AND '.join(clauses)} ORDER BY id LIMIT ?",
+                    base_params + [last_id, chunk_rows],
+                ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield [row[1:] for row in rows]
+
+    def iter_csv(
+        self,
+        columns: Optional[List[str]] = None,
+        filters: Optional[Dict[str, Optional[str]]] = None,
+        chunk_rows: int = 1000,
+    ) -> Iterator[str]:
+        """Yields the matching incidents as CSV text, header first."""
+        columns = self.resolve_columns(columns)
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(columns)
+        yield buf.getvalue()
+        for rows in self.iter_rows(columns, filters, chunk_rows):
+            buf.seek(0)
+            buf.truncate()
+            writer.writerows(rows)
+            yield buf.getvalue()
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,309 @@
+# jobs.py
+"""
+Asynchronous extraction jobs.
+
+POST /jobs enqueues a transcript and returns a job id straight away; a small
+worker pool runs the extraction and clients poll GET /jobs/{id} or register a
+webhook that receives the finished job. Long extractions then no longer hold
+a proxy connection open for minutes.
+
+Job state lives in a pluggable JobStore: InMemoryJobStore for a single process,
+SQLiteJobStore to keep jobs (and requeue unfinished ones) across restarts.
+
+Webhook URLs must not point into the server's own network: hosts that resolve
+to private, loopback, link-local or otherwise non-global addresses are
+rejected, unless they are listed in JOB_WEBHOOK_ALLOWED_HOSTS. When that list
+is set, only its hosts are accepted at all.
+"""
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import ipaddress
+import threading
+from dataclasses import dataclass, field, asdict
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from urllib.parse import urlsplit
+
+import httpx
+
+from .cache import is_empty_result
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+
+class QueueFull(Exception):
+    """Raised when the job queue is at its maximum depth."""
+
+
+class InvalidWebhook(ValueError):
+    """The webhook URL is malformed, not allowed, or resolves to a non-public address."""
+
+
+@dataclass
+class Job:
+    id: str
+    transcript: str
+    status: str = QUEUED
+    webhook_url: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, dict]] = None
+    error: Optional[str] = None
+    webhook_status: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data.pop("transcript")
+        return data
+
+
+# ---- Stores ----
+class JobStore:
+    def save(self, job: Job) -> None:
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Job]:
+        raise NotImplementedError
+
+    def unfinished(self) -> List[Job]:
+        """Jobs that were queued or running when the previous process stopped."""
+        return []
+
+    def close(self) -> None:
+        return None
+
+
+class InMemoryJobStore(JobStore):
+    def __init__(self, max_finished: int = 10000):
+        self.max_finished = max_finished
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def save(self, job: Job) -> None:
+        with self._lock:
+            self._jobs[job.id] = job
+            if len(self._jobs) > self.max_finished:
+                # Drop the oldest finished jobs; queued/running ones are kept
+                finished = [j for j in self._jobs.values() if j.status in (SUCCEEDED, FAILED)]
+                finished.sort(key=lambda j: j.finished_at or 0)
+                for old in finished[: len(self._jobs) - self.max_finished]:
+                    del self._jobs[old.id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+class SQLiteJobStore(JobStore):
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, status TEXT NOT NULL, created_at REAL NOT NULL, data TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)")
+        self._conn.commit()
+
+    def save(self, job: Job) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, status, created_at, data) VALUES (?, ?, ?, ?)",
+                (job.id, job.status, job.created_at, json.dumps(asdict(job), ensure_ascii=False)),
+            )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job(**json.loads(row[0])) if row else None
+
+    def unfinished(self) -> List[Job]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM jobs WHERE status IN (?, ?) ORDER BY created_at", (QUEUED, RUNNING)
+            ).fetchall()
+        return [Job(**json.loads(row[0])) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def job_store_from_env() -> JobStore:
+    """JOB_STORE=memory (default) or sqlite; JOB_DB sets the SQLite path."""
+    kind = (os.getenv("JOB_STORE") or "memory").lower()
+    if kind == "memory":
+        return InMemoryJobStore()
+    elif kind == "sqlite":
+        return SQLiteJobStore(os.getenv("JOB_DB", "jobs.sqlite3"))
+    else:
+        raise ValueError(f"Unknown job store: {kind}. Use 'memory' or 'sqlite'")
+
+
+# ---- Queue ----
+class JobQueue:
+    def __init__(
+        self,
+        store: JobStore,
+        run: Callable[[str], Awaitable[Dict[str, dict]]],
+        workers: int = 2,
+        max_depth: int = 100,
+        webhook_timeout: float = 10.0,
+        webhook_hosts: Optional[Set[str]] = None,
+    ):
+        self.store = store
+        self.run = run
+        self.workers = workers
+        self.max_depth = max_depth
+        self.webhook_timeout = webhook_timeout
+        # Empty: any host with public addresses; otherwise only these hosts
+        self.webhook_hosts = {h.lower() for h in webhook_hosts or ()}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._webhooks: Optional[httpx.AsyncClient] = None
+        self._requeue_pending = 0
+
+    @classmethod
+    def from_env(cls, run: Callable[[str], Awaitable[Dict[str, dict]]]) -> "JobQueue":
+        return cls(
+            job_store_from_env(),
+            run,
+            workers=int(os.getenv("JOB_WORKERS", "2")),
+            max_depth=int(os.getenv("JOB_MAX_QUEUE_DEPTH", "100")),
+            webhook_timeout=float(os.getenv("JOB_WEBHOOK_TIMEOUT", "10")),
+            webhook_hosts={h.strip() for h in os.getenv("JOB_WEBHOOK_ALLOWED_HOSTS", "").split(",") if h.strip()},
+        )
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.max_depth)
+        self._webhooks = httpx.AsyncClient(timeout=self.webhook_timeout)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        unfinished = self.store.unfinished()
+        if unfinished:
+            self._tasks.append(asyncio.create_task(self._requeue(unfinished)))
+
+    async def _requeue(self, jobs: List[Job]) -> None:
+        """
+        Requeues work a previous process accepted but never finished. Jobs
+        beyond max_depth wait here (still QUEUED in the store) until the
+        workers make room, rather than being dropped.
+        """
+        self._requeue_pending = len(jobs)
+        for job in jobs:
+            job.status, job.started_at = QUEUED, None
+            await self._save(job)
+            await self._queue.put(job.id)
+            self._requeue_pending -= 1
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._webhooks is not None:
+            await self._webhooks.aclose()
+        self.store.close()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def submit(self, transcript: str, webhook_url: Optional[str] = None) -> Job:
+        if self._queue is None:
+            raise RuntimeError("JobQueue.start() has not been called.")
+        if self._queue.full():
+            raise QueueFull(f"Job queue is full ({self.max_depth} queued).")
+        job = Job(id=uuid.uuid4().hex, transcript=transcript, webhook_url=webhook_url)
+        self.store.save(job)  # before the id is queued, so a worker always finds it
+        self._queue.put_nowait(job.id)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.store.get(job_id)
+
+    async def check_webhook(self, url: str) -> None:
+        """Raises InvalidWebhook unless `url` is an http(s) URL the server may call."""
+        try:
+            parts = urlsplit(url)
+            port = parts.port or (443 if parts.scheme == "https" else 80)
+        except ValueError:
+            raise InvalidWebhook("'webhook_url' is not a valid URL.")
+        host = (parts.hostname or "").lower()
+        if parts.scheme not in ("http", "https") or not host:
+            raise InvalidWebhook("'webhook_url' must be an http(s) URL.")
+        if self.webhook_hosts:
+            if host not in self.webhook_hosts:
+                raise InvalidWebhook(f"Webhook host {host} is not in JOB_WEBHOOK_ALLOWED_HOSTS.")
+            return  # explicitly allowed, internal addresses included
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port)
+        except OSError:
+            raise InvalidWebhook(f"Webhook host {host} does not resolve.")
+        for info in infos:
+            address = ipaddress.ip_address(info[4][0].split("%")[0])
+            if not address.is_global:
+                raise InvalidWebhook(f"Webhook host {host} resolves to a non-public address ({address}).")
+
+    async def _save(self, job: Job) -> None:
+        # SQLiteJobStore writes block; keep them off the event loop (as cache.aset does)
+        await asyncio.to_thread(self.store.save, job)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                job = await asyncio.to_thread(self.store.get, job_id)
+                if job is not None:
+                    await self._execute(job)
+            finally:
+                self._queue.task_done()
+
+    async def _execute(self, job: Job) -> None:
+        job.status, job.started_at = RUNNING, time.time()
+        await self._save(job)
+        try:
+            result = await self.run(job.transcript)
+            if is_empty_result(result):
+                # Failed provider calls come back as empty defaults, not exceptions
+                raise RuntimeError("Extraction returned no fields (provider call or parse failed).")
+            job.result, job.status = result, SUCCEEDED
+        except asyncio.CancelledError:
+            # Shutting down: leave it queued so a persistent store can pick it up again
+            job.status, job.started_at = QUEUED, None
+            await self._save(job)
+            raise
+        except Exception as e:
+            job.status, job.error = FAILED, str(e)
+        job.finished_at = time.time()
+        await self._save(job)
+        if job.webhook_url:
+            await self._notify(job)
+
+    async def _notify(self, job: Job) -> None:
+        try:
+            # Checked again at delivery: DNS may have changed since the job was accepted
+            await self.check_webhook(job.webhook_url)
+            response = await self._webhooks.post(job.webhook_url, json=job.to_dict())
+            job.webhook_status = str(response.status_code)
+        except InvalidWebhook as e:
+            print(f"⚠️  Webhook for job {job.id} refused: {e}")
+            job.webhook_status = f"refused: {e}"
+        except httpx.HTTPError as e:
+            print(f"⚠️  Webhook for job {job.id} failed: {e}")
+            job.webhook_status = f"error: {e}"
+        await self._save(job)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.depth,
+            "max_depth": self.max_depth,
+            "workers": self.workers,
+            "requeue_pending": self._requeue_pending,
+        }
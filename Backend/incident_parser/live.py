@@ -0,0 +1,145 @@
+# live.py
+"""
+Live incident dictation over a WebSocket.
+
+The client streams raw 16-bit mono PCM frames. LiveSession cuts them into
+utterances with UtteranceSegmenter, transcribes each utterance on the shared
+Whisper pool as soon as it closes, and sends back the utterance plus the
+rolling transcript. Optionally it re-runs field extraction in the background
+once enough new text has arrived since the last extraction.
+
+Messages sent to the client (JSON):
+    {"type": "utterance", "start", "end", "text", "transcript"}
+    {"type": "fields", "fields", "transcript_chars"}
+    {"type": "final", "transcript"}
+    {"type": "error", "detail"}
+
+If a send fails (the client vanished mid-message, or a message didn't
+serialize) the failure is logged, the socket is closed with 1011 and the
+session stops sending.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from .vad import Utterance, UtteranceSegmenter
+
+# How much of the transcript is passed to Whisper as context for the next chunk
+_PROMPT_CHARS = 200
+
+# PCM sample rates accepted from clients
+MIN_SAMPLE_RATE, MAX_SAMPLE_RATE = 8000, 48000
+
+
+class LiveSession:
+    def __init__(
+        self,
+        transcribe_pcm: Callable[[bytes, int, str], Awaitable[dict]],
+        send: Callable[[dict], Awaitable[None]],
+        sample_rate: int = 16000,
+        extract: Optional[Callable[[str], Awaitable[Dict[str, dict]]]] = None,
+        extract_min_chars: int = 200,
+        close: Optional[Callable[[int], Awaitable[None]]] = None,
+    ):
+        if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+            raise ValueError(f"sample_rate must be between {MIN_SAMPLE_RATE} and {MAX_SAMPLE_RATE} Hz.")
+        self.transcribe_pcm = transcribe_pcm
+        self.send = send
+        self.close = close
+        self.closed = False
+        self.sample_rate = sample_rate
+        self.extract = extract
+        self.extract_min_chars = extract_min_chars
+        self.segmenter = UtteranceSegmenter(sample_rate)
+        self.parts: List[str] = []
+        self._utterances: asyncio.Queue = asyncio.Queue()
+        self._consumer = asyncio.create_task(self._consume())
+        self._extraction: Optional[asyncio.Task] = None
+        self._extracted_chars = 0
+
+    @property
+    def transcript(self) -> str:
+        return " ".join(self.parts)
+
+    def push_audio(self, pcm: bytes) -> None:
+        # Only segmentation happens here; transcription runs in the consumer task
+        # so receiving frames never waits on Whisper
+        for utterance in self.segmenter.push(pcm):
+            self._utterances.put_nowait(utterance)
+
+    async def finish(self) -> str:
+        """Flushes the open utterance, waits for outstanding work and sends the final transcript."""
+        for utterance in self.segmenter.flush():
+            self._utterances.put_nowait(utterance)
+        self._utterances.put_nowait(None)
+        await self._consumer
+        if self.extract is not None and len(self.transcript) > self._extracted_chars:
+            if self._extraction is not None:
+                await self._extraction
+            await self._run_extraction()
+        await self._send({"type": "final", "transcript": self.transcript})
+        return self.transcript
+
+    async def cancel(self) -> None:
+        for task in (self._consumer, self._extraction):
+            if task is not None and not task.done():
+                task.cancel()
+
+    async def _send(self, message: dict) -> bool:
+        if self.closed:
+            return False
+        try:
+            await self.send(message)
+            return True
+        except Exception as e:
+            print(f"⚠️  Live session send failed ({type(e).__name__}: {e}); closing the socket")
+            self.closed = True
+            if self.close is not None:
+                try:
+                    await self.close(1011)
+                except Exception:
+                    pass  # already closed by the client
+            return False
+
+    async def _consume(self) -> None:
+        while True:
+            utterance: Optional[Utterance] = await self._utterances.get()
+            if utterance is None or self.closed:
+                return
+            try:
+                prompt = self.transcript[-_PROMPT_CHARS:]
+                result = await self.transcribe_pcm(utterance.pcm, self.sample_rate, prompt)
+            except Exception as e:
+                await self._send({"type": "error", "detail": f"Transcription failed: {e}"})
+                continue
+            text = result.get("text", "")
+            if not text:
+                continue
+            self.parts.append(text)
+            sent = await self._send({
+                "type": "utterance",
+                "start": utterance.start,
+                "end": utterance.end,
+                "text": text,
+                "transcript": self.transcript,
+            })
+            if not sent:
+                return
+            self._maybe_extract()
+
+    def _maybe_extract(self) -> None:
+        if self.extract is None:
+            return
+        if self._extraction is not None and not self._extraction.done():
+            return  # one extraction at a time; the next one picks up the newer text
+        if len(self.transcript) - self._extracted_chars >= self.extract_min_chars:
+            self._extraction = asyncio.create_task(self._run_extraction())
+
+    async def _run_extraction(self) -> None:
+        transcript = self.transcript
+        self._extracted_chars = len(transcript)
+        try:
+            fields = await self.extract(transcript)
+        except Exception as e:
+            await self._send({"type": "error", "detail": f"Extraction failed: {e}"})
+            return
+        await self._send({"type": "fields", "fields": fields, "transcript_chars": len(transcript)})
@@ -6,21 +6,23 @@ Completely free and private - no data leaves your server.
 import os
 import json
 import requests
-from typing import Dict, List
-from .prompt import build_extraction_prompt, field_descriptions
-
-class LLMProvider:
-    def extract_fields(self, transcript: str, fields: List[str]) -> Dict[str, str]:
-        raise NotImplementedError
+import httpx
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from .prompt import build_extraction_prompt, field_descriptions, output_format_from_env, output_token_budget
+from .http_pool import HTTPPool, PoolConfig
+from .normalize import decode_entry, empty_entry, empty_fields
+from .providers import LLMProvider, UnparseableReply
+from .schema import constrained_decoding_from_env, extraction_schema
+from .streaming import IncrementalFieldParser
 
 
 class OllamaProvider(LLMProvider):
     """
     Local LLM provider using Ollama.
-    
+
     Install Ollama: https://ollama.ai/
     Then run: ollama pull qwen2.5:7b
-    
+
     This is 100% free and private - no external API calls.
     """
     def __init__(
@@ -29,219 +31,229 @@ class OllamaProvider(LLMProvider):
         base_url: str = None,
         temperature: float = 0.0,
         max_tokens: int = 4096,
+        pool_config: Optional[PoolConfig] = None,
+        output_format: Optional[str] = None,
+        constrained: Optional[bool] = None,
     ):
+        super().__init__()
         # Read from environment variables if not provided
         self.model_name = model_name or os.getenv("OLLAMA_MODEL", "qwen2.5:7b")
         self.base_url = base_url or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
         self.temperature = temperature
-        self.max_tokens = max_tokens
-        
-    def extract_fields(self, transcript: str, fields: List[str]) -> Dict[str, dict]:
+        self.max_tokens = max_tokens  # upper bound; each request asks for output_token_budget(len(fields))
+        self.output_format = output_format or output_format_from_env()
+        # Grammar-constrained decoding against extraction_schema(); off -> plain JSON mode
+        self.constrained = constrained_decoding_from_env() if constrained is None else constrained
+        # How long Ollama keeps the model (and the KV cache of the shared prompt prefix) loaded
+        self.keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+        # Keep-alive connection pool; read timeout is long for slower CPU models
+        self.http = HTTPPool(self.base_url, pool_config or PoolConfig.from_env("OLLAMA", read_timeout=300.0))
+
+    @property
+    def model_id(self) -> str:
+        # Constrained and plain JSON-mode replies differ, so they're cached apart
+        return f"ollama:{self.model_name}" + ("+schema" if self.constrained else "")
+
+    def warm_up(self) -> None:
         """
-        Extracts fields using local Ollama LLM.
-        Returns: {"field_name": {"value": "...", "confidence": 0.x}}
+        Ask Ollama to load the model into memory so the first real request
+        doesn't pay the model load time. An empty prompt only loads the model.
         """
-        prompt = build_extraction_prompt(transcript, fields, field_descriptions=field_descriptions)
-        
-        payload = {
+        try:
+            response = self.http.post(
+                "/api/generate",
+                json={"model": self.model_name, "prompt": "", "stream": False, "keep_alive": self.keep_alive},
+            )
+            response.raise_for_status()
+            print(f"✅ Ollama model warmed up: {self.model_name}")
+        except requests.exceptions.RequestException as e:
+            print(f"⚠️  Ollama warm-up failed: {e}")
+
+    def pool_stats(self) -> dict:
+        return self.http.stats()
+
+    def health_check(self) -> bool:
+        try:
+            self.http.get("/api/tags", timeout=(self.http.config.connect_timeout, 5.0)).raise_for_status()
+            return True
+        except requests.exceptions.RequestException:
+            return False
+
+    def close(self) -> None:
+        self.http.close()
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+    def _build_request(self, transcript: str, fields: List[str]) -> dict:
+        prompt = build_extraction_prompt(transcript, fields, field_descriptions=field_descriptions, output_format=self.output_format)
+        return {
             "model": self.model_name,
             "prompt": prompt,
             "stream": False,
+            "keep_alive": self.keep_alive,
             "options": {
                 "temperature": self.temperature,
-                "num_predict": self.max_tokens,
+                "num_predict": output_token_budget(len(fields), self.output_format, self.max_tokens),
             },
-            "format": "json",  # Force JSON output
+            # Force JSON output; with a schema Ollama also constrains keys and value types
+            "format": extraction_schema(fields, self.output_format) if self.constrained else "json",
         }
-        
-        try:
-            print(f"🔍 Calling Ollama: {self.base_url}/api/generate")
-            print(f"🔍 Model: {self.model_name}")
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json=payload,
-                timeout=300  # 5 minutes max for slower models
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            text = result.get("response", "").strip()
-            print(f"🔍 Ollama response length: {len(text)} chars")
-            print(f"🔍 First 200 chars: {text[:200]}")
-            
-            # Parse JSON response
-            data = self._safe_json(text)
-            print(f"🔍 Parsed JSON keys: {list(data.keys())[:10]}")
-            results = {}
-            
-            for f in fields:
-                entry = data.get(f, {})
-                if isinstance(entry, dict):
-                    val = str(entry.get("value", "")).strip()
-                    conf = entry.get("confidence", 0.0)
-                    
-                    # Set confidence=0 if value is empty
-                    if val == "":
-                        conf = 0.0
-                    
-                    # Sanitize confidence
-                    try:
-                        conf = float(conf)
-                    except Exception:
-                        conf = 0.0
-                    conf = max(0.0, min(conf, 1.0))
-                    
-                    results[f] = {"value": val, "confidence": conf}
-                else:
-                    results[f] = {"value": str(entry).strip(), "confidence": 0.0}
-            
-            return results
-            
-        except requests.exceptions.RequestException as e:
+
+    def _reply_text(self, result: dict) -> str:
+        text = result.get("response", "").strip()
+        print(f"🔍 Ollama response length: {len(text)} chars")
+        print(f"🔍 First 200 chars: {text[:200]}")
+        return text
+
+    def _report_error(self, e: Exception, fields: List[str]) -> Dict[str, dict]:
+        if isinstance(e, (requests.exceptions.RequestException, httpx.HTTPError)):
             print(f"❌ Ollama API error: {e}")
             print("⚠️  Make sure Ollama is running: ollama serve")
             print(f"⚠️  Make sure model is installed: ollama pull {self.model_name}")
-            # Return empty defaults
-            return {f: {"value": "", "confidence": 0.0} for f in fields}
-        except Exception as e:
-            print(f"❌ Unexpected error: {e}")
-            return {f: {"value": "", "confidence": 0.0} for f in fields}
-    
-    @staticmethod
-    def _safe_json(text: str) -> dict:
-        """Attempts to parse JSON safely."""
-        t = (text or "").strip()
-        
-        # Try direct parse
-        try:
-            return json.loads(t)
-        except Exception:
-            pass
-        
-        # Try stripping Markdown fences
-        if t.startswith("```"):
-            t2 = t.strip("`")
-            if t2.lower().startswith("json"):
-                t2 = t2[4:].strip()
-            try:
-                return json.loads(t2)
-            except Exception:
-                pass
-        
-        # Try substring between first and last braces
-        start, end = t.find("{"), t.rfind("}")
-        if start != -1 and end != -1:
-            try:
-                return json.loads(t[start:end+1])
-            except Exception:
-                pass
-        
-        # If nothing works, return empty dict
-        return {}
+            return empty_fields(fields)
+        return super()._report_error(e, fields)
+
+    def _send(self, payload: dict) -> str:
+        print(f"🔍 Calling Ollama: {self.base_url}/api/generate")
+        print(f"🔍 Model: {self.model_name}")
+        response = self.http.post("/api/generate", json=payload)
+        response.raise_for_status()
+        return self._reply_text(response.json())
+
+    async def _asend(self, payload: dict) -> str:
+        # Awaits Ollama on the pooled AsyncClient so the event loop keeps serving other requests
+        print(f"🔍 Calling Ollama (async): {self.base_url}/api/generate")
+        print(f"🔍 Model: {self.model_name}")
+        response = await self.http.apost("/api/generate", json=payload)
+        response.raise_for_status()
+        return self._reply_text(response.json())
+
+    async def astream_fields(self, transcript: str, fields: List[str]) -> AsyncIterator[Tuple[str, dict]]:
+        """
+        Streams Ollama's tokens and yields each requested field as soon as its
+        {value, confidence} object is complete. Fields the model left out are
+        yielded with empty defaults at the end. HTTP errors propagate, and a
+        stream that ends before the JSON object closes (truncated output)
+        raises UnparseableReply after the fields that did complete.
+        """
+        payload = self._build_request(transcript, fields)
+        payload["stream"] = True
+        wanted = set(fields)
+        seen = set()
+        parser = IncrementalFieldParser()
+
+        async with self.http.astream("POST", "/api/generate", json=payload) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                for key, entry in parser.feed(chunk.get("response", "")):
+                    decoded = decode_entry(key, entry, self.output_format)
+                    if decoded is not None and decoded[0] in wanted and decoded[0] not in seen:
+                        seen.add(decoded[0])
+                        yield decoded
+                if chunk.get("done") or parser.done:
+                    break
+        self.parsing.record("direct" if parser.done else "failed")
+        if not parser.done:
+            raise UnparseableReply(f"stream from {self.model_id} ended before the JSON object closed")
+
+        for f in fields:
+            if f not in seen:
+                yield f, empty_entry()
 
 
 class VLLMProvider(LLMProvider):
     """
     Alternative: Local LLM provider using vLLM server.
-    
+
     More efficient for high-throughput use cases.
     Install: pip install vllm
     Run: python -m vllm.entrypoints.openai.api_server --model Qwen/Qwen2.5-7B-Instruct
     """
     def __init__(
         self,
-        model_name: str = "Qwen/Qwen2.5-7B-Instruct",
-        base_url: str = "http://localhost:8000/v1",
+        model_name: str = None,
+        base_url: str = None,
         temperature: float = 0.0,
         max_tokens: int = 4096,
+        pool_config: Optional[PoolConfig] = None,
+        output_format: Optional[str] = None,
+        constrained: Optional[bool] = None,
     ):
-        self.model_name = model_name
-        self.base_url = base_url
+        super().__init__()
+        self.model_name = model_name or os.getenv("VLLM_MODEL", "Qwen/Qwen2.5-7B-Instruct")
+        self.base_url = base_url or os.getenv("VLLM_BASE_URL", "http://localhost:8000/v1")
         self.temperature = temperature
-        self.max_tokens = max_tokens
-        
-    def extract_fields(self, transcript: str, fields: List[str]) -> Dict[str, dict]:
-        """
-        Extracts fields using vLLM server (OpenAI-compatible API).
-        """
-        prompt = build_extraction_prompt(transcript, fields, field_descriptions=field_descriptions)
-        
-        payload = {
+        self.max_tokens = max_tokens  # upper bound; each request asks for output_token_budget(len(fields))
+        self.output_format = output_format or output_format_from_env()
+        # Grammar-constrained decoding against extraction_schema(); off -> plain JSON mode
+        self.constrained = constrained_decoding_from_env() if constrained is None else constrained
+        self.http = HTTPPool(self.base_url, pool_config or PoolConfig.from_env("VLLM", read_timeout=120.0))
+
+    @property
+    def model_id(self) -> str:
+        return f"vllm:{self.model_name}" + ("+schema" if self.constrained else "")
+
+    def warm_up(self) -> None:
+        """Checks that the vLLM server is reachable and serving the model."""
+        try:
+            response = self.http.get("/models", timeout=(self.http.config.connect_timeout, 10.0))
+            response.raise_for_status()
+            print(f"✅ vLLM server reachable: {self.base_url}")
+        except requests.exceptions.RequestException as e:
+            print(f"⚠️  vLLM warm-up failed: {e}")
+
+    def pool_stats(self) -> dict:
+        return self.http.stats()
+
+    def health_check(self) -> bool:
+        try:
+            self.http.get("/models", timeout=(self.http.config.connect_timeout, 5.0)).raise_for_status()
+            return True
+        except requests.exceptions.RequestException:
+            return False
+
+    def close(self) -> None:
+        self.http.close()
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+    def _build_request(self, transcript: str, fields: List[str]) -> dict:
+        prompt = build_extraction_prompt(transcript, fields, field_descriptions=field_descriptions, output_format=self.output_format)
+        return {
             "model": self.model_name,
             "messages": [
                 {"role": "system", "content": "You are a helpful assistant that extracts structured incident data."},
                 {"role": "user", "content": prompt}
             ],
             "temperature": self.temperature,
-            "max_tokens": self.max_tokens,
-            "response_format": {"type": "json_object"}
+            "max_tokens": output_token_budget(len(fields), self.output_format, self.max_tokens),
+            "response_format": self._response_format(fields),
         }
-        
-        try:
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                json=payload,
-                timeout=120
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            text = result["choices"][0]["message"]["content"].strip()
-            
-            # Parse JSON response
-            data = self._safe_json(text)
-            results = {}
-            
-            for f in fields:
-                entry = data.get(f, {})
-                if isinstance(entry, dict):
-                    val = str(entry.get("value", "")).strip()
-                    conf = entry.get("confidence", 0.0)
-                    
-                    if val == "":
-                        conf = 0.0
-                    
-                    try:
-                        conf = float(conf)
-                    except Exception:
-                        conf = 0.0
-                    conf = max(0.0, min(conf, 1.0))
-                    
-                    results[f] = {"value": val, "confidence": conf}
-                else:
-                    results[f] = {"value": str(entry).strip(), "confidence": 0.0}
-            
-            return results
-            
-        except Exception as e:
-            print(f"❌ vLLM API error: {e}")
-            return {f: {"value": "", "confidence": 0.0} for f in fields}
-    
-    @staticmethod
-    def _safe_json(text: str) -> dict:
-        """Attempts to parse JSON safely."""
-        t = (text or "").strip()
-        
-        try:
-            return json.loads(t)
-        except Exception:
-            pass
-        
-        if t.startswith("```"):
-            t2 = t.strip("`")
-            if t2.lower().startswith("json"):
-                t2 = t2[4:].strip()
-            try:
-                return json.loads(t2)
-            except Exception:
-                pass
-        
-        start, end = t.find("{"), t.rfind("}")
-        if start != -1 and end != -1:
-            try:
-                return json.loads(t[start:end+1])
-            except Exception:
-                pass
-        
-        return {}
 
+    def _response_format(self, fields: List[str]) -> dict:
+        if not self.constrained:
+            return {"type": "json_object"}
+        # vLLM's guided decoding via the OpenAI-compatible structured output API
+        return {
+            "type": "json_schema",
+            "json_schema": {"name": "incident_fields", "schema": extraction_schema(fields, self.output_format)},
+        }
+
+    def _report_error(self, e: Exception, fields: List[str]) -> Dict[str, dict]:
+        print(f"❌ vLLM API error: {e}")
+        return empty_fields(fields)
+
+    def _send(self, payload: dict) -> str:
+        response = self.http.post("/chat/completions", json=payload)
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"] or ""
+
+    async def _asend(self, payload: dict) -> str:
+        response = await self.http.apost("/chat/completions", json=payload)
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"] or ""
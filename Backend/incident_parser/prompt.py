@@ -1,10 +1,15 @@
 # prompt.py
-from typing import List, Dict, Optional
+import os
+import hashlib
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Dict, Optional, Sequence, Tuple
 
 SYSTEM_INSTRUCTIONS = (
     "Return ONLY a single valid JSON object (no code fences, no explanation, no extra text). "
-    "The JSON must use double quotes for keys and values, contain EXACTLY the requested keys, and each value must be an object with 'value' and 'confidence'. "
-    "For example: {\"incident_type\":{\"value\":\"Fire\",\"confidence\":0.92}}."
+    "The JSON must use double quotes for keys and values, contain EXACTLY the requested keys, and each value must be an object with 'value', 'confidence' and 'evidence'. "
+    "For example: {\"incident_type\":{\"value\":\"Fire\",\"confidence\":0.92,\"evidence\":\"smoke showing\"}}."
 )
 
 field_descriptions = {
@@ -48,19 +53,61 @@ field_descriptions = {
     "structure_arrival_conditions": "Fire conditions observed when responders arrived.",
     "structure_progression_conditions": "Whether the fire progressed beyond arrival conditions.",
     "structure_damage": "Extent or rating of damage to the building of origin.",
-    "structure_floor_of_origin": "Floor or story where the fire originated.",
+    "structure_floor_of_origin": "Floor or story where the fire originated, as a number (e.g., 2).",
     "structure_room_of_origin": "Room or area where the fire started.",
     "structure_fire_cause": "Likely or determined cause of the structure fire.",
     "outside_fire_cause": "Likely or determined cause of the outdoor fire.",
     "outside_fire_acres_burned": "Estimated number of acres burned in the outdoor fire."
 }
 
-def build_extraction_prompt(
-    transcript: str,
-    fields: List[str],
-    field_descriptions: Optional[Dict[str, str]] = None
-) -> str:
-    
+# Module-level descriptions, under a name the function parameters don't shadow
+_FIELD_DESCRIPTIONS = field_descriptions
+
+# "full": every requested key as {"value", "confidence", "evidence"}.
+# "compact": only the fields found, under short aliases, as [value, confidence, evidence];
+# the providers fill in the missing fields with empty defaults.
+OUTPUT_FORMATS = ("full", "compact")
+
+
+def output_format_from_env() -> str:
+    output_format = (os.getenv("EXTRACTION_OUTPUT_FORMAT") or "full").lower()
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}. Use one of {', '.join(OUTPUT_FORMATS)}")
+    return output_format
+
+
+def _build_aliases(fields: Sequence[str]) -> Dict[str, str]:
+    # Initials of each word ("incident_final_type" -> "ift"); short single words
+    # keep up to 4 letters; collisions get a numeric suffix
+    aliases: Dict[str, str] = {}
+    for f in fields:
+        parts = f.split("_")
+        base = "".join(p[0] for p in parts) if len(parts) > 1 else f[:4]
+        alias, n = base, 2
+        while alias in aliases.values():
+            alias, n = f"{base}{n}", n + 1
+        aliases[f] = alias
+    return aliases
+
+
+FIELD_ALIASES: Dict[str, str] = _build_aliases(list(field_descriptions))
+ALIAS_FIELDS: Dict[str, str] = {alias: f for f, alias in FIELD_ALIASES.items()}
+
+# Output tokens allowed per requested field, plus a fixed allowance for braces etc.
+_TOKENS_PER_FIELD = {"full": 48, "compact": 32}
+_TOKENS_OVERHEAD = 32
+
+
+def output_token_budget(n_fields: int, output_format: str = "full", cap: int = 4096) -> int:
+    """
+    Generation limit for one extraction: enough for every field to be found
+    with a short value and evidence quote, never more than `cap`.
+    """
+    return min(cap, _TOKENS_OVERHEAD + _TOKENS_PER_FIELD[output_format] * n_fields)
+
+
+def _render_prefix(fields: Sequence[str], field_descriptions: Optional[Dict[str, str]]) -> str:
+    """Everything before the transcript: instructions, keys, descriptions and rules."""
     # Format the wanted fields as a JSON array string
     wanted_json_array = "[" + ", ".join(f"\"{f}\"" for f in fields) + "]"
 
@@ -83,18 +130,104 @@ Requested fields (exact keys):
 
 {desc_block}RULES (follow exactly):
 1. Output: A SINGLE compact JSON object and NOTHING else.
-   Example: {{"incident_final_type": {{"value": "fire", "confidence": 0.92}}}}.
+   Example: {{"incident_final_type": {{"value": "fire", "confidence": 0.92, "evidence": "kitchen fire"}}}}.
 2. The JSON MUST contain EXACTLY the keys listed above.
 3. Each key's value MUST be an object containing:
    - "value": extracted text (or "" if not found)
    - "confidence": number 0.0–1.0 representing certainty.
-4. No keys other than 'value' and 'confidence'.
+   - "evidence": the shortest phrase from the TRANSCRIPT supporting the value, copied
+     character-for-character (or "" if the value is empty or inferred).
+4. No keys other than 'value', 'confidence' and 'evidence'.
 5. Keep all values short and factual (single line).
 6. Booleans → "true"/"false"; Numbers → strings.
 7. Lists → items joined by "; ".
 8. If uncertain, return empty string for value and 0.0 for confidence.
 
 TRANSCRIPT:
-{transcript}
 """
 
+
+def _render_compact_prefix(fields: Sequence[str], field_descriptions: Optional[Dict[str, str]]) -> str:
+    """Prefix for the compact contract: field codes instead of full keys, found fields only."""
+    lines = []
+    for f in fields:
+        d = (field_descriptions or {}).get(f, "").strip().replace("\n", " ")
+        lines.append(f"{FIELD_ALIASES.get(f, f)} = {f}" + (f": {d}" if d else ""))
+    codes = "\n".join(lines)
+
+    return f"""Return ONLY a single compact JSON object (no code fences, no explanation, no extra text).
+
+FIELD CODES (key = field: description):
+{codes}
+
+RULES (follow exactly):
+1. Keys are the field codes above. Include ONLY fields the transcript states or clearly implies; omit all others.
+2. Each value is an array [value, confidence, evidence]:
+   - value: short single-line string; booleans "true"/"false"; numbers as strings; lists joined by "; ".
+   - confidence: number 0.0–1.0 representing certainty.
+   - evidence: the shortest phrase from the TRANSCRIPT supporting the value, copied character-for-character ("" if inferred).
+3. Include true/false fields whenever the transcript lets you decide either way.
+   Example: {{"{FIELD_ALIASES.get('incident_final_type', 'ift')}": ["fire", 0.92, "kitchen fire"], "{FIELD_ALIASES.get('fire', 'fire')}": ["true", 0.95, "kitchen fire"]}}
+
+TRANSCRIPT:
+"""
+
+
+@dataclass(frozen=True)
+class CompiledPrompt:
+    """
+    A prompt with everything but the transcript rendered once. The transcript
+    always goes last, so every request for the same fields shares a
+    byte-identical prefix that Ollama and vLLM can serve from their KV cache.
+    """
+    fields: Tuple[str, ...]
+    prefix: str
+
+    def render(self, transcript: str) -> str:
+        return f"{self.prefix}{transcript}\n"
+
+
+_RENDERERS = {"full": _render_prefix, "compact": _render_compact_prefix}
+
+
+@lru_cache(maxsize=128)
+def compile_prompt(
+    fields: Tuple[str, ...],
+    include_descriptions: bool = True,
+    output_format: str = "full",
+) -> CompiledPrompt:
+    """Cached per (fields, include_descriptions, output_format); uses the module's field_descriptions."""
+    descriptions = _FIELD_DESCRIPTIONS if include_descriptions else None
+    return CompiledPrompt(fields, _RENDERERS[output_format](fields, descriptions))
+
+
+def build_extraction_prompt(
+    transcript: str,
+    fields: List[str],
+    field_descriptions: Optional[Dict[str, str]] = None,
+    output_format: str = "full",
+) -> str:
+    # The module's own descriptions (or none) hit the compiled-prompt cache;
+    # a caller-supplied dict is rendered fresh
+    if field_descriptions is None or field_descriptions is _FIELD_DESCRIPTIONS:
+        return compile_prompt(tuple(fields), field_descriptions is not None, output_format).render(transcript)
+    return CompiledPrompt(tuple(fields), _RENDERERS[output_format](fields, field_descriptions)).render(transcript)
+
+
+def _template_fingerprint(output_format: str = "full") -> str:
+    # Render the template with placeholders so any edit to the instructions,
+    # rules or field descriptions changes the version (and invalidates caches)
+    template = build_extraction_prompt("{transcript}", ["{field}"], field_descriptions=None, output_format=output_format)
+    blob = template + json.dumps(field_descriptions, sort_keys=True)
+    if output_format != "full":
+        blob += json.dumps(FIELD_ALIASES, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+# Hash of the prompt template; part of every extraction cache key
+PROMPT_VERSION = _template_fingerprint()
+COMPACT_PROMPT_VERSION = _template_fingerprint("compact")
+
+
+def prompt_version(output_format: str = "full") -> str:
+    return PROMPT_VERSION if output_format == "full" else COMPACT_PROMPT_VERSION
@@ -1,13 +1,142 @@
 # providers.py
-import os, json
-from typing import Dict, List, Optional
-from .prompt import build_extraction_prompt, field_descriptions
+import os, asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from .prompt import build_extraction_prompt, field_descriptions, output_token_budget
+from .normalize import ParseStats, decode_fields, empty_fields, parse_json
+
+class UnparseableReply(ValueError):
+    """The model's reply contained no JSON object."""
+
 
 # ---- Provider interface ----
 class LLMProvider:
-    def extract_fields(self, transcript: str, fields: List[str]) -> Dict[str, str]:
+    """
+    Base class for every extraction provider (Gemini here, Ollama and vLLM in
+    local_llm_provider.py).
+
+    Subclasses supply the transport: _build_request() builds the request for
+    one extraction and _send() / _asend() perform it and return the model's
+    reply text. Everything after that is shared, so every provider fails the
+    same way:
+      - a transport error is logged by _report_error and yields empty defaults;
+      - a reply without a JSON object is counted as "failed" in parse_stats()
+        and yields empty defaults;
+      - fields the model left out come back as empty defaults.
+    """
+    # Output contract the provider prompts for ("full" or "compact", see prompt.py)
+    output_format = "full"
+
+    def __init__(self):
+        self.parsing = ParseStats()
+
+    # ---- transport ----
+    def _build_request(self, transcript: str, fields: List[str]) -> Any:
         raise NotImplementedError
 
+    def _send(self, request: Any) -> str:
+        """Performs the request and returns the reply text; raises on transport errors."""
+        raise NotImplementedError
+
+    async def _asend(self, request: Any) -> str:
+        """
+        Async transport. Providers with a native async client override this;
+        the default runs the blocking _send in a worker thread so it never
+        stalls the event loop.
+        """
+        return await asyncio.to_thread(self._send, request)
+
+    def _report_error(self, e: Exception, fields: List[str]) -> Dict[str, dict]:
+        print(f"❌ {self.model_id} error: {e}")
+        return empty_fields(fields)
+
+    def health_check(self) -> bool:
+        """Cheap reachability probe used by the router; True when unknown."""
+        return True
+
+    # ---- shared extraction path ----
+    def _decode_reply(self, text: str, fields: List[str]) -> Dict[str, dict]:
+        """Parses and normalizes a reply, counting the outcome; raises UnparseableReply."""
+        data, how = parse_json(text)
+        self.parsing.record(how)
+        if data is None:
+            raise UnparseableReply(f"no JSON object in {len(text or '')}-char reply from {self.model_id}")
+        return decode_fields(data, fields, self.output_format)
+
+    def _parse_reply(self, text: str, fields: List[str]) -> Dict[str, dict]:
+        try:
+            return self._decode_reply(text, fields)
+        except UnparseableReply as e:
+            print(f"⚠️  {e}; returning empty fields")
+            return empty_fields(fields)
+
+    def extract_fields_strict(self, transcript: str, fields: List[str]) -> Dict[str, dict]:
+        """
+        Like extract_fields, but raises (transport errors, UnparseableReply)
+        instead of returning empty defaults, so callers can tell a failed
+        extraction from one that found nothing.
+        """
+        return self._decode_reply(self._send(self._build_request(transcript, fields)), fields)
+
+    async def aextract_fields_strict(self, transcript: str, fields: List[str]) -> Dict[str, dict]:
+        """Async variant of extract_fields_strict."""
+        return self._decode_reply(await self._asend(self._build_request(transcript, fields)), fields)
+
+    def _fail(self, e: Exception, fields: List[str]) -> Dict[str, dict]:
+        if isinstance(e, UnparseableReply):
+            print(f"⚠️  {e}; returning empty fields")
+            return empty_fields(fields)
+        return self._report_error(e, fields)
+
+    def extract_fields(self, transcript: str, fields: List[str]) -> Dict[str, dict]:
+        """Returns {"field_name": {"value": "...", "confidence": 0.x}} for every requested field."""
+        try:
+            return self.extract_fields_strict(transcript, fields)
+        except Exception as e:
+            return self._fail(e, fields)
+
+    async def aextract_fields(self, transcript: str, fields: List[str]) -> Dict[str, dict]:
+        """Async variant of extract_fields; same results and failure semantics."""
+        try:
+            return await self.aextract_fields_strict(transcript, fields)
+        except Exception as e:
+            return self._fail(e, fields)
+
+    @property
+    def model_id(self) -> str:
+        """Provider/model identifier, used to key cached extraction results."""
+        return type(self).__name__
+
+    async def astream_fields(self, transcript: str, fields: List[str]) -> AsyncIterator[Tuple[str, dict]]:
+        """
+        Yields (field, {"value", "confidence"}) pairs as they become available.
+        Providers without token streaming yield everything once extraction finishes.
+        Unlike aextract_fields, failures raise (transport errors, UnparseableReply)
+        so the caller can tell a complete result from one padded with defaults.
+        """
+        results = await self.aextract_fields_strict(transcript, fields)
+        for f in fields:
+            yield f, results[f]
+
+    def warm_up(self) -> None:
+        """Optional hook to load the model / open connections before the first request."""
+        return None
+
+    def pool_stats(self) -> dict:
+        """Connection pool statistics for providers that own an HTTP pool."""
+        return {}
+
+    def parse_stats(self) -> dict:
+        """How the provider's replies parsed (direct / fenced / sliced / failed), for /stats."""
+        return self.parsing.snapshot()
+
+    def close(self) -> None:
+        """Optional hook to release clients and connections on shutdown."""
+        return None
+
+    async def aclose(self) -> None:
+        """Async shutdown hook; providers holding async clients override this."""
+        self.close()
+
 class GeminiProvider(LLMProvider):
     """
     Google Gemini provider for strict JSON field extraction.
@@ -17,9 +146,10 @@ class GeminiProvider(LLMProvider):
         self,
         model_name: str = "gemini-2.5-flash-lite", 
         temperature: float = 0.0,
-        max_output_tokens: int = 1024,
+        max_output_tokens: int = 4096,
         safety_settings: Optional[list] = None,
     ):
+        super().__init__()
         import google.generativeai as genai
         api_key = os.getenv("GOOGLE_API_KEY")
         if not api_key:
@@ -28,114 +158,52 @@ class GeminiProvider(LLMProvider):
 
         # Put the system prompt where Gemini expects it
         from .prompt import SYSTEM_INSTRUCTIONS
+        self.model_name = model_name
         self.model = genai.GenerativeModel(
             model_name=model_name,
             system_instruction=SYSTEM_INSTRUCTIONS,
         )
         self.temperature = temperature
-        self.max_output_tokens = max_output_tokens
+        self.max_output_tokens = max_output_tokens  # upper bound; each request asks for output_token_budget(len(fields))
         self.safety_settings = safety_settings  # can be None to use defaults
 
-    def extract_fields(self, transcript: str, fields: List[str]) -> Dict[str, dict]:
-        """
-        Extracts fields using Gemini and returns both value and confidence per field.
-        Example output:
-        {
-            "incident_type": {"value": "Fire", "confidence": 0.92},
-            "incident_location": {"value": "Los Angeles", "confidence": 0.88}
-        }
-        """
+    @property
+    def model_id(self) -> str:
+        return f"gemini:{self.model_name}"
+
+    def _build_request(self, transcript: str, fields: List[str]) -> dict:
         prompt = build_extraction_prompt(transcript, fields, field_descriptions=None)
         user = prompt + "\nReturn ONLY compact JSON."
 
         gen_config = {
             "temperature": self.temperature,
-            "max_output_tokens": self.max_output_tokens,
+            "max_output_tokens": output_token_budget(len(fields), self.output_format, self.max_output_tokens),
             "response_mime_type": "application/json",
         }
+        return {
+            "contents": [{"role": "user", "parts": [{"text": user}]}],
+            "generation_config": gen_config,
+            "safety_settings": self.safety_settings,
+        }
 
-        try:
-            resp = self.model.generate_content(
-                contents=[{"role": "user", "parts": [{"text": user}]}],
-                generation_config=gen_config,
-                safety_settings=self.safety_settings,
-            )
-
-            # Extract response text safely
-            text = (getattr(resp, "text", "") or "").strip()
-            if not text:
-                # Attempt fallback extraction from candidates
-                candidates = getattr(resp, "candidates", []) or []
-                if candidates and candidates[0].content and candidates[0].content.parts:
-                    pieces = [
-                        p.text for p in candidates[0].content.parts
-                        if hasattr(p, "text") and p.text
-                    ]
-                    text = "\n".join(pieces).strip()
-
-        except Exception:
-            # If Gemini call fails, return empty defaults
-            return {f: {"value": "", "confidence": 0.0} for f in fields}
-
-        # Try parsing JSON safely
-        data = self._safe_json(text)
-        results = {}
-
-        for f in fields:
-            entry = data.get(f, {})
-            if isinstance(entry, dict):
-                val = str(entry.get("value", "")).strip()
-                conf = entry.get("confidence", 0.0)
-
-                # 🧹 Only set confidence=0 if value is *truly empty*, not "false" or "0"
-                if val == "":
-                    conf = 0.0
-
-                # Sanitize confidence
-                try:
-                    conf = float(conf)
-                except Exception:
-                    conf = 0.0
-                conf = max(0.0, min(conf, 1.0))
-
-                results[f] = {"value": val, "confidence": conf}
-            else:
-                results[f] = {"value": str(entry).strip(), "confidence": 0.0}
-
-        return results
-
-
-    
     @staticmethod
-    def _safe_json(text: str):
-        """Attempts to parse JSON safely, even if Gemini adds formatting."""
-        import json
-        t = (text or "").strip()
-
-        # Try direct parse
-        try:
-            return json.loads(t)
-        except Exception:
-            pass
-
-        # Try stripping Markdown fences
-        if t.startswith("```"):
-            t2 = t.strip("`")
-            if t2.lower().startswith("json"):
-                t2 = t2[4:].strip()
-            try:
-                return json.loads(t2)
-            except Exception:
-                pass
-
-        # Try substring between first and last braces
-        start, end = t.find("{"), t.rfind("}")
-        if start != -1 and end != -1:
-            try:
-                return json.loads(t[start:end+1])
-            except Exception:
-                pass
-
-        # If nothing works, return empty dict
-        return {}
-
+    def _response_text(resp) -> str:
+        # Extract response text safely
+        text = (getattr(resp, "text", "") or "").strip()
+        if not text:
+            # Attempt fallback extraction from candidates
+            candidates = getattr(resp, "candidates", []) or []
+            if candidates and candidates[0].content and candidates[0].content.parts:
+                pieces = [
+                    p.text for p in candidates[0].content.parts
+                    if hasattr(p, "text") and p.text
+                ]
+                text = "\n".join(pieces).strip()
+        return text
+
+    def _send(self, request: dict) -> str:
+        return self._response_text(self.model.generate_content(**request))
+
+    async def _asend(self, request: dict) -> str:
+        # Gemini's native async client
+        return self._response_text(await self.model.generate_content_async(**request))
@@ -0,0 +1,72 @@
+# registry.py
+"""
+Process-wide provider registry.
+
+Providers are expensive to build (Gemini re-runs genai.configure and rebuilds
+the GenerativeModel, local providers hold HTTP clients), so the server builds
+them once at startup and shares them across requests.
+"""
+import os
+import threading
+from typing import Dict, Optional
+
+from .categorize import build_provider
+from .providers import LLMProvider
+
+
+class ProviderRegistry:
+    def __init__(self, default_kind: Optional[str] = None):
+        self.default_kind = (default_kind or os.getenv("LLM_PROVIDER") or "ollama").lower()
+        self._providers: Dict[str, LLMProvider] = {}
+        self._lock = threading.Lock()
+
+    def get(self, kind: Optional[str] = None) -> LLMProvider:
+        """Returns the shared provider for `kind` (default: LLM_PROVIDER), building it on first use."""
+        kind = (kind or self.default_kind).lower()
+        provider = self._providers.get(kind)
+        if provider is not None:
+            return provider
+        with self._lock:
+            provider = self._providers.get(kind)
+            if provider is None:
+                provider = build_provider(kind)
+                self._providers[kind] = provider
+        return provider
+
+    def warm_up(self) -> None:
+        """Builds the default provider and lets every provider load its model."""
+        self.get()
+        for kind, provider in list(self._providers.items()):
+            try:
+                provider.warm_up()
+            except Exception as e:
+                print(f"⚠️  Warm-up failed for provider '{kind}': {e}")
+
+    def stats(self) -> Dict[str, dict]:
+        """Per-provider connection pool statistics, keyed by provider kind."""
+        return {kind: provider.pool_stats() for kind, provider in list(self._providers.items())}
+
+    def parse_stats(self) -> Dict[str, dict]:
+        """Per-provider reply parsing outcomes and failure rate, keyed by provider kind."""
+        return {kind: provider.parse_stats() for kind, provider in list(self._providers.items())}
+
+    def close(self) -> None:
+        with self._lock:
+            providers = list(self._providers.items())
+            self._providers.clear()
+        for kind, provider in providers:
+            try:
+                provider.close()
+            except Exception as e:
+                print(f"⚠️  Failed to close provider '{kind}': {e}")
+
+    async def aclose(self) -> None:
+        """Async shutdown: lets providers close their async HTTP clients."""
+        with self._lock:
+            providers = list(self._providers.items())
+            self._providers.clear()
+        for kind, provider in providers:
+            try:
+                await provider.aclose()
+            except Exception as e:
+                print(f"⚠️  Failed to close provider '{kind}': {e}")
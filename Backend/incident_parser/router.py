@@ -0,0 +1,455 @@
+# router.py
+"""
+Routing provider: spreads extractions over several backends and fails over
+between them.
+
+Backends come from LLM_BACKENDS, a comma-separated list of
+    kind[@base_url][?option=value&...]
+for example
+    ollama@http://gpu1:11434?max=4, ollama@http://gpu2:11434?max=4,
+    vllm@http://gpu3:8000/v1?max=16, gemini?overflow=1
+Options: max (concurrent requests, default ROUTER_MAX_CONCURRENCY), timeout
+(seconds per attempt, default ROUTER_TIMEOUT), model, and overflow=1 for
+backends only used when every primary is down or saturated.
+
+Each request goes to the available backend with the fewest outstanding
+requests (ROUTER_POLICY=least_outstanding) or the lowest
+latency x (outstanding + 1) (ROUTER_POLICY=latency), skipping backends that
+are at their cap or whose circuit breaker is open. A timeout, transport error
+or unparseable reply counts as a failure and the request moves on to the
+next backend, up to ROUTER_MAX_ATTEMPTS. ROUTER_BREAKER_FAILURES failures in
+a row open a backend's breaker for ROUTER_BREAKER_RESET seconds; after that
+one request is let through as a probe. A background thread also calls each
+backend's health_check() every ROUTER_HEALTH_INTERVAL seconds: a failed check
+opens the breaker, a passing one only moves an open breaker to half-open, so
+a real request still has to succeed before traffic returns.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from .http_pool import PoolConfig
+from .providers import LLMProvider
+
+ROUTER_POLICIES = ("least_outstanding", "latency")
+
+
+class BackendsExhausted(Exception):
+    """Every attempt failed, or no backend had a free slot and a closed breaker."""
+
+_CLOSED, _OPEN, _HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> (after reset_timeout) half-open probe."""
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = _CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        """True if a request may go through now. Called under the router's lock."""
+        if self.state == _CLOSED:
+            return True
+        if self.state == _OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = _HALF_OPEN
+        if self.state == _HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.state, self.failures, self._probing = _CLOSED, 0, False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == _HALF_OPEN or self.failures >= self.failure_threshold:
+            self.trip()
+
+    def trip(self) -> None:
+        self.state, self.opened_at, self._probing = _OPEN, time.monotonic(), False
+
+    def half_open(self) -> None:
+        """Lets the next request through as a probe without waiting for reset_timeout."""
+        if self.state == _OPEN:
+            self.state, self._probing = _HALF_OPEN, False
+
+    def abandon(self) -> None:
+        """The request holding the probe ended without an outcome (e.g. cancelled); allow another probe."""
+        self._probing = False
+
+
+class Backend:
+    """One routed provider with its concurrency cap, latency estimate, breaker and counters."""
+
+    def __init__(
+        self,
+        name: str,
+        provider: LLMProvider,
+        max_concurrency: int = 4,
+        timeout: float = 120.0,
+        overflow: bool = False,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.name = name
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.overflow = overflow
+        self.breaker = breaker or CircuitBreaker()
+        self.outstanding = 0
+        self.latency = 0.0  # EWMA of successful request seconds; 0 until the first success
+        self.requests = 0
+        self.failures = 0
+
+    def observe(self, seconds: float) -> None:
+        self.latency = seconds if self.latency == 0.0 else 0.7 * self.latency + 0.3 * seconds
+
+    def stats(self) -> dict:
+        return {
+            "model": self.provider.model_id,
+            "overflow": self.overflow,
+            "outstanding": self.outstanding,
+            "max_concurrency": self.max_concurrency,
+            "latency_ms": round(self.latency * 1000, 1),
+            "breaker": self.breaker.state,
+            "requests": self.requests,
+            "failures": self.failures,
+            "pool": self.provider.pool_stats(),
+        }
+
+
+def _build_backend_provider(kind: str, url: Optional[str], options: Dict[str, str], timeout: float, cap: int) -> LLMProvider:
+    if kind in ("ollama", "vllm"):
+        prefix = kind.upper()
+        pool = PoolConfig.from_env(prefix, read_timeout=timeout)
+        if "timeout" in options:
+            pool.read_timeout = timeout  # the per-backend option beats <PREFIX>_READ_TIMEOUT
+        pool.max_connections = max(pool.max_connections, cap)
+        if kind == "ollama":
+            from .local_llm_provider import OllamaProvider
+            return OllamaProvider(model_name=options.get("model"), base_url=url, pool_config=pool)
+        from .local_llm_provider import VLLMProvider
+        return VLLMProvider(model_name=options.get("model"), base_url=url, pool_config=pool)
+    if kind == "gemini":
+        from .providers import GeminiProvider
+        return GeminiProvider(model_name=options["model"]) if "model" in options else GeminiProvider()
+    raise ValueError(f"Unknown backend kind: {kind}. Use 'ollama', 'vllm', or 'gemini'")
+
+
+def parse_backends(spec: str, default_max: int = 4, default_timeout: float = 120.0, **breaker_options) -> List[Backend]:
+    """Builds Backends from an LLM_BACKENDS string (see the module docstring)."""
+    backends = []
+    for entry in filter(None, (e.strip() for e in spec.split(","))):
+        target, _, query = entry.partition("?")
+        kind, _, url = target.partition("@")
+        kind = kind.strip().lower()
+        options = dict(parse_qsl(query))
+        cap = int(options.get("max", default_max))
+        timeout = float(options.get("timeout", default_timeout))
+        provider = _build_backend_provider(kind, url.strip() or None, options, timeout, cap)
+        name = f"{kind}@{url.strip()}" if url.strip() else kind
+        if any(b.name == name for b in backends):
+            name = f"{name}#{len(backends)}"
+        backends.append(Backend(
+            name=name,
+            provider=provider,
+            max_concurrency=cap,
+            timeout=timeout,
+            overflow=options.get("overflow", "0").lower() in ("1", "true", "yes"),
+            breaker=CircuitBreaker(**breaker_options),
+        ))
+    if not backends:
+        raise ValueError("LLM_BACKENDS is empty; list at least one backend")
+    return backends
+
+
+class RouterProvider(LLMProvider):
+    def __init__(
+        self,
+        backends: List[Backend],
+        policy: str = "least_outstanding",
+        max_attempts: int = 3,
+        queue_timeout: float = 30.0,
+        health_interval: float = 15.0,
+    ):
+        super().__init__()
+        if policy not in ROUTER_POLICIES:
+            raise ValueError(f"Unknown router policy: {policy}. Use one of {', '.join(ROUTER_POLICIES)}")
+        self.backends = backends
+        self.policy = policy
+        self.max_attempts = max(1, max_attempts)
+        self.queue_timeout = queue_timeout
+        self.health_interval = health_interval
+        # Results are keyed on the primary backend's prompt contract
+        self.output_format = backends[0].provider.output_format
+        self.failovers = 0
+        self.exhausted = 0
+        self._lock = threading.Lock()
+        self._freed = threading.Condition(self._lock)
+        # (loop, event) of async callers waiting for a slot; set from whichever thread frees one
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+        self._turn = 0
+        self._stop = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+        # Sync sends run here so backend.timeout can be enforced; one worker per slot
+        self._sync_executor = ThreadPoolExecutor(
+            max_workers=sum(b.max_concurrency for b in backends), thread_name_prefix="router-send",
+        )
+
+    @classmethod
+    def from_env(cls) -> "RouterProvider":
+        spec = os.getenv("LLM_BACKENDS", "")
+        backends = parse_backends(
+            spec,
+            default_max=int(os.getenv("ROUTER_MAX_CONCURRENCY", "4")),
+            default_timeout=float(os.getenv("ROUTER_TIMEOUT", "120")),
+            failure_threshold=int(os.getenv("ROUTER_BREAKER_FAILURES", "3")),
+            reset_timeout=float(os.getenv("ROUTER_BREAKER_RESET", "30")),
+        )
+        return cls(
+            backends,
+            policy=(os.getenv("ROUTER_POLICY") or "least_outstanding").lower(),
+            max_attempts=int(os.getenv("ROUTER_MAX_ATTEMPTS", "3")),
+            queue_timeout=float(os.getenv("ROUTER_QUEUE_TIMEOUT", "30")),
+            health_interval=float(os.getenv("ROUTER_HEALTH_INTERVAL", "15")),
+        )
+
+    @property
+    def model_id(self) -> str:
+        return "router:" + ",".join(b.provider.model_id for b in self.backends)
+
+    # ---- selection ----
+    def _rank(self, backend: Backend, index: int) -> Tuple:
+        # Rotate ties so equally loaded backends share the work
+        tie = (index - self._turn) % len(self.backends)
+        if self.policy == "latency":
+            return (backend.latency * (backend.outstanding + 1), backend.outstanding, tie)
+        return (backend.outstanding, backend.latency, tie)
+
+    def _try_acquire(self, tried: set) -> Tuple[Optional[Backend], bool]:
+        """
+        Reserves a slot on the best available backend: (backend, is_probe), or
+        (None, False). is_probe marks the one request a half-open breaker lets through.
+        Needs self._lock.
+        """
+        for overflow in (False, True):
+            ranked = sorted(
+                (self._rank(b, i), i)
+                for i, b in enumerate(self.backends)
+                if b.overflow == overflow and b.name not in tried and b.outstanding < b.max_concurrency
+            )
+            for _, i in ranked:
+                backend = self.backends[i]
+                if backend.breaker.allow():
+                    backend.outstanding += 1
+                    backend.requests += 1
+                    self._turn += 1
+                    return backend, backend.breaker.state == _HALF_OPEN
+        return None, False
+
+    def _all_tried_or_open(self, tried: set) -> bool:
+        # Nothing left worth waiting for: every untried backend has its breaker open
+        return all(b.name in tried or b.breaker.state == _OPEN for b in self.backends)
+
+    def _acquire(self, tried: set) -> Tuple[Optional[Backend], bool]:
+        deadline = time.monotonic() + self.queue_timeout
+        with self._freed:
+            while True:
+                backend, probe = self._try_acquire(tried)
+                remaining = deadline - time.monotonic()
+                if backend is not None or remaining <= 0 or self._all_tried_or_open(tried):
+                    return backend, probe
+                self._freed.wait(remaining)
+
+    async def _aacquire(self, tried: set) -> Tuple[Optional[Backend], bool]:
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + self.queue_timeout
+        while True:
+            with self._lock:
+                backend, probe = self._try_acquire(tried)
+                remaining = deadline - time.monotonic()
+                if backend is not None or remaining <= 0 or self._all_tried_or_open(tried):
+                    return backend, probe
+                waiter = (loop, asyncio.Event())
+                self._async_waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter[1].wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._lock:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+
+    def _notify(self) -> None:
+        """Wakes sync and async callers waiting for a slot. Needs self._lock."""
+        self._freed.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # that caller's loop is closed
+
+    def _release(self, backend: Backend, probe: bool) -> None:
+        """Frees the slot taken by _try_acquire; runs however the attempt ended."""
+        with self._lock:
+            backend.outstanding -= 1
+            if probe:
+                backend.breaker.abandon()  # no-op if _record already settled the probe
+            self._notify()
+
+    def _record(self, backend: Backend, seconds: Optional[float], error: Optional[Exception]) -> None:
+        """Feeds one attempt's outcome to the backend's latency estimate and breaker."""
+        with self._lock:
+            if error is None:
+                backend.observe(seconds)
+                backend.breaker.record_success()
+            else:
+                backend.failures += 1
+                backend.breaker.record_failure()
+        if error is not None:
+            print(f"⚠️  Backend {backend.name} failed ({type(error).__name__}: {error}); failing over")
+
+    def _start_attempt(self, backend: Backend, tried: set, attempt: int) -> None:
+        tried.add(backend.name)
+        if attempt:
+            with self._lock:
+                self.failovers += 1
+
+    # ---- extraction ----
+    # extract_fields / aextract_fields / astream_fields come from LLMProvider on top of these
+    def extract_fields_strict(self, transcript: str, fields: List[str]) -> Dict[str, dict]:
+        tried: set = set()
+        for attempt in range(self.max_attempts):
+            backend, probe = self._acquire(tried)
+            if backend is None:
+                break
+            still_running = False
+            try:
+                self._start_attempt(backend, tried, attempt)
+                start = time.monotonic()
+                try:
+                    request = backend.provider._build_request(transcript, fields)
+                    future = self._sync_executor.submit(backend.provider._send, request)
+                    text = future.result(timeout=backend.timeout)
+                    result = backend.provider._decode_reply(text, fields)
+                except FutureTimeout:
+                    # A blocking send can't be interrupted: the backend stays busy, so its slot
+                    # is only given back once the call actually returns
+                    still_running = True
+                    future.add_done_callback(lambda _, backend=backend, probe=probe: self._release(backend, probe))
+                    self._record(backend, None, TimeoutError(f"no reply within {backend.timeout:g}s"))
+                    continue
+                except Exception as e:
+                    self._record(backend, None, e)
+                    continue
+                self._record(backend, time.monotonic() - start, None)
+                return result
+            finally:
+                if not still_running:
+                    self._release(backend, probe)
+        raise self._exhausted(tried)
+
+    async def aextract_fields_strict(self, transcript: str, fields: List[str]) -> Dict[str, dict]:
+        tried: set = set()
+        for attempt in range(self.max_attempts):
+            backend, probe = await self._aacquire(tried)
+            if backend is None:
+                break
+            try:
+                self._start_attempt(backend, tried, attempt)
+                start = time.monotonic()
+                try:
+                    request = backend.provider._build_request(transcript, fields)
+                    text = await asyncio.wait_for(backend.provider._asend(request), backend.timeout)
+                    result = backend.provider._decode_reply(text, fields)
+                except Exception as e:
+                    self._record(backend, None, e)
+                    continue
+                self._record(backend, time.monotonic() - start, None)
+                return result
+            finally:
+                # Also on cancellation (CancelledError is a BaseException), e.g. an SSE client leaving
+                self._release(backend, probe)
+        raise self._exhausted(tried)
+
+    def _exhausted(self, tried: set) -> BackendsExhausted:
+        with self._lock:
+            self.exhausted += 1
+        if tried:
+            return BackendsExhausted(f"All routed attempts failed ({', '.join(sorted(tried))})")
+        return BackendsExhausted("No backend available (all saturated or circuit-open)")
+
+    # ---- health ----
+    def check_health(self) -> Dict[str, bool]:
+        """
+        Probes every backend. A failed probe opens its breaker; a passing one
+        only moves an open breaker to half-open, since a server that answers
+        health checks can still be too overloaded to extract.
+        """
+        results = {}
+        for backend in self.backends:
+            healthy = backend.provider.health_check()
+            results[backend.name] = healthy
+            with self._lock:
+                if not healthy:
+                    backend.breaker.trip()
+                elif backend.breaker.state == _OPEN:
+                    backend.breaker.half_open()
+                    self._notify()
+        return results
+
+    def _health_loop(self) -> None:
+        while not self._stop.wait(self.health_interval):
+            try:
+                self.check_health()
+            except Exception as e:
+                print(f"⚠️  Router health check failed: {e}")
+
+    def warm_up(self) -> None:
+        for backend in self.backends:
+            try:
+                backend.provider.warm_up()
+            except Exception as e:
+                print(f"⚠️  Warm-up failed for backend '{backend.name}': {e}")
+        if self.health_interval > 0 and self._health_thread is None:
+            self._health_thread = threading.Thread(target=self._health_loop, name="router-health", daemon=True)
+            self._health_thread.start()
+
+    # ---- stats / shutdown ----
+    def pool_stats(self) -> dict:
+        with self._lock:
+            failovers, exhausted = self.failovers, self.exhausted
+        return {
+            "policy": self.policy,
+            "failovers": failovers,
+            "exhausted": exhausted,
+            "backends": {b.name: b.stats() for b in self.backends},
+        }
+
+    def parse_stats(self) -> dict:
+        return {b.name: b.provider.parse_stats() for b in self.backends}
+
+    def close(self) -> None:
+        self._stop.set()
+        self._sync_executor.shutdown(wait=False)
+        for backend in self.backends:
+            backend.provider.close()
+
+    async def aclose(self) -> None:
+        self._stop.set()
+        self._sync_executor.shutdown(wait=False)
+        for backend in self.backends:
+            await backend.provider.aclose()
@@ -0,0 +1,155 @@
+# schema.py
+"""
+JSON Schemas for constrained (grammar-guided) decoding.
+
+extraction_schema() describes exactly the object the extraction prompt asks
+for. Ollama takes it as `format` and vLLM as a json_schema response_format;
+both then only sample tokens that keep the output valid against it, so the
+reply is a bare JSON object that parse_json decodes directly, never fenced,
+wrapped in chatter or cut off mid-object.
+
+Value types come from the `type` column of Frontend/core_mod_incident.csv and
+Frontend/mod_fire.csv (FIELD_TYPES below). The lookup tables their
+`value_set` column points to (type_incident, type_room, ...) aren't in the
+repo, so coded fields stay free text. Values are always strings, as the
+prompt asks, but booleans, integers and floats are restricted to strings
+that parse as one (or "").
+"""
+import os
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+
+from .prompt import FIELD_ALIASES
+
+# NERIS type of each extracted field, from the core_mod_incident / mod_fire definitions
+FIELD_TYPES: Dict[str, str] = {
+    "incident_neris_id": "Text",
+    "incident_internal_id": "Text",
+    "incident_final_type": "Array[Array[Text]]",
+    "incident_final_type_primary": "Array[Boolean]",
+    "incident_special_modifier": "Array[Text]",
+    "fire": "Module",
+    "medical": "Array[Module]",
+    "hazsit": "Module",
+    "emerging_hazard": "Array[Module]",
+    "tactic_timestamps": "Module",
+    "incident_point": "Point",
+    "incident_polygon": "Multipolygon",
+    "incident_location": "Module",
+    "incident_location_use": "Module",
+    "incident_people_present": "Boolean",
+    "incident_displaced_number": "Integer",
+    "incident_displaced_cause": "Array[Text]",
+    "exposure": "Array[Module]",
+    "rescue_ff": "Array[Module]",
+    "rescue_nonff": "Array[Module]",
+    "incident_rescue_animal": "Integer",
+    "incident_actions_taken": "Array[Array[Text]]",
+    "incident_noaction": "Text",
+    "unit_response": "Array[Module]",
+    "risk_reduction": "Module",
+    "incident_aid_direction": "Text",
+    "incident_aid_type": "Text",
+    "incident_aid_department_name": "Array[Text]",
+    "incident_aid_nonfd": "Array[Text]",
+    "incident_narrative_impediment": "Text",
+    "incident_narrative_outcome": "Text",
+    "parcel": "Module",
+    "weather": "Module",
+    "fire_suppression_appliance": "Array[Text]",
+    "fire_water_supply": "Text",
+    "fire_investigation_need": "Text",
+    "fire_investigation_type": "Array[Text]",
+    "structure_arrival_conditions": "Text",
+    "structure_progression_conditions": "Boolean",
+    "structure_damage": "Text",
+    "structure_floor_of_origin": "Integer",
+    "structure_room_of_origin": "Text",
+    "structure_fire_cause": "Text",
+    "outside_fire_cause": "Text",
+    "outside_fire_acres_burned": "Float",
+}
+
+# The fire/medical/hazsit modules are extracted as "does this module apply" flags
+MODULE_FLAGS = {"fire", "medical", "hazsit"}
+
+# Fields whose value set is small enough to spell out here
+FIELD_ENUMS: Dict[str, List[str]] = {
+    "incident_aid_direction": ["given", "received"],
+}
+
+_PATTERNS = {
+    "Integer": r"^(-?[0-9]+)?$",
+    "Float": r"^(-?[0-9]+(\.[0-9]+)?)?$",
+}
+
+
+def constrained_decoding_from_env() -> bool:
+    return os.getenv("CONSTRAINED_DECODING", "true").strip().lower() not in {"0", "false", "no", "off"}
+
+
+def value_schema(field: str, allow_empty: bool = True) -> dict:
+    """Schema for one field's "value" string."""
+    empty = [""] if allow_empty else []
+    if field in FIELD_ENUMS:
+        return {"type": "string", "enum": FIELD_ENUMS[field] + empty}
+    neris_type = FIELD_TYPES.get(field, "Text")
+    if field in MODULE_FLAGS or neris_type == "Boolean":
+        return {"type": "string", "enum": ["true", "false"] + empty}
+    if neris_type in _PATTERNS:
+        pattern = _PATTERNS[neris_type]
+        return {"type": "string", "pattern": pattern if allow_empty else pattern.replace(")?$", ")$", 1)}
+    return {"type": "string"}
+
+
+_CONFIDENCE = {"type": "number", "minimum": 0, "maximum": 1}
+_EVIDENCE = {"type": "string"}
+
+
+def _full_schema(fields: Sequence[str]) -> dict:
+    # Every key, in prompt order, each {"value", "confidence"[, "evidence"]}
+    return {
+        "type": "object",
+        "properties": {
+            f: {
+                "type": "object",
+                "properties": {"value": value_schema(f), "confidence": _CONFIDENCE, "evidence": _EVIDENCE},
+                "required": ["value", "confidence"],
+                "additionalProperties": False,
+            }
+            for f in fields
+        },
+        "required": list(fields),
+        "additionalProperties": False,
+    }
+
+
+def _compact_schema(fields: Sequence[str]) -> dict:
+    # Only found fields, under their aliases, each [value, confidence, evidence]
+    return {
+        "type": "object",
+        "properties": {
+            FIELD_ALIASES.get(f, f): {
+                "type": "array",
+                "prefixItems": [value_schema(f, allow_empty=False), _CONFIDENCE, _EVIDENCE],
+                "items": False,
+                "minItems": 2,
+                "maxItems": 3,
+            }
+            for f in fields
+        },
+        "additionalProperties": False,
+    }
+
+
+@lru_cache(maxsize=128)
+def _cached_schema(fields: Tuple[str, ...], output_format: str) -> dict:
+    return _compact_schema(fields) if output_format == "compact" else _full_schema(fields)
+
+
+def extraction_schema(fields: Sequence[str], output_format: str = "full") -> dict:
+    """
+    JSON Schema for the reply to build_extraction_prompt(…, fields, output_format=…).
+    Cached per field list; treat the returned dict as read-only.
+    """
+    return _cached_schema(tuple(fields), output_format)
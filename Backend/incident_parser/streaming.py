@@ -0,0 +1,113 @@
+# streaming.py
+"""
+Incremental parsing of a streamed JSON extraction.
+
+The model emits one JSON object token by token. IncrementalFieldParser is fed
+those chunks and returns each top-level field as soon as its value is
+complete, so the UI can show "fire" while "weather" is still being generated.
+Like parse_json it tolerates noise around the object: code fences, a "json"
+language tag or chatter before the first '{' and anything after the closing '}'.
+"""
+import json
+from typing import Any, List, Tuple
+
+from .normalize import loads
+
+# Parser states
+_SEEK_ROOT, _SEEK_KEY, _IN_KEY, _SEEK_COLON, _SEEK_VALUE, _IN_VALUE, _DONE = range(7)
+
+
+class IncrementalFieldParser:
+    def __init__(self):
+        self._state = _SEEK_ROOT
+        self._key: List[str] = []
+        self._value: List[str] = []
+        self._depth = 0          # nesting inside the current value
+        self._in_string = False  # inside a string in the current key/value
+        self._escape = False
+
+    @property
+    def done(self) -> bool:
+        """True once the root object has been closed."""
+        return self._state == _DONE
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Consumes `chunk` and returns the (key, value) pairs it completed."""
+        completed: List[Tuple[str, Any]] = []
+        for ch in chunk:
+            state = self._state
+            if state == _DONE:
+                break
+            if state == _SEEK_ROOT:
+                if ch == "{":
+                    self._state = _SEEK_KEY
+            elif state == _SEEK_KEY:
+                if ch == '"':
+                    self._key = []
+                    self._state = _IN_KEY
+                elif ch == "}":
+                    self._state = _DONE
+            elif state == _IN_KEY:
+                if self._escape:
+                    self._key.append(ch)
+                    self._escape = False
+                elif ch == "\\":
+                    self._key.append(ch)
+                    self._escape = True
+                elif ch == '"':
+                    self._state = _SEEK_COLON
+                else:
+                    self._key.append(ch)
+            elif state == _SEEK_COLON:
+                if ch == ":":
+                    self._state = _SEEK_VALUE
+            elif state == _SEEK_VALUE:
+                if not ch.isspace():
+                    self._value = []
+                    self._depth = 0
+                    self._in_string = False
+                    self._state = _IN_VALUE
+                    self._consume_value_char(ch, completed)
+            else:  # _IN_VALUE
+                self._consume_value_char(ch, completed)
+        return completed
+
+    def _consume_value_char(self, ch: str, completed: List[Tuple[str, Any]]) -> None:
+        if self._in_string:
+            self._value.append(ch)
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                if self._depth == 0:
+                    self._emit(completed)
+            return
+
+        if self._depth == 0 and ch in ",}":
+            # End of a bare scalar (number, true/false/null)
+            self._emit(completed)
+            self._state = _DONE if ch == "}" else _SEEK_KEY
+            return
+
+        self._value.append(ch)
+        if ch == '"':
+            self._in_string = True
+        elif ch in "{[":
+            self._depth += 1
+        elif ch in "}]":
+            self._depth -= 1
+            if self._depth == 0:
+                self._emit(completed)
+
+    def _emit(self, completed: List[Tuple[str, Any]]) -> None:
+        raw = "".join(self._value).strip()
+        self._value = []
+        self._state = _SEEK_KEY
+        key = json.loads(f'"{"".join(self._key)}"')
+        try:
+            completed.append((key, loads(raw)))
+        except ValueError:
+            completed.append((key, raw))
+
@@ -0,0 +1,102 @@
+# transcription.py
+"""
+Server-side speech-to-text on a fixed-size process pool.
+
+Each worker process loads one faster-whisper model when it starts and keeps
+it for its lifetime, so N dispatchers share WHISPER_WORKERS copies of the
+model instead of one per Streamlit session. Transcription is CPU-bound, so it
+runs in processes and the event loop only awaits the result.
+"""
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# The model held by this worker process (set by _init_worker)
+_model = None
+
+
+def _init_worker(model_size: str, device: str, compute_type: str, cpu_threads: int) -> None:
+    global _model
+    from faster_whisper import WhisperModel
+    _model = WhisperModel(model_size, device=device, compute_type=compute_type, cpu_threads=cpu_threads)
+
+
+def _transcribe_file(audio_path: str) -> dict:
+    segments, info = _model.transcribe(audio_path)
+    segments = [
+        {"start": round(s.start, 2), "end": round(s.end, 2), "text": s.text.strip()}
+        for s in segments
+    ]
+    return {
+        "language": info.language,
+        "duration": info.duration,
+        "segments": segments,
+        "text": " ".join(s["text"] for s in segments).strip(),
+    }
+
+
+def _transcribe_pcm(pcm: bytes, sample_rate: int, prompt: str) -> dict:
+    import numpy as np
+    audio = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+    if sample_rate != 16000:
+        # Whisper expects 16 kHz; linear resampling is plenty for speech
+        n_out = int(len(audio) * 16000 / sample_rate)
+        audio = np.interp(np.linspace(0, len(audio) - 1, n_out), np.arange(len(audio)), audio).astype(np.float32)
+    segments, info = _model.transcribe(audio, initial_prompt=prompt or None)
+    segments = [
+        {"start": round(s.start, 2), "end": round(s.end, 2), "text": s.text.strip()}
+        for s in segments
+    ]
+    return {
+        "language": info.language,
+        "segments": segments,
+        "text": " ".join(s["text"] for s in segments).strip(),
+    }
+
+
+class TranscriptionPool:
+    def __init__(
+        self,
+        workers: int = 1,
+        model_size: str = "base",
+        device: str = "cpu",
+        compute_type: str = "int8",
+        cpu_threads: int = 0,
+    ):
+        self.workers = workers
+        self.model_size = model_size
+        # "spawn" so workers don't inherit the server's event loop and threads;
+        # processes start on first use, so an unused endpoint costs nothing
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_size, device, compute_type, cpu_threads),
+        )
+
+    @classmethod
+    def from_env(cls) -> "TranscriptionPool":
+        return cls(
+            workers=int(os.getenv("WHISPER_WORKERS", "1")),
+            model_size=os.getenv("WHISPER_MODEL", "base"),
+            device=os.getenv("WHISPER_DEVICE", "cpu"),
+            compute_type=os.getenv("WHISPER_COMPUTE_TYPE", "int8"),
+            cpu_threads=int(os.getenv("WHISPER_CPU_THREADS", "0")),
+        )
+
+    async def transcribe(self, audio_path: str) -> dict:
+        """Returns {"language", "duration", "segments": [{start, end, text}], "text"}."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, _transcribe_file, audio_path)
+
+    async def transcribe_pcm(self, pcm: bytes, sample_rate: int = 16000, prompt: str = "") -> dict:
+        """
+        Transcribes one chunk of 16-bit mono PCM. `prompt` (usually the tail of
+        the rolling transcript) keeps names and units consistent across chunks.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, _transcribe_pcm, pcm, sample_rate, prompt)
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,123 @@
+# vad.py
+"""
+Energy-based voice-activity detection for live radio audio.
+
+UtteranceSegmenter is pushed raw 16-bit mono PCM as it arrives over the
+WebSocket and cuts it into utterances: a run of speech frames closed by a
+short silence (or by a maximum length, so long transmissions still produce
+text quickly). The speech threshold adapts to the channel's noise floor,
+which matters for radio traffic with constant hiss.
+"""
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+
+@dataclass
+class Utterance:
+    pcm: bytes       # 16-bit mono PCM
+    start: float     # seconds since the start of the stream
+    end: float
+
+
+class UtteranceSegmenter:
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 30,
+        min_threshold: float = 0.01,    # RMS (full scale = 1.0) always treated as silence below this
+        noise_ratio: float = 3.0,       # speech must be this many times louder than the noise floor
+        min_speech_ms: int = 250,       # shorter bursts (clicks, squelch) are dropped
+        max_silence_ms: int = 600,      # silence that closes an utterance
+        max_utterance_s: float = 15.0,  # force a cut so long transmissions still stream
+        pre_roll_ms: int = 200,         # audio kept before speech onset so first syllables survive
+    ):
+        self.sample_rate = sample_rate
+        self.frame_bytes = int(sample_rate * frame_ms / 1000) * 2
+        self.frame_s = frame_ms / 1000
+        self.min_threshold = min_threshold
+        self.noise_ratio = noise_ratio
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.max_silence_frames = max(1, max_silence_ms // frame_ms)
+        self.max_utterance_frames = int(max_utterance_s * 1000 // frame_ms)
+        self.pre_roll_frames = pre_roll_ms // frame_ms
+
+        self._pending = b""            # bytes not yet forming a whole frame
+        self._frames_seen = 0
+        self._noise_floor: Optional[float] = None
+        self._pre_roll: List[bytes] = []
+        self._speech: List[bytes] = []
+        self._speech_start = 0
+        self._speech_frames = 0
+        self._silence_run = 0
+
+    def _rms(self, frame: bytes) -> float:
+        samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32) / 32768.0
+        return float(np.sqrt(np.mean(samples * samples)))
+
+    def _is_speech(self, rms: float) -> bool:
+        floor = self._noise_floor if self._noise_floor is not None else rms
+        speech = rms > max(self.min_threshold, floor * self.noise_ratio)
+        if not speech:
+            # Track the noise floor on non-speech frames only
+            self._noise_floor = floor * 0.95 + rms * 0.05 if self._noise_floor is not None else rms
+        return speech
+
+    def push(self, pcm: bytes) -> List[Utterance]:
+        """Adds audio and returns the utterances it completed."""
+        data = self._pending + pcm
+        n_frames = len(data) // self.frame_bytes
+        self._pending = data[n_frames * self.frame_bytes:]
+        done: List[Utterance] = []
+        for i in range(n_frames):
+            frame = data[i * self.frame_bytes:(i + 1) * self.frame_bytes]
+            utterance = self._step(frame)
+            if utterance is not None:
+                done.append(utterance)
+        return done
+
+    def _step(self, frame: bytes) -> Optional[Utterance]:
+        index = self._frames_seen
+        self._frames_seen += 1
+        speech = self._is_speech(self._rms(frame))
+
+        if not self._speech:
+            if speech:
+                self._speech = self._pre_roll + [frame]
+                self._speech_start = index - len(self._pre_roll)
+                self._speech_frames = 1
+                self._silence_run = 0
+                self._pre_roll = []
+            else:
+                self._pre_roll = (self._pre_roll + [frame])[-self.pre_roll_frames:] if self.pre_roll_frames else []
+            return None
+
+        self._speech.append(frame)
+        if speech:
+            self._speech_frames += 1
+            self._silence_run = 0
+        else:
+            self._silence_run += 1
+        if self._silence_run >= self.max_silence_frames or len(self._speech) >= self.max_utterance_frames:
+            return self._close()
+        return None
+
+    def _close(self) -> Optional[Utterance]:
+        frames, start, speech_frames = self._speech, self._speech_start, self._speech_frames
+        self._speech, self._speech_frames, self._silence_run = [], 0, 0
+        if speech_frames < self.min_speech_frames:
+            return None
+        return Utterance(
+            pcm=b"".join(frames),
+            start=round(start * self.frame_s, 2),
+            end=round((start + len(frames)) * self.frame_s, 2),
+        )
+
+    def flush(self) -> List[Utterance]:
+        """Closes any utterance still open (end of stream)."""
+        if self._pending and self._speech:
+            self._speech.append(self._pending)
+        self._pending = b""
+        utterance = self._close() if self._speech else None
+        return [utterance] if utterance is not None else []
@@ -1,4 +1,5 @@
-from typing import Dict, List
+import re
+from typing import Dict, List, Optional, Tuple
 
 def force_string_dict(obj, fields: List[str]) -> Dict[str, str]:
     """
@@ -17,4 +18,43 @@ def force_string_dict(obj, fields: List[str]) -> Dict[str, str]:
     else:
         # Completely malformed → empty dict with expected keys
         out = {f: "" for f in fields}
-    return out
\ No newline at end of file
+    return out
+
+
+def resolve_evidence(transcript: str, quote: str) -> Optional[Tuple[int, int]]:
+    """
+    Locates the model's verbatim evidence quote in the transcript and returns
+    its (start, end) character offsets, or None if it isn't actually there.
+    Tolerates case and whitespace differences (models often reflow line breaks).
+    """
+    quote = (quote or "").strip().strip('"').strip()
+    if not quote or not transcript:
+        return None
+    start = transcript.find(quote)
+    if start >= 0:
+        return start, start + len(quote)
+    pattern = r"\s+".join(re.escape(token) for token in quote.split())
+    match = re.search(pattern, transcript, flags=re.IGNORECASE)
+    if match:
+        return match.start(), match.end()
+    return None
+
+
+def attach_spans(result: Dict[str, dict], transcript: str) -> Dict[str, dict]:
+    """
+    Adds "span": [start, end] to every field whose evidence quote was found in
+    `transcript`. Quotes that don't match are dropped so the UI never
+    highlights text the model invented. Offsets are computed per request
+    (cached results keep only the quote), so they always index this transcript.
+    """
+    out = {}
+    for field, entry in result.items():
+        if isinstance(entry, dict) and "evidence" in entry:
+            entry = {k: v for k, v in entry.items() if k != "span"}
+            span = resolve_evidence(transcript, entry["evidence"]) if entry.get("value") else None
+            if span is None:
+                entry.pop("evidence")
+            else:
+                entry["span"] = list(span)
+        out[field] = entry
+    return out
@@ -1,14 +1,112 @@
 # server.py
+import os
+import hmac
+import asyncio
 import json
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+import tempfile
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
-from incident_parser.categorize import categorize_transcript
-from incident_parser.providers import GeminiProvider
+from incident_parser.categorize import NERIS_FIELDS, PartialExtraction, acategorize_transcript
+from incident_parser.registry import ProviderRegistry
+from incident_parser.cache import ExtractionCache, extraction_key
+from incident_parser.prompt import prompt_version
+from incident_parser.coalesce import SingleFlight
+from incident_parser.validators import attach_spans
+from incident_parser.normalize import empty_fields
+from incident_parser.jobs import InvalidWebhook, JobQueue, QueueFull
+from incident_parser.transcription import TranscriptionPool
+from incident_parser.live import MAX_SAMPLE_RATE, MIN_SAMPLE_RATE, LiveSession
+from incident_parser.batch import BatchProgress, new_batch_id, parse_items, parse_upload, run_batch
+from incident_parser.incident_store import IncidentStore
+from incident_parser.analytics import iter_parquet
 
 load_dotenv()  # optional: if you're using .env for GOOGLE_API_KEY
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the LLM_PROVIDER provider once and share it across requests
+    registry = ProviderRegistry()
+    registry.warm_up()
+    app.state.providers = registry
+    app.state.cache = ExtractionCache.from_env()
+    app.state.coalescer = SingleFlight()
+
+    async def run_job(transcript: str):
+        return await acategorize_transcript(
+            transcript,
+            provider=registry.get(),
+            cache=app.state.cache,
+            coalescer=app.state.coalescer,
+            strict=True,  # a partial result fails the job rather than reporting success
+        )
+
+    app.state.jobs = JobQueue.from_env(run_job)
+    await app.state.jobs.start()
+    app.state.transcriber = TranscriptionPool.from_env()
+    app.state.incidents = IncidentStore.from_env(NERIS_FIELDS)
+    if not os.getenv("INCIDENT_ADMIN_TOKEN"):
+        print("⚠️  INCIDENT_ADMIN_TOKEN is not set: /incidents is open to anyone who can reach this server")
+    yield
+    app.state.incidents.close()
+    app.state.transcriber.close()
+    await app.state.jobs.stop()
+    await registry.aclose()
+    app.state.cache.close()
+
+
+def _max_audio_bytes() -> int:
+    return int(os.getenv("MAX_AUDIO_MB", "50")) * 1024 * 1024
+
+
+def _audio_too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Audio file is larger than {_max_audio_bytes() // (1024 * 1024)} MB.")
+
+
+class UploadLimit:
+    """
+    ASGI wrapper that caps the request body of the upload routes while it is
+    still arriving, so an oversized upload is refused with 413 before the
+    multipart parser has spooled it to disk. Content-Length is only a hint;
+    the bytes actually received are what counts.
+    """
+
+    MULTIPART_ALLOWANCE = 64 * 1024  # boundaries and part headers around the file
+
+    def __init__(self, app, paths: tuple = ("/transcribe",)):
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        limit = _max_audio_bytes() + self.MULTIPART_ALLOWANCE
+        declared = dict(scope["headers"]).get(b"content-length", b"0")
+        if declared.isdigit() and int(declared) > limit:
+            await JSONResponse({"detail": _audio_too_large().detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise _audio_too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(UploadLimit)
 # allow local frontend origins (adjust as needed)
 app.add_middleware(
     CORSMiddleware,
@@ -19,15 +117,20 @@ app.add_middleware(
 )
 
 @app.post("/categorize-transcript")
-async def api_categorize_transcript(payload: dict):
+async def api_categorize_transcript(payload: dict, request: Request):
     transcript = payload.get("transcript")
     if not transcript or not isinstance(transcript, str):
         raise HTTPException(status_code=400, detail="Provide 'transcript' (str).")
 
     try:
-        provider = GeminiProvider()
+        provider = request.app.state.providers.get()
         # Do not require fields from user — use categorize_transcript default
-        result = categorize_transcript(transcript, provider=provider)
+        result = await acategorize_transcript(
+            transcript,
+            provider=provider,
+            cache=request.app.state.cache,
+            coalescer=request.app.state.coalescer,
+        )
 
         # DEBUG START - PRINT JSON OUTPUT IN CONSOLE
         print("=== CATEGORIZATION RESULT ===")
@@ -38,6 +141,380 @@ async def api_categorize_transcript(payload: dict):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+_UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+@app.post("/transcribe")
+async def api_transcribe(
+    request: Request,
+    file: UploadFile = File(...),
+    categorize: bool = Form(False),
+):
+    """
+    Transcribes uploaded audio on the shared Whisper process pool and returns
+    segments with timestamps. With categorize=true the transcript is also run
+    through categorize_transcript and the fields are returned in the same response.
+    """
+    # UploadLimit has already refused bodies over the cap while they streamed in;
+    # this checks the file part itself, a chunk at a time
+    max_bytes = _max_audio_bytes()
+    suffix = os.path.splitext(file.filename or "")[1] or ".wav"
+    size = 0
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as f:
+        audio_path = f.name
+        while size <= max_bytes:
+            chunk = await file.read(_UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            f.write(chunk)
+    if size == 0 or size > max_bytes:
+        os.unlink(audio_path)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Upload an audio file as 'file'.")
+        raise _audio_too_large()
+    try:
+        transcript = await request.app.state.transcriber.transcribe(audio_path)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Transcription failed: {e}")
+    finally:
+        os.unlink(audio_path)
+
+    response = {"transcript": transcript}
+    if categorize and transcript["text"]:
+        response["fields"] = await acategorize_transcript(
+            transcript["text"],
+            provider=request.app.state.providers.get(),
+            cache=request.app.state.cache,
+            coalescer=request.app.state.coalescer,
+        )
+    return response
+
+@app.websocket("/ws/transcribe")
+async def ws_transcribe(websocket: WebSocket, sample_rate: int = 16000, extract: bool = False):
+    """
+    Live dictation. Send binary frames of 16-bit little-endian mono PCM at
+    `sample_rate`, then the text message "end". Receives utterance messages with
+    the rolling transcript; with extract=true also periodic `fields` messages.
+    """
+    await websocket.accept()
+    if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+        await websocket.send_json({
+            "type": "error",
+            "detail": f"sample_rate must be between {MIN_SAMPLE_RATE} and {MAX_SAMPLE_RATE} Hz.",
+        })
+        await websocket.close(code=1008)
+        return
+    app_state = websocket.app.state
+
+    async def run_extraction(transcript: str):
+        return await acategorize_transcript(
+            transcript,
+            provider=app_state.providers.get(),
+            cache=app_state.cache,
+            coalescer=app_state.coalescer,
+        )
+
+    session = LiveSession(
+        app_state.transcriber.transcribe_pcm,
+        websocket.send_json,
+        sample_rate=sample_rate,
+        extract=run_extraction if extract else None,
+        extract_min_chars=int(os.getenv("LIVE_EXTRACT_MIN_CHARS", "200")),
+        close=websocket.close,
+    )
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect()
+            if message.get("bytes"):
+                session.push_audio(message["bytes"])
+            elif (message.get("text") or "").strip().lower() == "end":
+                await session.finish()
+                if not session.closed:
+                    await websocket.close()
+                return
+    except WebSocketDisconnect:
+        await session.cancel()
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/categorize-transcript/stream")
+async def api_categorize_transcript_stream(payload: dict, request: Request):
+    """
+    Server-Sent Events version of /categorize-transcript. Emits one `field` event
+    per field as soon as the model finishes it, then a `done` event with all fields
+    (or an `error` event followed by `done` with whatever was received).
+    A request for a transcript that is already being extracted waits for that
+    extraction (it shares the coalescer key of /categorize-transcript) and then
+    replays its fields.
+    """
+    transcript = payload.get("transcript")
+    if not transcript or not isinstance(transcript, str):
+        raise HTTPException(status_code=400, detail="Provide 'transcript' (str).")
+
+    provider = request.app.state.providers.get()
+    cache = request.app.state.cache
+    coalescer = request.app.state.coalescer
+    key = extraction_key(transcript, NERIS_FIELDS, provider.model_id, prompt_version(provider.output_format))
+
+    def replay(fields: dict, **done):
+        fields = attach_spans(fields, transcript)
+        for field, entry in fields.items():
+            yield _sse("field", {"field": field, **entry})
+        yield _sse("done", {"fields": fields, **done})
+
+    async def extract_once() -> dict:
+        result = await provider.aextract_fields_strict(transcript, NERIS_FIELDS)
+        await cache.aset(key, result)
+        return result
+
+    async def events():
+        cached = await cache.aget(key)
+        if cached is not None:
+            for event in replay(cached, cached=True):
+                yield event
+            return
+
+        shared = coalescer.claim(key)
+        if shared is None:
+            # Same transcript already in flight: wait for it instead of a second LLM call
+            try:
+                try:
+                    result = await coalescer.do(key, extract_once)
+                except PartialExtraction:
+                    result = await extract_once()  # the shared one failed; try alone
+            except Exception as e:
+                print(f"❌ Coalesced extraction failed: {e}")
+                yield _sse("error", {"detail": str(e)})
+                result = empty_fields(NERIS_FIELDS)
+            for event in replay(result, cached=False, coalesced=True):
+                yield event
+            return
+
+        fields = {}
+        complete = False
+        try:
+            async for field, entry in provider.astream_fields(transcript, NERIS_FIELDS):
+                fields[field] = entry
+                yield _sse("field", {"field": field, **attach_spans({field: entry}, transcript)[field]})
+            complete = True
+        except Exception as e:
+            print(f"❌ Streaming extraction failed: {e}")
+            yield _sse("error", {"detail": str(e)})
+        finally:
+            fields = {f: fields.get(f, {"value": "", "confidence": 0.0}) for f in NERIS_FIELDS}
+            if complete:
+                shared.set_result(fields)
+            else:
+                # Waiting callers retry on their own; a padded result is never shared
+                shared.set_exception(PartialExtraction(fields))
+                shared.exception()  # mark retrieved when nobody was waiting
+        if complete:
+            # A failed or truncated stream padded with defaults is never cached
+            await cache.aset(key, fields)
+        yield _sse("done", {"fields": attach_spans(fields, transcript), "cached": False})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/categorize-batch")
+async def api_categorize_batch(request: Request):
+    """
+    Bulk categorization. Send either JSON {"transcripts": [...], "batch_id", "concurrency"}
+    where each transcript is a string or {"id", "transcript"}, or a multipart upload with a
+    .csv/.jsonl `file` plus optional `batch_id`/`concurrency` form fields.
+    Streams NDJSON in completion order; re-send the same batch_id to resume.
+    """
+    try:
+        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None or not hasattr(upload, "read"):
+                raise ValueError("Upload a .csv or .jsonl file as 'file'.")
+            items = parse_upload(await upload.read(), upload.filename)
+            options = form
+        else:
+            payload = await request.json()
+            if not isinstance(payload, dict):
+                raise ValueError("Provide a JSON object with 'transcripts'.")
+            items = parse_items(payload.get("transcripts"))
+            options = payload
+        max_concurrency = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+        concurrency = min(int(options.get("concurrency") or os.getenv("BATCH_CONCURRENCY", "4")), max_concurrency)
+        progress = BatchProgress(options.get("batch_id") or new_batch_id())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    provider = request.app.state.providers.get()
+
+    async def extract(transcript: str):
+        return await acategorize_transcript(
+            transcript,
+            provider=provider,
+            cache=request.app.state.cache,
+            coalescer=request.app.state.coalescer,
+            strict=True,
+        )
+
+    async def ndjson():
+        async for record in run_batch(items, extract, concurrency, progress):
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(
+        ndjson(),
+        media_type="application/x-ndjson",
+        headers={"X-Batch-Id": progress.batch_id},
+    )
+
+@app.post("/jobs", status_code=202)
+async def api_create_job(payload: dict, request: Request):
+    """Queues a categorization job; poll GET /jobs/{id} or pass 'webhook_url' to be notified."""
+    transcript = payload.get("transcript")
+    if not transcript or not isinstance(transcript, str):
+        raise HTTPException(status_code=400, detail="Provide 'transcript' (str).")
+    webhook_url = payload.get("webhook_url")
+    if webhook_url is not None:
+        if not isinstance(webhook_url, str):
+            raise HTTPException(status_code=400, detail="'webhook_url' must be an http(s) URL.")
+        try:
+            await request.app.state.jobs.check_webhook(webhook_url)
+        except InvalidWebhook as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        job = request.app.state.jobs.submit(transcript, webhook_url)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    return {"id": job.id, "status": job.status}
+
+@app.get("/jobs/{job_id}")
+async def api_get_job(job_id: str, request: Request):
+    job = await asyncio.to_thread(request.app.state.jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job.to_dict()
+
+# ---- Incident history (sync handlers: FastAPI runs them in its threadpool) ----
+def _incident_filters(type: Optional[str], since: Optional[str], until: Optional[str], unit: Optional[str], location: Optional[str]) -> dict:
+    return {"type": type, "since": since, "until": until, "unit": unit, "location": location}
+
+def _split_columns(columns: Optional[str]) -> Optional[list]:
+    return [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+
+def _check_incident_token(request: Request) -> None:
+    """
+    With INCIDENT_ADMIN_TOKEN set, every /incidents route (reads included) needs
+    it as the X-Admin-Token header, or as ?token= for browser downloads.
+    Unset, the incident history is open, as for a local single-user setup.
+    """
+    token = os.getenv("INCIDENT_ADMIN_TOKEN")
+    if not token:
+        return
+    given = request.headers.get("X-Admin-Token") or request.query_params.get("token") or ""
+    if not hmac.compare_digest(given.encode(), token.encode()):
+        raise HTTPException(status_code=401, detail="Missing or invalid incident token (X-Admin-Token).")
+
+@app.post("/incidents", status_code=201)
+def api_save_incident(payload: dict, request: Request):
+    """Saves one reviewed incident: {field: value} or {field: {"value", "confidence"}}."""
+    _check_incident_token(request)
+    if not payload:
+        raise HTTPException(status_code=400, detail="Provide the incident fields.")
+    return {"id": request.app.state.incidents.insert(payload)}
+
+@app.get("/incidents")
+def api_list_incidents(
+    request: Request,
+    columns: Optional[str] = None,
+    type: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    unit: Optional[str] = None,
+    location: Optional[str] = None,
+    sort: str = "id",
+    order: str = "desc",
+    cursor: Optional[str] = None,
+    limit: int = 50,
+):
+    """
+    One page of incidents, newest first by default. `columns` is a comma-separated
+    projection; pass the returned `next_cursor` as `cursor` for the next page.
+    """
+    _check_incident_token(request)
+    store = request.app.state.incidents
+    try:
+        items, next_cursor = store.query(
+            columns=_split_columns(columns),
+            filters=_incident_filters(type, since, until, unit, location),
+            sort=sort,
+            descending=order.lower() != "asc",
+            cursor=cursor,
+            limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor, "total": store.count()}
+
+@app.get("/incidents/stats")
+def api_incident_stats(request: Request):
+    """Maintained counts per type, per day and per unit."""
+    _check_incident_token(request)
+    return request.app.state.incidents.aggregates()
+
+@app.get("/incidents/export")
+def api_export_incidents(
+    request: Request,
+    format: str = "csv",
+    columns: Optional[str] = None,
+    type: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    unit: Optional[str] = None,
+    location: Optional[str] = None,
+):
+    """Streams the matching incidents as CSV (text) or typed Parquet, reading the table in chunks."""
+    _check_incident_token(request)
+    store = request.app.state.incidents
+    try:
+        selected = store.resolve_columns(_split_columns(columns))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    filters = _incident_filters(type, since, until, unit, location)
+
+    if format == "csv":
+        body, media_type = store.iter_csv(selected, filters), "text/csv"
+    elif format == "parquet":
+        body, media_type = iter_parquet(store, selected, filters), "application/vnd.apache.parquet"
+    else:
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'parquet'.")
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="incidents.{format}"'},
+    )
+
+@app.delete("/incidents")
+def api_clear_incidents(request: Request):
+    """Deletes every saved incident."""
+    _check_incident_token(request)
+    request.app.state.incidents.clear()
+    return {"status": "cleared"}
+
 @app.get("/")
 async def root():
     return {"status": "ok", "message": "Operation Smokey Bear backend is running!"}
+
+@app.get("/stats")
+async def stats(request: Request):
+    return {
+        "providers": request.app.state.providers.stats(),
+        "parsing": request.app.state.providers.parse_stats(),
+        "cache": await asyncio.to_thread(request.app.state.cache.stats),  # counts SQLite rows
+        "coalescing": request.app.state.coalescer.stats(),
+        "jobs": request.app.state.jobs.stats(),
+    }
@@ -0,0 +1,25 @@
+# test_cache.py
+"""The async cache path reaches the SQLite tier and counts hits like the sync one."""
+import asyncio
+
+from incident_parser.cache import ExtractionCache, MemoryCache, SQLiteCache
+
+RESULT = {"fire": {"value": "true", "confidence": 0.9}}
+
+
+def test_async_get_and_set_use_the_disk_tier(tmp_path):
+    disk = SQLiteCache(str(tmp_path / "cache.sqlite3"))
+    cache = ExtractionCache(MemoryCache(), disk)
+
+    async def run():
+        assert await cache.aget("k") is None
+        assert await cache.aset("k", RESULT)
+        assert not await cache.aset("empty", {"fire": {"value": "", "confidence": 0.0}})
+        cache.memory.clear()
+        return await cache.aget("k"), await cache.aget("k")
+
+    from_disk, from_memory = asyncio.run(run())
+    assert from_disk == from_memory == RESULT and disk.get("k") == RESULT
+    stats = cache.stats()
+    assert (stats["misses"], stats["disk_hits"], stats["memory_hits"], stats["skipped_empty"]) == (1, 1, 1, 1)
+    cache.close()
@@ -0,0 +1,110 @@
+# test_categorize.py
+"""Extraction with a failing group or stage: the partial result is returned but never cached, shared or batched as done."""
+import asyncio
+
+import pytest
+
+from incident_parser.batch import BatchProgress, run_batch
+from incident_parser.cache import ExtractionCache
+from incident_parser.categorize import NERIS_FIELDS, PartialExtraction, acategorize_transcript, categorize_transcript
+from incident_parser.coalesce import SingleFlight
+from incident_parser.providers import LLMProvider
+
+
+class FlakyProvider(LLMProvider):
+    """Finds every requested field ("true"), except that calls including `failing` raise."""
+
+    def __init__(self, failing: str = "structure_damage", delay: float = 0.0):
+        super().__init__()
+        self.failing = failing
+        self.delay = delay
+        self.calls = 0
+        self.requested = []
+
+    def _build_request(self, transcript, fields):
+        return fields
+
+    def _reply(self, fields) -> str:
+        self.calls += 1
+        self.requested.append(list(fields))
+        if self.failing in fields:
+            raise ConnectionError("down")
+        return "{%s}" % ", ".join('"%s": {"value": "true", "confidence": 0.9}' % f for f in fields)
+
+    def _send(self, fields):
+        return self._reply(fields)
+
+    async def _asend(self, fields):
+        await asyncio.sleep(self.delay)
+        return self._reply(fields)
+
+
+def test_failed_group_is_empty_and_not_cached():
+    provider, cache = FlakyProvider(), ExtractionCache()
+    result = categorize_transcript("t", provider=provider, cache=cache, mode="grouped")
+    assert result["structure_damage"]["value"] == ""
+    assert result["incident_neris_id"]["value"] == "true"
+    assert len(cache.memory) == 0
+
+    provider.failing = None
+    result = categorize_transcript("t", provider=provider, cache=cache, mode="grouped")
+    assert all(result[f]["value"] == "true" for f in NERIS_FIELDS)
+    assert len(cache.memory) == 1
+
+
+def test_partial_result_is_not_shared_by_coalesced_callers():
+    provider, cache, coalescer = FlakyProvider(delay=0.05), ExtractionCache(), SingleFlight()
+
+    async def run():
+        return await asyncio.gather(*(
+            acategorize_transcript("t", provider=provider, cache=cache, coalescer=coalescer, mode="grouped")
+            for _ in range(3)
+        ))
+
+    results = asyncio.run(run())
+    assert all(r["structure_damage"]["value"] == "" for r in results)
+    assert provider.calls == 3 * 4   # the leader's groups plus one retry per coalesced caller
+    assert len(cache.memory) == 0
+
+
+def test_failed_classification_stage_falls_back_to_single_extraction():
+    provider, cache = FlakyProvider(failing="medical"), ExtractionCache()
+    original = provider._reply
+
+    def classification_fails(fields):
+        provider.failing = "medical" if len(fields) < len(NERIS_FIELDS) else None
+        return original(fields)
+
+    provider._reply = classification_fails
+    result = categorize_transcript("t", provider=provider, cache=cache, mode="staged")
+    assert provider.requested[-1] == NERIS_FIELDS
+    assert result["structure_damage"]["value"] == "true"   # not dropped as "not a fire"
+    assert len(cache.memory) == 1
+
+
+def test_failed_second_stage_is_not_cached():
+    provider, cache = FlakyProvider(failing="structure_damage"), ExtractionCache()
+    result = categorize_transcript("t", provider=provider, cache=cache, mode="staged")
+    assert result["fire"]["value"] == "true" and result["structure_damage"]["value"] == ""
+    assert len(cache.memory) == 0
+
+
+def test_strict_raises_on_partial_result_and_batch_retries_it(tmp_path):
+    provider, cache = FlakyProvider(), ExtractionCache()
+
+    async def extract(transcript):
+        return await acategorize_transcript(transcript, provider=provider, cache=cache, mode="grouped", strict=True)
+
+    with pytest.raises(PartialExtraction) as e:
+        asyncio.run(extract("t"))
+    assert e.value.result["incident_neris_id"]["value"] == "true"
+
+    async def run_once():
+        progress = BatchProgress("b1", directory=str(tmp_path))
+        return [r async for r in run_batch([{"id": "1", "transcript": "t"}], extract, 1, progress)]
+
+    first = asyncio.run(run_once())
+    assert "error" in first[0] and first[-1]["summary"]["failed"] == 1
+    provider.failing = None
+    second = asyncio.run(run_once())
+    assert "fields" in second[0] and "resumed" not in second[0]
@@ -0,0 +1,40 @@
+# test_coalesce.py
+"""SingleFlight.claim: a leader that can't run as a coroutine still shares its result."""
+import asyncio
+
+import pytest
+
+from incident_parser.coalesce import SingleFlight
+
+
+def test_claimed_key_is_shared_with_do_callers():
+    async def run():
+        flight = SingleFlight()
+        shared = flight.claim("k")
+        assert flight.claim("k") is None
+
+        async def never():
+            raise AssertionError("followers must not run their own call")
+
+        follower = asyncio.ensure_future(flight.do("k", never))
+        await asyncio.sleep(0)
+        shared.set_result({"fire": {"value": "true"}})
+        return await follower, flight.stats()
+
+    result, stats = asyncio.run(run())
+    assert result == {"fire": {"value": "true"}}
+    assert stats == {"in_flight": 0, "leaders": 1, "coalesced": 1}
+
+
+def test_failed_claim_raises_in_followers_and_frees_the_key():
+    async def run():
+        flight = SingleFlight()
+        shared = flight.claim("k")
+        follower = asyncio.ensure_future(flight.do("k", None))
+        await asyncio.sleep(0)
+        shared.set_exception(RuntimeError("stream cut off"))
+        with pytest.raises(RuntimeError):
+            await follower
+        return flight.claim("k")
+
+    assert asyncio.run(run()) is not None
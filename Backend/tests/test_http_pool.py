@@ -0,0 +1,87 @@
+# test_http_pool.py
+"""Pool statistics: connect retries and callers waiting for a connection, sync and async."""
+import asyncio
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+import requests
+
+from incident_parser.http_pool import HTTPPool, PoolConfig
+
+
+class _SlowHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(0.2)
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+def _closed_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_sync_connect_retries_are_counted():
+    pool = HTTPPool(f"http://127.0.0.1:{_closed_port()}", PoolConfig(max_retries=2, backoff_factor=0.0))
+    with pytest.raises(requests.exceptions.ConnectionError):
+        pool.get("/")
+    stats = pool.stats()
+    assert stats["connect_retries"] == 2 and stats["errors"] == 1
+
+
+def test_sync_callers_beyond_host_connections_count_as_waiting():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SlowHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    pool = HTTPPool(f"http://127.0.0.1:{server.server_port}", PoolConfig(max_connections=4, max_per_host=1))
+    try:
+        threads = [threading.Thread(target=pool.get, args=("/",)) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        stats = pool.stats()
+        assert stats["peak_in_flight"] == 1
+        assert stats["queued_requests"] == 2 and stats["peak_waiting"] >= 1
+    finally:
+        server.shutdown()
+        pool.close()
+
+
+def test_async_stream_retries_connect_errors():
+    pool = HTTPPool(f"http://127.0.0.1:{_closed_port()}", PoolConfig(max_retries=2, backoff_factor=0.0))
+
+    async def run():
+        with pytest.raises(httpx.ConnectError):
+            async with pool.astream("GET", "/"):
+                pass
+        await pool.aclose()
+
+    asyncio.run(run())
+    stats = pool.stats()
+    assert stats["connect_retries"] == 2 and stats["errors"] == 1 and stats["in_flight"] == 0
+
+
+def test_async_caller_cancelled_while_waiting_is_not_left_waiting():
+    pool = HTTPPool("http://127.0.0.1:1", PoolConfig(max_connections=1))
+
+    async def run():
+        pool._get_async_client()
+        await pool._async_slots.acquire()   # the only slot is busy
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(pool.arequest("GET", "/"), 0.05)
+        pool._async_slots.release()
+        await pool.aclose()
+
+    asyncio.run(run())
+    stats = pool.stats()
+    assert stats["waiting"] == 0 and stats["queued_requests"] == 1 and stats["in_flight"] == 0
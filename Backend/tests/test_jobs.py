@@ -0,0 +1,78 @@
+# test_jobs.py
+"""Requeueing more unfinished jobs than the queue holds, failed extractions, and webhook address checks."""
+import asyncio
+
+import pytest
+
+from incident_parser.categorize import PartialExtraction
+from incident_parser.jobs import (
+    FAILED, QUEUED, RUNNING, SUCCEEDED, InMemoryJobStore, InvalidWebhook, Job, JobQueue, SQLiteJobStore,
+)
+
+
+async def _echo(transcript: str):
+    await asyncio.sleep(0.01)
+    return {"fire": {"value": transcript, "confidence": 1.0}}
+
+
+def test_requeue_beyond_max_depth_runs_every_job(tmp_path):
+    store = SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))
+    for i in range(5):
+        store.save(Job(id=f"job{i}", transcript=str(i), status=RUNNING if i == 0 else QUEUED, created_at=i))
+
+    async def run():
+        queue = JobQueue(store, _echo, workers=1, max_depth=2)
+        await queue.start()
+        for _ in range(200):
+            if all(store.get(f"job{i}").status == SUCCEEDED for i in range(5)):
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+
+    asyncio.run(run())
+    store = SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))
+    assert [store.get(f"job{i}").status for i in range(5)] == [SUCCEEDED] * 5
+    store.close()
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1:8000/hook",
+    "http://localhost/hook",
+    "http://169.254.169.254/latest/meta-data",
+    "http://10.0.0.5/hook",
+    "http://[::1]/hook",
+    "ftp://example.org/hook",
+])
+def test_webhooks_to_internal_addresses_are_refused(url):
+    queue = JobQueue(None, _echo)
+    with pytest.raises(InvalidWebhook):
+        asyncio.run(queue.check_webhook(url))
+
+
+def test_allowed_hosts_restrict_and_override():
+    queue = JobQueue(None, _echo, webhook_hosts={"localhost"})
+    asyncio.run(queue.check_webhook("http://localhost:9000/hook"))
+    with pytest.raises(InvalidWebhook):
+        asyncio.run(queue.check_webhook("https://example.org/hook"))
+
+
+@pytest.mark.parametrize("outcome", ["empty", "partial"])
+def test_failed_extraction_fails_the_job(outcome):
+    async def run(transcript: str):
+        if outcome == "partial":
+            raise PartialExtraction({"fire": {"value": "true", "confidence": 0.9}, "medical": {"value": "", "confidence": 0.0}})
+        return {"fire": {"value": "", "confidence": 0.0}}
+
+    async def go():
+        queue = JobQueue(InMemoryJobStore(), run, workers=1)
+        await queue.start()
+        job = queue.submit("t")
+        for _ in range(100):
+            if queue.get(job.id).status == FAILED:
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return queue.get(job.id)
+
+    job = asyncio.run(go())
+    assert job.status == FAILED and job.result is None and job.error
@@ -0,0 +1,40 @@
+# test_live.py
+"""LiveSession: sample-rate bounds and a client send that fails mid-session."""
+import asyncio
+
+import pytest
+
+from incident_parser.live import LiveSession
+from incident_parser.vad import Utterance
+
+
+async def _transcribe(pcm: bytes, sample_rate: int, prompt: str) -> dict:
+    return {"text": "engine 8 on scene"}
+
+
+@pytest.mark.parametrize("rate", [0, 4000, 96000])
+def test_out_of_range_sample_rate_is_rejected(rate):
+    async def make():
+        LiveSession(_transcribe, None, sample_rate=rate)
+
+    with pytest.raises(ValueError):
+        asyncio.run(make())
+
+
+def test_failed_send_closes_socket_and_stops_session():
+    closed = []
+
+    async def send(message: dict) -> None:
+        raise RuntimeError("client went away")
+
+    async def close(code: int) -> None:
+        closed.append(code)
+
+    async def run():
+        session = LiveSession(_transcribe, send, close=close)
+        session.segmenter.flush = lambda: [Utterance(b"", 0.0, 1.0), Utterance(b"", 1.0, 2.0)]
+        return session, await session.finish()
+
+    session, transcript = asyncio.run(run())
+    assert closed == [1011]
+    assert session.closed and transcript == "engine 8 on scene"
@@ -0,0 +1,175 @@
+# test_router.py
+"""Breaker transitions and slot accounting of the routing provider, with in-process fake backends."""
+import asyncio
+import time
+
+from incident_parser.providers import LLMProvider
+import pytest
+
+from incident_parser.router import Backend, BackendsExhausted, CircuitBreaker, RouterProvider
+
+FIELDS = ["fire"]
+
+
+class FakeProvider(LLMProvider):
+    def __init__(self, name: str, behavior: str = "ok", delay: float = 0.0):
+        super().__init__()
+        self.name = name
+        self.behavior = behavior
+        self.delay = delay
+        self.calls = 0
+        self.healthy = True
+
+    @property
+    def model_id(self) -> str:
+        return f"fake:{self.name}"
+
+    def health_check(self) -> bool:
+        return self.healthy
+
+    def _build_request(self, transcript, fields):
+        return transcript
+
+    def _reply(self) -> str:
+        if self.behavior == "down":
+            raise ConnectionError("down")
+        if self.behavior == "garbage":
+            return "sorry, no JSON"
+        return '{"fire": {"value": "%s", "confidence": 0.9}}' % self.name
+
+    def _send(self, request):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self._reply()
+
+    async def _asend(self, request):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self._reply()
+
+
+def _router(*backends, **kwargs) -> RouterProvider:
+    kwargs.setdefault("health_interval", 0)
+    kwargs.setdefault("queue_timeout", 0.5)
+    return RouterProvider(list(backends), **kwargs)
+
+
+def test_breaker_opens_after_threshold_and_probes_after_reset():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()            # the single probe
+    assert breaker.state == "half_open"
+    assert not breaker.allow()        # no second probe while the first is out
+    breaker.record_failure()
+    assert breaker.state == "open"    # failed probe re-opens immediately
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_abandoned_probe_allows_another():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.abandon()
+    assert breaker.allow()
+
+
+def test_fails_over_on_transport_error_and_unparseable_reply():
+    down, garbage, ok = FakeProvider("down", "down"), FakeProvider("garbage", "garbage"), FakeProvider("ok")
+    router = _router(Backend("down", down), Backend("garbage", garbage), Backend("ok", ok), max_attempts=3)
+    for result in (router.extract_fields("t", FIELDS), asyncio.run(router.aextract_fields("t", FIELDS))):
+        assert result["fire"]["value"] == "ok"
+    stats = router.pool_stats()
+    assert all(b["outstanding"] == 0 for b in stats["backends"].values())
+    assert stats["exhausted"] == 0
+
+
+
+
+def test_sync_timeout_fails_over_and_holds_slot_until_the_call_returns():
+    slow, ok = FakeProvider("slow", delay=0.3), FakeProvider("ok")
+    router = _router(Backend("slow", slow, timeout=0.05), Backend("ok", ok), max_attempts=2)
+    assert router.extract_fields("t", FIELDS)["fire"]["value"] == "ok"
+    assert router.backends[0].failures == 1 and router.backends[0].outstanding == 1
+    time.sleep(0.4)
+    assert router.backends[0].outstanding == 0
+    router.close()
+def test_all_backends_failing_returns_empty_defaults():
+    router = _router(Backend("down", FakeProvider("down", "down")))
+    assert router.extract_fields("t", FIELDS) == {"fire": {"value": "", "confidence": 0.0}}
+    assert router.pool_stats()["exhausted"] == 1
+    assert router.backends[0].outstanding == 0
+
+
+def test_stream_raises_instead_of_yielding_defaults():
+    async def consume(router):
+        return [item async for item in router.astream_fields("t", FIELDS)]
+
+    assert asyncio.run(consume(_router(Backend("a", FakeProvider("a"))))) == [("fire", {"value": "a", "confidence": 0.9})]
+    router = _router(Backend("down", FakeProvider("down", "down")))
+    with pytest.raises(BackendsExhausted):
+        asyncio.run(consume(router))
+    assert router.pool_stats()["exhausted"] == 1
+
+
+def test_overflow_only_used_when_primaries_are_full():
+    primary, overflow = FakeProvider("primary", delay=0.1), FakeProvider("overflow")
+    router = _router(Backend("primary", primary, max_concurrency=1), Backend("overflow", overflow, overflow=True))
+
+    async def run():
+        return await asyncio.gather(*(router.aextract_fields("t", FIELDS) for _ in range(2)))
+
+    values = sorted(r["fire"]["value"] for r in asyncio.run(run()))
+    assert values == ["overflow", "primary"]
+    assert router.extract_fields("t", FIELDS)["fire"]["value"] == "primary"
+
+
+def test_cancelled_request_releases_slot_and_probe():
+    slow = FakeProvider("slow", delay=5)
+    backend = Backend("slow", slow, max_concurrency=1, breaker=CircuitBreaker(1, reset_timeout=0.0))
+    router = _router(backend)
+    backend.breaker.trip()  # the next request is the half-open probe
+
+    async def cancel_one():
+        task = asyncio.create_task(router.aextract_fields("t", FIELDS))
+        await asyncio.sleep(0.05)
+        assert backend.outstanding == 1
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(cancel_one())
+    assert backend.outstanding == 0
+    assert backend.breaker.state == "half_open" and backend.breaker.allow()
+
+
+def test_waiting_caller_gets_freed_slot():
+    backend = Backend("one", FakeProvider("one", delay=0.1), max_concurrency=1)
+    router = _router(backend, queue_timeout=2)
+
+    async def run():
+        return await asyncio.gather(*(router.aextract_fields("t", FIELDS) for _ in range(3)))
+
+    assert [r["fire"]["value"] for r in asyncio.run(run())] == ["one"] * 3
+    assert backend.outstanding == 0 and backend.requests == 3
+
+
+def test_health_check_only_half_opens():
+    provider = FakeProvider("p")
+    backend = Backend("p", provider, breaker=CircuitBreaker(1, reset_timeout=60))
+    router = _router(backend)
+    backend.breaker.trip()
+    router.check_health()
+    assert backend.breaker.state == "half_open"
+    provider.healthy = False
+    router.check_health()
+    assert backend.breaker.state == "open"
@@ -1,36 +1,93 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 from streamlit_mic_recorder import mic_recorder
-from faster_whisper import WhisperModel
+from transcription import TranscriptionService
+from source_matcher import SentenceMatcher
 import requests
 import time
 import tempfile
 import os
-from sentence_transformers import SentenceTransformer, util
-import numpy as np
+import json
+from urllib.parse import quote
 
 @st.cache_resource
 def load_sentence_model():
+    # Imported here so the page (and the History tab) renders without loading torch
+    from sentence_transformers import SentenceTransformer
     return SentenceTransformer("all-MiniLM-L6-v2", device="cpu")
 
 @st.cache_resource
-def load_whisper_model():
-    return WhisperModel("base", device="cpu")
+def load_transcription_service():
+    # One shared Whisper model + worker pool per process (see WHISPER_* env vars)
+    return TranscriptionService()
 
-def get_sentence_embeddings(text):
-    sentences = [s.strip() for s in text.split('.') if s.strip()]
-    embeddings = load_sentence_model().encode(sentences, convert_to_tensor=True)
-    return sentences, embeddings.cpu()
-
-def find_best_sentence(value, sentences, sentence_embs):
-    if not value or not sentences:
-        return "", 0.0
-    value_emb = load_sentence_model().encode(value, convert_to_tensor=True).cpu()
-    sentence_embs = sentence_embs.cpu()
-    cos_sim = util.cos_sim(value_emb, sentence_embs)[0]
-    best_idx = int(np.argmax(cos_sim.numpy()))
-    return sentences[best_idx], float(cos_sim[best_idx].item())
+@st.cache_resource
+def load_source_matcher():
+    # Memoizes embeddings across reruns and sessions; see source_matcher.py
+    return SentenceMatcher(load_sentence_model())
+
+# Values the embedding fallback can't place: flags, numbers and other short codes
+MIN_MATCH_CHARS = 12
+FLAG_VALUES = {"true", "false", "yes", "no", "1", "0", "unknown", "none", "n/a"}
+BOOLEAN_FIELDS = {
+    "fire", "medical", "hazsit", "incident_final_type_primary",
+    "incident_people_present", "structure_progression_conditions",
+}
+
+def wants_embedding_match(value) -> bool:
+    """Only free-text values long enough to point at a sentence are worth loading the model for."""
+    text = str(value or "").strip()
+    return len(text) >= MIN_MATCH_CHARS and text.lower() not in FLAG_VALUES and not text.replace(".", "", 1).isdigit()
+
+def transcribe_with_progress(audio_path):
+    """Runs the transcription off the script thread and streams segments into the page."""
+    job = load_transcription_service().submit(audio_path)
+    progress = st.progress(0.0, text="Transcribing...")
+    live_text = st.empty()
+    while not job.done:
+        progress.progress(job.progress, text=f"Transcribing... {job.progress * 100:.0f}%")
+        live_text.write(job.text)
+        time.sleep(0.25)
+    progress.empty()
+    live_text.empty()
+    if job.error:
+        raise RuntimeError(job.error)
+    return job.text
+
+def keep_evidence(data, new_value, confidence):
+    """Keeps the evidence span of a field only while its value is unedited."""
+    entry = {"value": new_value, "confidence": confidence}
+    if isinstance(data, dict) and data.get("span") and new_value == data.get("value", ""):
+        entry["evidence"], entry["span"] = data.get("evidence", ""), data["span"]
+    return entry
+
+def highlight_source(text, source):
+    """Marks a field's source in the transcript: exact offsets if the backend sent them, else the matched sentence."""
+    mark = "<mark style='background-color:#ffcc80; color:black'>{}</mark>"
+    if not source:
+        return text
+    if source.get("span"):
+        start, end = source["span"]
+        return text[:start] + mark.format(text[start:end]) + text[end:]
+    if source.get("sentence"):
+        return text.replace(source["sentence"], mark.format(source["sentence"]))
+    return text
+
+def animate_counters(cards, targets, duration=0.5, frames=20):
+    """
+    Counts the metric cards up to `targets` in at most `duration` seconds,
+    whatever the totals are. Only animates when the totals changed since this
+    session last showed them, so reruns render instantly.
+    """
+    if st.session_state.get("shown_counts") == targets:
+        frames = 1
+    for frame in range(1, frames + 1):
+        for (placeholder, template), target in zip(cards, targets):
+            placeholder.markdown(template.format(round(target * frame / frames)), unsafe_allow_html=True)
+        if frame < frames:
+            time.sleep(duration / frames)
+    st.session_state["shown_counts"] = targets
 
 
 st.set_page_config(page_title="Operation Smokey Bear", page_icon="🧑‍🚒", layout="wide")
@@ -334,7 +391,18 @@ st.markdown(
 )
 
 # ===== MAIN APP LOGIC =====
-CSV_FILE = "incidents_master.csv"
+BACKEND_URL = os.getenv("BACKEND_URL", "https://operationsmokeybear-dspilots.onrender.com")
+# Every /incidents call carries the backend's INCIDENT_ADMIN_TOKEN, when one is configured
+INCIDENT_TOKEN = os.getenv("INCIDENT_ADMIN_TOKEN", "")
+ADMIN_HEADERS = {"X-Admin-Token": INCIDENT_TOKEN} if INCIDENT_TOKEN else {}
+
+def incident_error(action, e):
+    """Readable message for a failed /incidents call; a rejected token gets a hint instead of the raw error."""
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    if status in (401, 403):
+        return (f"Failed to {action}: the backend rejected the incident token. "
+                "Set INCIDENT_ADMIN_TOKEN for the dashboard to the backend's value.")
+    return f"Failed to {action}: {e}"
 
 # load core_mod_incident with defintions
 df_core = pd.read_csv("Frontend/core_mod_incident.csv")
@@ -374,8 +442,37 @@ SAMPLE_AUDIO = {
 
 
 ALL_COLUMNS = COLUMNS + fire_columns
-if not os.path.exists(CSV_FILE):
-    pd.DataFrame(columns=ALL_COLUMNS).to_csv(CSV_FILE, index=False)
+
+PAGE_SIZE = 50
+
+def fetch_incidents(columns, cursor=None, **filters):
+    """One page from the backend's /incidents API: (DataFrame, next_cursor, total)."""
+    params = {"columns": ",".join(columns), "limit": PAGE_SIZE, **{k: v for k, v in filters.items() if v}}
+    if cursor:
+        params["cursor"] = cursor
+    try:
+        response = requests.get(f"{BACKEND_URL}/incidents", params=params, headers=ADMIN_HEADERS, timeout=30)
+        response.raise_for_status()
+        page = response.json()
+    except Exception as e:
+        st.error(incident_error("load incidents from backend", e))
+        return pd.DataFrame(columns=["id", "created_at"] + columns), None, 0
+    return pd.DataFrame(page["items"], columns=["id", "created_at"] + columns), page["next_cursor"], page["total"]
+
+def iter_sse(response):
+    """Yields (event, data) pairs from a Server-Sent Events response."""
+    event, data_lines = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
 
 def save_incident(data):
     # Unwrap {value, confidence} dicts → plain values only
@@ -383,9 +480,8 @@ def save_incident(data):
         col: (v["value"] if isinstance(v, dict) and "value" in v else v)
         for col, v in data.items()
     }
-    df = pd.read_csv(CSV_FILE)
-    df = pd.concat([df, pd.DataFrame([flat])], ignore_index=True)
-    df.to_csv(CSV_FILE, index=False)
+    response = requests.post(f"{BACKEND_URL}/incidents", json=flat, headers=ADMIN_HEADERS, timeout=30)
+    response.raise_for_status()
 
 # ===== TABS =====
 tab1, tab2, tab3 = st.tabs(["🎙️ Record / Input", "🧾 Review & Save", "📊 Dashboard"])
@@ -409,9 +505,7 @@ with tab1:
             f.write(audio["bytes"])
             audio_path = f.name
         st.audio(audio["bytes"], format="audio/wav")
-        whisper_model = WhisperModel("base", device="cpu")
-        segments, _ = whisper_model.transcribe(audio_path)
-        transcript = " ".join([segment.text for segment in segments])
+        transcript = transcribe_with_progress(audio_path)
         st.session_state["incident_text"] = transcript  
         st.write("Transcript:", transcript)
         st.success("Audio transcribed successfully!")
@@ -436,9 +530,7 @@ with tab1:
                 st.audio(file_path, format="audio/m4a")
                 if st.button("Transcribe Audio"):
                     file_path = SAMPLE_AUDIO[selected_audio]
-                    whisper_model = WhisperModel("base", device="cpu")
-                    segments, _ = whisper_model.transcribe(file_path)
-                    transcript = " ".join([segment.text for segment in segments])
+                    transcript = transcribe_with_progress(file_path)
                     st.session_state["incident_text"] = transcript
                     st.success(f"Transcript from {selected_audio}:")
                     st.write(transcript)
@@ -468,19 +560,36 @@ with tab1:
     # ===== Parse Button =====
     if st.button("Parse incident") and st.session_state.get("incident_text", "").strip():
         try:
-            BACKEND_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:8000")
-            response = requests.post(
-                # f"{BACKEND_URL}/categorize-transcript",
-                "https://operationsmokeybear-dspilots.onrender.com/categorize-transcript",
+            # Stream fields as the model produces them instead of waiting for the whole JSON
+            with requests.post(
+                f"{BACKEND_URL}/categorize-transcript/stream",
                 json={"transcript": st.session_state["incident_text"]},
-                timeout=30
-            )
-            if response.status_code == 200:
-                parsed = response.json().get("fields", {})
-                st.session_state["parsed"] = parsed
-                st.success("Incident parsed! Check the Review tab.")
-            else:
-                st.error(f"Backend error: {response.text}")
+                stream=True,
+                timeout=(10, 300)
+            ) as response:
+                if response.status_code == 200:
+                    parsed = {}
+                    progress = st.progress(0.0, text="Waiting for the model...")
+                    live_fields = st.empty()
+                    for event, data in iter_sse(response):
+                        if event == "field":
+                            parsed[data["field"]] = {"value": data["value"], "confidence": data["confidence"]}
+                            progress.progress(
+                                min(len(parsed) / len(ALL_COLUMNS), 1.0),
+                                text=f"Extracted {len(parsed)} of {len(ALL_COLUMNS)} fields"
+                            )
+                            found = {k: v["value"] for k, v in parsed.items() if v["value"]}
+                            live_fields.json(found)
+                        elif event == "error":
+                            st.warning(f"Extraction stopped early: {data.get('detail', '')}")
+                        elif event == "done":
+                            parsed = data.get("fields", parsed)
+                    progress.empty()
+                    live_fields.empty()
+                    st.session_state["parsed"] = parsed
+                    st.success("Incident parsed! Check the Review tab.")
+                else:
+                    st.error(f"Backend error: {response.text}")
         except Exception as e:
             st.error(f"Failed to connect to backend: {e}")
 
@@ -505,17 +614,30 @@ with tab2:
         # Core fields
         # ====== ORIGINAL TEXT HIGHLIGHT SETUP ======
         # Make sure the transcript exists in session_state
-        if "incident_text" in st.session_state:
-            original_text = st.session_state["incident_text"]
-            sentences, sentence_embs = get_sentence_embeddings(original_text)
-        else:
-            original_text = ""
-            sentences, sentence_embs = [], None
+        original_text = st.session_state.get("incident_text", "")
 
         # Initialize storage for best matches
         if "field_sources" not in st.session_state:
             st.session_state["field_sources"] = {}
 
+        # Prefer the backend's verified evidence spans; only free-text fields
+        # without one fall back to the embedding matcher (one batched pass), so
+        # flags and short values never load the model
+        if original_text:
+            unmatched = {}
+            for col, data in parsed.items():
+                st.session_state["field_sources"].pop(col, None)
+                if isinstance(data, dict) and data.get("span"):
+                    st.session_state["field_sources"][col] = {"span": data["span"]}
+                    continue
+                value = data.get("value", "") if isinstance(data, dict) else data
+                if col not in BOOLEAN_FIELDS and wants_embedding_match(value):
+                    unmatched[col] = value
+            if unmatched:
+                st.session_state["field_sources"].update(
+                    load_source_matcher().match(original_text, unmatched)
+                )
+
         # ====== Side-by-side layout ======
         left_col, right_col = st.columns([0.55, 0.45])
 
@@ -531,13 +653,6 @@ with tab2:
                 else:
                     value, confidence = data, 0.0
 
-                if value and sentences:
-                    best_sentence, sim_score = find_best_sentence(value, sentences, sentence_embs)
-                    st.session_state["field_sources"][col] = {
-                        "sentence": best_sentence,
-                        "similarity": sim_score
-                    }
-
                 conf_pct = f"{confidence * 100:.1f}%"
                 icon = "🟢" if confidence >= 0.8 else "🟠" if confidence >= 0.6 else "🔴"
 
@@ -555,7 +670,7 @@ with tab2:
                     st.session_state["highlight_field"] = col
 
                 new_value = st.text_input(f"Value for {col}", value=value, key=f"input_{col}")
-                parsed[col] = {"value": new_value, "confidence": confidence}
+                parsed[col] = keep_evidence(data, new_value, confidence)
                 # Add spacing between fields
                 st.markdown("<div style='margin-bottom: 35px;'></div>", unsafe_allow_html=True)
 
@@ -563,14 +678,7 @@ with tab2:
         with right_col:
             st.subheader("Original Text")
             highlight_field = st.session_state.get("highlight_field")
-            highlighted_text = original_text
-            if highlight_field and highlight_field in st.session_state["field_sources"]:
-                sentence_to_highlight = st.session_state["field_sources"][highlight_field]["sentence"]
-                if sentence_to_highlight:
-                    highlighted_text = highlighted_text.replace(
-                        sentence_to_highlight,
-                        f"<mark style='background-color:#ffcc80; color:black'>{sentence_to_highlight}</mark>"
-                    )
+            highlighted_text = highlight_source(original_text, st.session_state["field_sources"].get(highlight_field))
             st.markdown(
                 f"<div style='background-color:#1e1e1e; padding:1em; border-radius:10px; color:white; min-height:400px'>{highlighted_text}</div>",
                 unsafe_allow_html=True
@@ -598,14 +706,6 @@ with tab2:
                     conf_pct = f"{confidence * 100:.1f}%"
                     icon = "🟢" if confidence >= 0.8 else "🟠" if confidence >= 0.6 else "🔴"
 
-                    # ===== 🔍 Find best-matching sentence =====
-                    if value and sentences:
-                        best_sentence, sim_score = find_best_sentence(value, sentences, sentence_embs)
-                        st.session_state["field_sources"][col] = {
-                            "sentence": best_sentence,
-                            "similarity": sim_score
-                        }
-
                     # ===== 🧾 Label + Description =====
                     field_description = fire_defs.get(col, "")
                     if field_description:
@@ -620,7 +720,7 @@ with tab2:
 
                     # ===== ✏️ Editable field =====
                     new_value = st.text_input(f"Value for {col}", value=value, key=f"input_fire_{col}")
-                    parsed[col] = {"value": new_value, "confidence": confidence}
+                    parsed[col] = keep_evidence(data, new_value, confidence)
 
                     # ===== 📏 Spacing =====
                     st.markdown("<div style='margin-bottom: 35px;'></div>", unsafe_allow_html=True)
@@ -628,15 +728,7 @@ with tab2:
             with fire_right:
                 st.subheader("Original Text")
                 highlight_field = st.session_state.get("highlight_field")
-                highlighted_text = original_text
-
-                if highlight_field and highlight_field in st.session_state["field_sources"]:
-                    sentence_to_highlight = st.session_state["field_sources"][highlight_field]["sentence"]
-                    if sentence_to_highlight:
-                        highlighted_text = highlighted_text.replace(
-                            sentence_to_highlight,
-                            f"<mark style='background-color:#ffcc80; color:black'>{sentence_to_highlight}</mark>"
-                        )
+                highlighted_text = highlight_source(original_text, st.session_state["field_sources"].get(highlight_field))
 
                 st.markdown(
                     f"<div style='background-color:#1e1e1e; padding:1em; border-radius:10px; color:white; min-height:400px'>{highlighted_text}</div>",
@@ -648,8 +740,11 @@ with tab2:
         st.session_state["approved_parsed"] = parsed
 
         if st.button("Send to Database", disabled=not approved):
-            save_incident(parsed)
-            st.success("Incident saved to CSV!")
+            try:
+                save_incident(parsed)
+                st.success("Incident saved to database!")
+            except Exception as e:
+                st.error(incident_error("save incident", e))
 
         st.markdown("</div>", unsafe_allow_html=True)
 
@@ -660,61 +755,82 @@ with tab3:
     
     with st.expander(" Danger Zone"):
         if st.button(" Clear All Data", type="secondary"):
-            pd.DataFrame(columns=ALL_COLUMNS).to_csv(CSV_FILE, index=False)
-            st.success("CSV cleared!")
-            st.rerun()
+            try:
+                requests.delete(f"{BACKEND_URL}/incidents", headers=ADMIN_HEADERS, timeout=30).raise_for_status()
+                st.success("Incidents cleared!")
+                st.rerun()
+            except requests.RequestException as e:
+                st.error(incident_error("clear incidents", e))
 
 
-    if os.path.exists(CSV_FILE):
-        df = pd.read_csv(CSV_FILE)
-        fire_count = df[df["fire"].astype(str).str.lower().isin(["true", "yes", "1"])].shape[0]
-        medical_count = df[df["medical"].astype(str).str.lower().isin(["true", "yes", "1"])].shape[0]
-        hazmat_count = df[df["hazsit"].astype(str).str.lower().isin(["true", "yes", "1"])].shape[0]
+    try:
+        stats_response = requests.get(f"{BACKEND_URL}/incidents/stats", headers=ADMIN_HEADERS, timeout=30)
+        stats_response.raise_for_status()
+        aggregates = stats_response.json()
+    except Exception as e:
+        st.error(incident_error("load incidents from backend", e))
+        aggregates = None
 
-        col1, col2, col3 = st.columns(3)
+    if aggregates and aggregates["total"]["all"]:
+        counts = [aggregates["type"]["fire"], aggregates["type"]["medical"], aggregates["type"]["hazsit"]]
 
-        with col1:
-            fire_placeholder = st.empty()
-            for i in range(fire_count + 1):
-                fire_placeholder.markdown(f"<div class='metric-card metric-fire'><h2>🔥 Fires</h2><p>{i}</p></div>", unsafe_allow_html=True)
-                time.sleep(0.02)
-
-        with col2:
-            medical_placeholder = st.empty()
-            for i in range(medical_count + 1):
-                medical_placeholder.markdown(f"<div class='metric-card metric-medical'><h2>🚑 Medical</h2><p>{i}</p></div>", unsafe_allow_html=True)
-                time.sleep(0.02)
-
-        with col3:
-            hazmat_placeholder = st.empty()
-            for i in range(hazmat_count + 1):
-                hazmat_placeholder.markdown(f"<div class='metric-card metric-hazmat'><h2>☣ Hazmat</h2><p>{i}</p></div>", unsafe_allow_html=True)
-                time.sleep(0.02)
-
-        # Enforce schema
-        for col in COLUMNS + fire_columns:
-            if col not in df.columns:
-                df[col] = ""
-
-        # Core view
+        col1, col2, col3 = st.columns(3)
+        cards = [
+            (col1.empty(), "<div class='metric-card metric-fire'><h2>🔥 Fires</h2><p>{}</p></div>"),
+            (col2.empty(), "<div class='metric-card metric-medical'><h2>🚑 Medical</h2><p>{}</p></div>"),
+            (col3.empty(), "<div class='metric-card metric-hazmat'><h2>☣ Hazmat</h2><p>{}</p></div>"),
+        ]
+        animate_counters(cards, counts)
+
+        if aggregates["day"]:
+            st.subheader("Incidents per Day")
+            st.bar_chart(pd.Series(aggregates["day"], name="incidents").sort_index())
+        if aggregates["unit"]:
+            st.subheader("Responses per Unit")
+            st.bar_chart(pd.Series(aggregates["unit"], name="responses").sort_values(ascending=False).head(20))
+
+        # Core view: filters run on the backend and only the visible page is fetched
         st.subheader("Core Incidents")
-        st.dataframe(df[COLUMNS])
+        f1, f2, f3, f4 = st.columns(4)
+        filters = {
+            "type": f1.selectbox("Type", ["", "fire", "medical", "hazsit"], format_func=lambda t: t or "All"),
+            "location": f2.text_input("Location contains"),
+            "unit": f3.text_input("Unit"),
+        }
+        days = f4.date_input("Saved between", value=())
+        if len(days) == 2:
+            filters["since"], filters["until"] = days[0].isoformat(), (days[1] + timedelta(days=1)).isoformat()
+
+        # Cursor stack per filter combination: Previous pops, Next pushes
+        filter_key = json.dumps(filters, sort_keys=True)
+        if st.session_state.get("incident_filters") != filter_key:
+            st.session_state["incident_filters"] = filter_key
+            st.session_state["incident_cursors"] = [None]
+        cursors = st.session_state["incident_cursors"]
+
+        page, next_cursor, total = fetch_incidents(COLUMNS, cursors[-1], **filters)
+        st.dataframe(page, hide_index=True)
+        prev_col, info_col, next_col = st.columns([1, 4, 1])
+        if prev_col.button("◀ Previous", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+        info_col.caption(f"Page {len(cursors)} · {total} incidents saved")
+        if next_col.button("Next ▶", disabled=next_cursor is None):
+            cursors.append(next_cursor)
+            st.rerun()
 
-        # Fire-specific view (filter only incidents where fire is true-ish)
-        fire_flagged = df[df["fire"].astype(str).str.lower().isin(["true", "yes", "1"])]
-        if not fire_flagged.empty:
+        # Fire-specific view (latest fire incidents)
+        if aggregates["type"]["fire"]:
             st.subheader("Fire-Specific Incidents")
-            st.dataframe(fire_flagged[fire_columns])
+            fire_page, _, _ = fetch_incidents(fire_columns, type="fire")
+            st.dataframe(fire_page, hide_index=True)
         else:
             st.info("No fire-specific incidents yet.")
 
-        # Download combined CSV
-        combined_csv = df[COLUMNS + fire_columns].to_csv(index=False).encode("utf-8")
-        st.download_button(
-            label="Download Full Dataset",
-            data=combined_csv,
-            file_name="incidents_master.csv",
-            mime="text/csv"
-        )
-    else:
+        # The backend streams exports straight to the browser, which can't send headers
+        token_param = f"&token={quote(INCIDENT_TOKEN)}" if INCIDENT_TOKEN else ""
+        export_csv, export_parquet = st.columns(2)
+        export_csv.link_button("Download Full Dataset (CSV)", f"{BACKEND_URL}/incidents/export?format=csv{token_param}")
+        export_parquet.link_button("Download Full Dataset (Parquet)", f"{BACKEND_URL}/incidents/export?format=parquet{token_param}")
+    elif aggregates is not None:
         st.info("No incidents yet. Add one to see the dashboard.")
@@ -0,0 +1,88 @@
+# source_matcher.py
+"""
+Finds the transcript sentence each extracted field value came from, for the
+Review tab's source highlighting.
+
+All field values are encoded in one batched call and scored against the
+transcript's sentences with a single matrix product over normalized
+embeddings. Sentence embeddings are memoized per transcript hash and match
+results per (transcript hash, value), so a Streamlit rerun with unchanged
+inputs does no model work and an edited field only encodes its new value.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in text.split('.') if s.strip()]
+
+
+class _LRU:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict" = OrderedDict()
+
+    def get(self, key):
+        if key not in self._data:
+            return None
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def set(self, key, value) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+
+class SentenceMatcher:
+    def __init__(self, model, max_transcripts: int = 32, max_matches: int = 4096):
+        self.model = model
+        self._sentences = _LRU(max_transcripts)   # transcript hash -> (sentences, embeddings)
+        self._matches = _LRU(max_matches)         # (transcript hash, value) -> (sentence, score)
+        self._lock = threading.Lock()              # shared across sessions via st.cache_resource
+        self.encoded_texts = 0                     # total strings sent to the model
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        self.encoded_texts += len(texts)
+        return self.model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+
+    def _transcript_embeddings(self, transcript_hash: str, transcript: str) -> Tuple[List[str], np.ndarray]:
+        cached = self._sentences.get(transcript_hash)
+        if cached is None:
+            sentences = split_sentences(transcript)
+            embeddings = self._encode(sentences) if sentences else np.zeros((0, 0), dtype=np.float32)
+            cached = (sentences, embeddings)
+            self._sentences.set(transcript_hash, cached)
+        return cached
+
+    def match(self, transcript: str, values: Dict[str, str]) -> Dict[str, dict]:
+        """
+        Returns {field: {"sentence", "similarity"}} for every field with a
+        non-empty value.
+        """
+        transcript_hash = hashlib.sha256(transcript.encode("utf-8")).hexdigest()
+        values = {col: str(v) for col, v in values.items() if v and str(v).strip()}
+        results: Dict[str, dict] = {}
+
+        with self._lock:
+            sentences, sentence_embs = self._transcript_embeddings(transcript_hash, transcript)
+            if not sentences:
+                return results
+
+            missing = sorted({v for v in values.values() if self._matches.get((transcript_hash, v)) is None})
+            if missing:
+                # One batched encode and one similarity matrix for every new value
+                sims = self._encode(missing) @ sentence_embs.T
+                best = sims.argmax(axis=1)
+                for i, value in enumerate(missing):
+                    self._matches.set((transcript_hash, value), (sentences[best[i]], float(sims[i, best[i]])))
+
+            for col, value in values.items():
+                sentence, score = self._matches.get((transcript_hash, value))
+                results[col] = {"sentence": sentence, "similarity": score}
+        return results
@@ -0,0 +1,264 @@
+# transcription.py
+"""
+Whisper transcription service for the dashboard.
+
+One faster-whisper model is loaded per process (the dashboard caches the
+service with st.cache_resource) and transcriptions run on a small worker
+pool. Each submitted file returns a TranscriptionJob that fills in segments
+and progress as they decode, so the UI can show text while the rest of the
+file is still being transcribed.
+
+Finished transcripts are cached on disk, keyed on the audio file's content
+hash and the model settings, so the sample clips and archived recordings are
+only ever transcribed once per configuration.
+
+Batch mode transcribes a whole directory of recordings across CPU cores:
+    python Frontend/transcription.py path/to/recordings --out transcripts.jsonl --workers 4
+"""
+import os
+import json
+import time
+import uuid
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field, asdict
+from typing import List, Optional
+
+from faster_whisper import WhisperModel
+
+AUDIO_EXTENSIONS = (".m4a", ".wav", ".mp3", ".flac", ".ogg", ".webm", ".aac")
+
+
+@dataclass
+class TranscriptionConfig:
+    model_size: str = "base"
+    device: str = "cpu"
+    compute_type: str = "int8"   # int8 quantization: smaller and faster on CPU
+    cpu_threads: int = 0         # 0 lets CTranslate2 pick
+    workers: int = 1             # transcriptions that can run at once
+    cache_dir: str = ".transcript_cache"
+
+    @classmethod
+    def from_env(cls) -> "TranscriptionConfig":
+        return cls(
+            model_size=os.getenv("WHISPER_MODEL", cls.model_size),
+            device=os.getenv("WHISPER_DEVICE", cls.device),
+            compute_type=os.getenv("WHISPER_COMPUTE_TYPE", cls.compute_type),
+            cpu_threads=int(os.getenv("WHISPER_CPU_THREADS", cls.cpu_threads)),
+            workers=int(os.getenv("WHISPER_WORKERS", cls.workers)),
+            cache_dir=os.getenv("TRANSCRIPT_CACHE_DIR", cls.cache_dir),
+        )
+
+    def fingerprint(self) -> str:
+        """The settings that change the transcript text (thread counts don't)."""
+        return f"{self.model_size}-{self.compute_type}"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class TranscriptCache:
+    """One JSON file per (audio content hash, model settings)."""
+
+    def __init__(self, directory: str, fingerprint: str):
+        self.directory = directory
+        self.fingerprint = fingerprint
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, audio_sha256: str) -> str:
+        return os.path.join(self.directory, f"{audio_sha256}-{self.fingerprint}.json")
+
+    def get(self, audio_sha256: str) -> Optional[dict]:
+        try:
+            with open(self._path(audio_sha256), encoding="utf-8") as fh:
+                return json.load(fh)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def set(self, audio_sha256: str, record: dict) -> None:
+        # Write then rename so a crash never leaves a half-written entry behind
+        path = self._path(audio_sha256)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(record, fh, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+@dataclass
+class TranscriptionJob:
+    audio_path: str
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    segments: List[dict] = field(default_factory=list)
+    duration: float = 0.0        # audio length in seconds, known once decoding starts
+    progress: float = 0.0        # 0.0-1.0 based on the end time of the last segment
+    done: bool = False
+    cached: bool = False
+    error: Optional[str] = None
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def text(self) -> str:
+        return " ".join(s["text"].strip() for s in list(self.segments)).strip()
+
+
+class TranscriptionService:
+    def __init__(self, config: Optional[TranscriptionConfig] = None):
+        self.config = config or TranscriptionConfig.from_env()
+        self.cache = TranscriptCache(self.config.cache_dir, self.config.fingerprint())
+        self.model = WhisperModel(
+            self.config.model_size,
+            device=self.config.device,
+            compute_type=self.config.compute_type,
+            cpu_threads=self.config.cpu_threads,
+            num_workers=self.config.workers,
+        )
+        self._pool = ThreadPoolExecutor(max_workers=self.config.workers, thread_name_prefix="whisper")
+
+    def submit(self, audio_path: str) -> TranscriptionJob:
+        job = TranscriptionJob(audio_path=audio_path)
+        audio_sha256 = file_sha256(audio_path)
+        cached = self.cache.get(audio_sha256)
+        if cached is not None:
+            job.segments, job.duration = cached["segments"], cached["duration"]
+            job.progress, job.cached, job.done = 1.0, True, True
+            job.finished_at = time.time()
+            return job
+        self._pool.submit(self._run, job, audio_sha256)
+        return job
+
+    def transcribe(self, audio_path: str) -> TranscriptionJob:
+        """Blocking convenience wrapper: submits and waits for the job."""
+        job = self.submit(audio_path)
+        while not job.done:
+            time.sleep(0.1)
+        return job
+
+    def _run(self, job: TranscriptionJob, audio_sha256: str) -> None:
+        try:
+            segments, info = self.model.transcribe(job.audio_path)
+            job.duration = float(info.duration or 0.0)
+            # segments is a generator: each step decodes the next chunk of audio
+            for segment in segments:
+                job.segments.append({"start": segment.start, "end": segment.end, "text": segment.text})
+                if job.duration:
+                    job.progress = min(segment.end / job.duration, 1.0)
+            job.progress = 1.0
+            self.cache.set(audio_sha256, {
+                "segments": job.segments,
+                "duration": job.duration,
+                "text": job.text,
+                "config": asdict(self.config),
+            })
+        except Exception as e:
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            job.done = True
+
+
+# ---- Batch mode (one model per worker process) ----
+_batch_model = None
+
+
+def _batch_init(config: TranscriptionConfig) -> None:
+    global _batch_model
+    _batch_model = WhisperModel(
+        config.model_size,
+        device=config.device,
+        compute_type=config.compute_type,
+        cpu_threads=config.cpu_threads,
+    )
+
+
+def _batch_transcribe(audio_path: str) -> dict:
+    start = time.perf_counter()
+    segments, info = _batch_model.transcribe(audio_path)
+    segments = [{"start": s.start, "end": s.end, "text": s.text} for s in segments]
+    return {
+        "segments": segments,
+        "duration": float(info.duration or 0.0),
+        "text": " ".join(s["text"].strip() for s in segments).strip(),
+        "transcribe_seconds": time.perf_counter() - start,
+    }
+
+
+def transcribe_directory(directory: str, out_path: str, workers: int, config: TranscriptionConfig) -> dict:
+    """
+    Transcribes every audio file under `directory` on `workers` processes and
+    writes one JSONL record per file, then a final {"summary": ...} record with
+    the run's throughput. Files already in the transcript cache are written
+    from the cache without being transcribed again.
+    """
+    cache = TranscriptCache(config.cache_dir, config.fingerprint())
+    paths = sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory)
+        for name in names
+        if name.lower().endswith(AUDIO_EXTENSIONS)
+    )
+    if not config.cpu_threads:
+        # Split the cores between workers instead of letting each grab all of them
+        config.cpu_threads = max(1, (os.cpu_count() or 1) // workers)
+
+    summary = {"files": len(paths), "cached": 0, "transcribed": 0, "failed": 0, "audio_seconds": 0.0}
+    wall_start = time.perf_counter()
+    with open(out_path, "w", encoding="utf-8") as out:
+        todo = {}
+        for path in paths:
+            audio_sha256 = file_sha256(path)
+            cached = cache.get(audio_sha256)
+            if cached is not None:
+                summary["cached"] += 1
+                out.write(json.dumps({"file": path, "sha256": audio_sha256, "cached": True, **cached}, ensure_ascii=False) + "\n")
+            else:
+                todo[path] = audio_sha256
+
+        if todo:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_batch_init, initargs=(config,)) as pool:
+                futures = {pool.submit(_batch_transcribe, path): path for path in todo}
+                for future in as_completed(futures):
+                    path = futures[future]
+                    record = {"file": path, "sha256": todo[path], "cached": False}
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        summary["failed"] += 1
+                        record["error"] = str(e)
+                    else:
+                        summary["transcribed"] += 1
+                        summary["audio_seconds"] += result["duration"]
+                        cache.set(todo[path], {**{k: result[k] for k in ("segments", "duration", "text")}, "config": asdict(config)})
+                        record.update(result)
+                        record["audio_seconds_per_second"] = (
+                            result["duration"] / result["transcribe_seconds"] if result["transcribe_seconds"] else 0.0
+                        )
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                    print(f"{'❌' if 'error' in record else '✅'} {path}")
+
+        summary["wall_seconds"] = time.perf_counter() - wall_start
+        # Throughput only counts audio that was actually transcribed in this run
+        summary["audio_seconds_per_wall_second"] = (
+            summary["audio_seconds"] / summary["wall_seconds"] if summary["wall_seconds"] else 0.0
+        )
+        summary["workers"] = workers
+        out.write(json.dumps({"summary": summary}) + "\n")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch-transcribe a directory of dispatch recordings.")
+    parser.add_argument("directory")
+    parser.add_argument("--out", default="transcripts.jsonl")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    args = parser.parse_args()
+
+    summary = transcribe_directory(args.directory, args.out, args.workers, TranscriptionConfig.from_env())
+    print(json.dumps(summary, indent=2))